@@ -0,0 +1,64 @@
+"""
+Micro-benchmark: measure the overhead of calling small SPy functions in the
+interpreter.
+
+Usage:
+    python benchmarks/call_overhead.py [--engine=ast|closure] [-n N]
+
+For each function we report the best time per call over several runs, which
+is less sensitive to the noise of the machine than the average.
+"""
+
+import argparse
+import textwrap
+import timeit
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from spy.vm.vm import SPyVM, InterpEngine
+
+SRC = """
+def inc(x: i32) -> i32:
+    return x + 1
+
+def early(x: i32) -> i32:
+    # return from a nested body
+    while True:
+        if x > 0:
+            if x > -1:
+                return x
+        x = x + 1
+    return 0
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--engine", default="ast", choices=[e.value for e in InterpEngine]
+    )
+    parser.add_argument("-n", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "bench.spy").write_text(textwrap.dedent(SRC))
+        vm = SPyVM()
+        vm.interp_engine = InterpEngine(args.engine)
+        vm.path.append(tmpdir)
+        w_mod = vm.import_("bench")
+
+    print(f"engine: {args.engine}")
+    for name in ["inc", "early"]:
+        w_func = w_mod.getattr(name)
+        args_w = [vm.wrap(5)]
+        vm.call(w_func, args_w)  # warmup
+        times = timeit.repeat(
+            lambda: vm.call(w_func, args_w), number=args.n, repeat=args.repeat
+        )
+        us = min(times) / args.n * 1e6
+        print(f"    {name:6s} {us:6.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,19 @@ from typing import Annotated, Any, no_type_check
 import py.path
 import typer
 
+from spy.backend.pyjit import pyjit as do_pyjit
 from spy.backend.spy import SPyBackend
 from spy.cbuild import get_toolchain
 from spy.compiler import Compiler, ToolchainType
 from spy.errors import SPyError
+from spy.hoister import HoistReport
+from spy.inliner import InlineReport
+from spy.irgen.modcache import CACHE_DIR
 from spy.magic_py_parse import magic_py_parse
 from spy.parser import Parser
 from spy.vm.b import B
 from spy.vm.function import W_Func, W_FuncType
-from spy.vm.vm import SPyVM
+from spy.vm.vm import InterpEngine, SPyVM
 
 app = typer.Typer(pretty_exceptions_enable=False)
 
@@ -38,6 +42,18 @@ def dump_spy_mod(vm: SPyVM, modname: str, pretty: bool) -> None:
     print(b.dump_mod(modname))
 
 
+def dump_inline_report(report: InlineReport) -> None:
+    for (caller, callee), n in report.items():
+        sites = "call site" if n == 1 else "call sites"
+        print(f"# inlined `{callee}` into `{caller}` ({n} {sites})")
+
+
+def dump_hoist_report(report: HoistReport) -> None:
+    for fqn, n in report.items():
+        exprs = "expression" if n == 1 else "expressions"
+        print(f"# hoisted {n} loop-invariant {exprs} in `{fqn}`")
+
+
 @no_type_check
 @app.command()
 def main(
@@ -53,10 +69,31 @@ def main(
         ToolchainType, "which compiler to use", names=["--toolchain", "-t"]
     ) = "zig",
     pretty: boolopt("prettify redshifted modules") = True,
+    engine: opt(
+        InterpEngine, "which engine to use to execute SPy code", names=["--engine"]
+    ) = "ast",
+    pyjit: boolopt("redshift and transpile to Python before --run") = False,
+    jobs: opt(int, "number of processes used to parse and redshift", names=["-j"]) = 1,
+    hoist: boolopt("hoist loop-invariant calls out of loops") = False,
+    cache: boolopt("cache parsed and redshifted modules in the build dir") = False,
 ) -> None:
     try:
         do_main(
-            filename, run, pyparse, parse, redshift, cwrite, g, O, toolchain, pretty
+            filename,
+            run,
+            pyparse,
+            parse,
+            redshift,
+            cwrite,
+            g,
+            O,
+            toolchain,
+            pretty,
+            engine,
+            pyjit,
+            jobs,
+            hoist,
+            cache,
         )
     except SPyError as e:
         print(e.format(use_colors=True))
@@ -73,6 +110,11 @@ def do_main(
     opt_level: int,
     toolchain: ToolchainType,
     pretty: bool,
+    engine: InterpEngine = InterpEngine.ast,
+    pyjit: bool = False,
+    jobs: int = 1,
+    hoist: bool = False,
+    cache: bool = False,
 ) -> None:
     if pyparse:
         do_pyparse(str(filename))
@@ -87,10 +129,20 @@ def do_main(
     modname = filename.stem
     builddir = filename.parent
     vm = SPyVM()
+    vm.interp_engine = engine
+    vm.redshift_workers = jobs
+    if cache:
+        vm.cache_dir = str(builddir / CACHE_DIR)
     vm.path.append(str(builddir))
-    w_mod = vm.import_(modname)
+    [w_mod] = vm.import_all([modname], max_workers=jobs)
 
     if run:
+        if pyjit:
+            vm.redshift()
+            vm.inline()
+            if hoist:
+                vm.hoist_invariants()
+            do_pyjit(vm)
         w_main_functype = W_FuncType.parse("def() -> void")
         w_main = w_mod.getattr_maybe("main")
         if w_main is None:
@@ -102,12 +154,19 @@ def do_main(
         assert w_res is B.w_None
         return
 
-    vm.redshift()
     if redshift:
+        vm.redshift()
+        inline_report = vm.inline()
+        hoist_report = vm.hoist_invariants() if hoist else {}
         dump_spy_mod(vm, modname, pretty)
+        dump_inline_report(inline_report)
+        dump_hoist_report(hoist_report)
         return
 
-    compiler = Compiler(vm, modname, py.path.local(builddir))
+    # the Compiler redshifts only the functions which are reachable from
+    # main() or the exports
+
+    compiler = Compiler(vm, modname, py.path.local(builddir), hoist=hoist)
     if cwrite:
         t = get_toolchain(toolchain)
         compiler.cwrite(t.TARGET)
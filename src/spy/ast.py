@@ -6,8 +6,8 @@ import dataclasses
 from dataclasses import dataclass, field
 from spy.fqn import FQN
 from spy.location import Loc
-from spy.irgen.symtable import Color
-from spy.util import extend
+from spy.irgen.symtable import Color, Symbol
+from spy.util import extend, lookup_visitor_method
 
 AnyNode = typing.Union[py_ast.AST, "Node"]
 VarKind = typing.Literal["const", "var"]
@@ -58,6 +58,9 @@ del AST
 # put them in dictionaries inside the typechecker. So, we must use eq=False ON
 # ALL AST NODES.
 #
+# Moreover, we create lots of nodes, so we want them to be compact: always
+# use slots=True.
+#
 # Ideally, I would like to do the following:
 #     def astnode():
 #         return dataclass (eq=False)
@@ -69,7 +72,7 @@ del AST
 # But we can't because this pattern is not understood by mypy.
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Node:
 
     def pp(self, hl: Any = None) -> None:
@@ -118,17 +121,15 @@ class Node:
 
           - if it doesn't exist, we recurively visit its children
         """
-        cls = self.__class__.__name__
-        methname = f"{prefix}_{cls}"
-        meth = getattr(visitor, methname, None)
+        meth = lookup_visitor_method(visitor.__class__, prefix, self.__class__)
         if meth:
-            meth(self, *args)
+            meth(visitor, self, *args)
         else:
             for node in self.get_children():
                 node.visit(prefix, visitor, *args)
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Module(Node):
     filename: str
     decls: list["Decl"]
@@ -143,17 +144,18 @@ class Module(Node):
         raise KeyError(name)
 
 
+@dataclass(eq=False, slots=True)
 class Decl(Node):
     pass
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class GlobalFuncDef(Decl):
     loc: Loc = field(repr=False)
     funcdef: "FuncDef"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class GlobalVarDef(Decl):
     vardef: "VarDef"
     assign: "Assign"
@@ -163,7 +165,7 @@ class GlobalVarDef(Decl):
         return self.vardef.loc
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Import(Decl):
     loc: Loc = field(repr=False)
     loc_asname: Loc
@@ -174,7 +176,7 @@ class Import(Decl):
 # ====== Expr hierarchy ======
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Expr(Node):
     """
     Operator precedence table, see
@@ -210,50 +212,53 @@ class Expr(Node):
         return isinstance(self, Constant)
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Name(Expr):
     precedence = 100  # the highest
     id: str
+    # the Symbol which `id` refers to: filled by the ScopeAnalyzer, so that
+    # the backends don't have to look it up in the symtable every time
+    sym: Symbol | None = field(repr=False, default=None)
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Auto(Expr):
     precedence = 100  # the highest
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Constant(Expr):
     precedence = 100  # the highest
     value: object
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class GetItem(Expr):
     precedence = 16
     value: Expr
     index: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class List(Expr):
     precedence = 17
     items: list[Expr]
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Tuple(Expr):
     precedence = 17
     items: list[Expr]
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Call(Expr):
     precedence = 16
     func: Expr
     args: list[Expr]
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class CallMethod(Expr):
     precedence = 17  # higher than GetAttr
     target: Expr
@@ -261,7 +266,7 @@ class CallMethod(Expr):
     args: list[Expr]
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class GetAttr(Expr):
     precedence = 16
     value: Expr
@@ -271,146 +276,146 @@ class GetAttr(Expr):
 # ====== BinOp sub-hierarchy ======
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class BinOp(Expr):
     op = ""
     left: Expr
     right: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Eq(BinOp):
     precedence = 6
     op = "=="
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class NotEq(BinOp):
     precedence = 6
     op = "!="
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Lt(BinOp):
     precedence = 6
     op = "<"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class LtE(BinOp):
     precedence = 6
     op = "<="
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Gt(BinOp):
     precedence = 6
     op = ">"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class GtE(BinOp):
     precedence = 6
     op = ">="
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Is(BinOp):
     precedence = 6
     op = "is"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class IsNot(BinOp):
     precedence = 6
     op = "is not"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class In(BinOp):
     precedence = 6
     op = "in"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class NotIn(BinOp):
     precedence = 6
     op = "not in"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Add(BinOp):
     precedence = 11
     op = "+"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Sub(BinOp):
     precedence = 11
     op = "-"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Mul(BinOp):
     precedence = 12
     op = "*"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Div(BinOp):
     precedence = 12
     op = "/"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class FloorDiv(BinOp):
     precedence = 12
     op = "//"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Mod(BinOp):
     precedence = 12
     op = "%"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Pow(BinOp):
     precedence = 14
     op = "**"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class LShift(BinOp):
     precedence = 10
     op = "<<"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class RShift(BinOp):
     precedence = 10
     op = ">>"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class BitXor(BinOp):
     precedence = 8
     op = "^"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class BitOr(BinOp):
     precedence = 7
     op = "|"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class BitAnd(BinOp):
     precedence = 9
     op = "&"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class MatMul(BinOp):
     precedence = 12
     op = "@"
@@ -419,31 +424,31 @@ class MatMul(BinOp):
 # ====== UnaryOp sub-hierarchy ======
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class UnaryOp(Expr):
     op = ""
     value: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class UnaryPos(UnaryOp):
     precedence = 13
     op = "+"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class UnaryNeg(UnaryOp):
     precedence = 13
     op = "-"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Invert(UnaryOp):
     precedence = 13
     op = "~"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Not(UnaryOp):
     precedence = 5
     op = "not"
@@ -452,19 +457,19 @@ class Not(UnaryOp):
 # ====== Stmt hierarchy ======
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Stmt(Node):
     loc: Loc = field(repr=False)
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class FuncArg(Node):
     loc: Loc = field(repr=False)
     name: str
     type: "Expr"
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class FuncDef(Stmt):
     loc: Loc = field(repr=False)
     color: Color
@@ -483,24 +488,24 @@ class FuncDef(Stmt):
         return Loc.combine(self.loc, self.return_type.loc)
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Pass(Stmt):
     pass
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Return(Stmt):
     value: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class VarDef(Stmt):
     kind: VarKind
     name: str
     type: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class StmtExpr(Stmt):
     """
     An expr used as a statement
@@ -509,14 +514,16 @@ class StmtExpr(Stmt):
     value: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class Assign(Stmt):
     target_loc: Loc = field(repr=False)
     target: str
     value: Expr
+    # see Name.sym
+    target_sym: Symbol | None = field(repr=False, default=None)
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class UnpackAssign(Stmt):
     target_locs: list[Loc] = field(repr=False)
     targets: list[str]
@@ -527,7 +534,7 @@ class UnpackAssign(Stmt):
         return list(zip(self.targets, self.target_locs))
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class SetAttr(Stmt):
     target_loc: Loc = field(repr=False)
     target: Expr
@@ -535,7 +542,7 @@ class SetAttr(Stmt):
     value: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class SetItem(Stmt):
     target_loc: Loc = field(repr=False)
     target: Expr
@@ -543,7 +550,7 @@ class SetItem(Stmt):
     value: Expr
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class If(Stmt):
     test: Expr
     then_body: list[Stmt]
@@ -554,7 +561,7 @@ class If(Stmt):
         return len(self.else_body) > 0
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class While(Stmt):
     test: Expr
     body: list[Stmt]
@@ -568,7 +575,7 @@ class While(Stmt):
 # of the AST-which-we-use-as-IR
 
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class FQNConst(Expr):
     precedence = 100  # the highest
     fqn: FQN
@@ -39,7 +39,14 @@ class Dumper(TextBuilder):
     ) -> None:
         super().__init__(use_colors=use_colors)
         self.highlight = highlight
-        self.fields_to_ignore = ("loc", "target_loc", "target_locs", "loc_asname")
+        self.fields_to_ignore = (
+            "loc",
+            "target_loc",
+            "target_locs",
+            "loc_asname",
+            "sym",
+            "target_sym",
+        )
 
     def dump_anything(self, obj: Any) -> None:
         if isinstance(obj, spy.ast.Node):
@@ -73,7 +80,11 @@ class Dumper(TextBuilder):
                 obj, py_ast.expr_context
             )
 
-        values = [getattr(node, field) for field in fields]
+        # is_var is set only on some py_ast.Names, see magic_py_parse
+        values = [
+            getattr(node, field, False) if field == "is_var" else getattr(node, field)
+            for field in fields
+        ]
         is_complex_field = [is_complex(value) for value in values]
         multiline = any(is_complex_field)
         if node is self.highlight:
@@ -1,5 +1,6 @@
 import itertools
 from types import NoneType
+from typing import Optional
 
 import py.path
 
@@ -28,6 +29,9 @@ class CModuleWriter:
     out_warnings: TextBuilder  # nested builder
     out_globals: TextBuilder  # nested builder for global declarations
     global_vars: set[str]
+    # if not None, emit only the red functions which are in this set (see
+    # vm.redshift_reachable). Global variables are always emitted.
+    reachable: Optional[set[FQN]]
 
     def __init__(
         self,
@@ -36,6 +40,7 @@ class CModuleWriter:
         spyfile: py.path.local,
         cfile: py.path.local,
         target: str,
+        reachable: Optional[set[FQN]] = None,
     ) -> None:
         self.ctx = Context(vm)
         self.w_mod = w_mod
@@ -45,6 +50,7 @@ class CModuleWriter:
         self.out = TextBuilder(use_colors=False)
         self.out_globals = None  # type: ignore
         self.global_vars = set()
+        self.reachable = reachable
 
     def write_c_source(self) -> None:
         c_src = self.emit_module()
@@ -88,7 +94,7 @@ class CModuleWriter:
             assert w_obj is not None, "uninitialized global?"
             # XXX we should mangle the name somehow
             if isinstance(w_obj, W_ASTFunc):
-                if w_obj.color == "red":
+                if w_obj.color == "red" and self.is_reachable(fqn):
                     self.declare_function(fqn, w_obj)
                     self.emit_function(fqn, w_obj)
             else:
@@ -108,6 +114,9 @@ class CModuleWriter:
             )
         return self.out.build()
 
+    def is_reachable(self, fqn: FQN) -> bool:
+        return self.reachable is None or fqn in self.reachable
+
     def emit_jsffi_error(self) -> None:
         err = '#error "jsffi is available only for emscripten targets"'
         if err not in self.out_warnings.lines:
@@ -260,7 +269,7 @@ class CFuncWriter:
 
     def emit_stmt_Assign(self, assign: ast.Assign) -> None:
         v = self.fmt_expr(assign.value)
-        sym = self.w_func.funcdef.symtable.lookup(assign.target)
+        sym = self.w_func.funcdef.symtable.lookup_Assign(assign)
         if sym.is_local:
             target = assign.target
         else:
@@ -347,7 +356,7 @@ class CFuncWriter:
         return C.Literal(const.fqn.c_name)
 
     def fmt_expr_Name(self, name: ast.Name) -> C.Expr:
-        sym = self.w_func.funcdef.symtable.lookup(name.id)
+        sym = self.w_func.funcdef.symtable.lookup_Name(name)
         if sym.is_local:
             return C.Literal(name.id)
         else:
@@ -0,0 +1,546 @@
+"""
+SPy 'pyjit' backend.
+
+Once vm.redshift() has been performed, the body of red functions contains
+only calls to FQNConsts, primitive constants and simple control flow: this is
+simple enough to be translated into Python source code, which we compile()
+and execute directly.
+
+The generated code operates on unboxed values:
+
+  - i32 -> Python int (we explicitly wrap around on overflow)
+  - f64 -> Python float
+  - bool -> Python bool
+  - str -> int, i.e. the 'spy_Str *' in the linear memory of the VM
+
+All the other types are kept boxed. Calls to the most common operators are
+inlined, all the other calls go through vm.call.
+
+Functions which contain unsupported constructs are not transpiled: they are
+left untouched and they are executed by ASTFrame as usual.
+"""
+
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from spy import ast
+from spy.errors import SPyError, SPyRuntimeError, SPyTypeError
+from spy.fqn import FQN
+from spy.location import Loc
+from spy.textbuilder import TextBuilder
+from spy.util import magic_dispatch
+from spy.vm.b import B
+from spy.vm.function import W_ASTFunc, W_BuiltinFunc, W_Func
+from spy.vm.object import W_F64, W_I32, W_Object, W_Type
+from spy.vm.str import W_Str
+from spy.vm.typechecker import TypeChecker
+from spy.vm.typeconverter import DynamicCast, NumericConv, TypeConverter
+
+if TYPE_CHECKING:
+    from spy.vm.vm import SPyVM
+
+
+def i32_wrap(code: str) -> str:
+    return f"((({code}) + 0x80000000) & 0xFFFFFFFF) - 0x80000000"
+
+
+# calls to these builtins are inlined. The template is formatted with the
+# Python expressions of the (unboxed) arguments
+FQN2Template = {
+    FQN.parse("operator::i32_add"): i32_wrap("{0} + {1}"),
+    FQN.parse("operator::i32_sub"): i32_wrap("{0} - {1}"),
+    FQN.parse("operator::i32_mul"): i32_wrap("{0} * {1}"),
+    FQN.parse("operator::i32_div"): i32_wrap("{0} // {1}"),
+    FQN.parse("operator::i32_eq"): "({0} == {1})",
+    FQN.parse("operator::i32_ne"): "({0} != {1})",
+    FQN.parse("operator::i32_lt"): "({0} < {1})",
+    FQN.parse("operator::i32_le"): "({0} <= {1})",
+    FQN.parse("operator::i32_gt"): "({0} > {1})",
+    FQN.parse("operator::i32_ge"): "({0} >= {1})",
+    #
+    FQN.parse("operator::f64_add"): "({0} + {1})",
+    FQN.parse("operator::f64_sub"): "({0} - {1})",
+    FQN.parse("operator::f64_mul"): "({0} * {1})",
+    FQN.parse("operator::f64_div"): "({0} / {1})",
+    FQN.parse("operator::f64_eq"): "({0} == {1})",
+    FQN.parse("operator::f64_ne"): "({0} != {1})",
+    FQN.parse("operator::f64_lt"): "({0} < {1})",
+    FQN.parse("operator::f64_le"): "({0} <= {1})",
+    FQN.parse("operator::f64_gt"): "({0} > {1})",
+    FQN.parse("operator::f64_ge"): "({0} >= {1})",
+    #
+    FQN.parse("operator::str_add"): "ll_call('spy_str_add', {0}, {1})",
+    FQN.parse("operator::str_mul"): "ll_call('spy_str_mul', {0}, {1})",
+    FQN.parse("operator::str_eq"): "bool(ll_call('spy_str_eq', {0}, {1}))",
+    FQN.parse("operator::str_ne"): "(not ll_call('spy_str_eq', {0}, {1}))",
+}
+
+
+def is_unboxed(w_type: W_Type) -> bool:
+    return w_type in (B.w_i32, B.w_f64, B.w_bool, B.w_str)
+
+
+def box(code: str, w_type: W_Type) -> str:
+    """
+    Return a Python expression which boxes the value of `code`
+    """
+    if w_type is B.w_i32:
+        return f"W_I32({code})"
+    elif w_type is B.w_f64:
+        return f"W_F64({code})"
+    elif w_type is B.w_bool:
+        return f"(w_True if {code} else w_False)"
+    elif w_type is B.w_str:
+        return f"W_Str.from_ptr(vm, {code})"
+    else:
+        return code
+
+
+def unbox(code: str, w_type: W_Type) -> str:
+    """
+    Return a Python expression which unboxes the value of `code`
+    """
+    if w_type is B.w_i32:
+        return f"int({code}.value)"
+    elif w_type is B.w_f64:
+        return f"{code}.value"
+    elif w_type is B.w_bool:
+        return f"({code} is w_True)"
+    elif w_type is B.w_str:
+        return f"{code}.ptr"
+    else:
+        return code
+
+
+def recast(code: str, w_from: W_Type, w_to: W_Type) -> str:
+    """
+    Adapt the representation of a value whose static type is w_from, to the
+    representation expected by w_to.
+
+    Note that this does NOT perform any type conversion: that's the job of
+    TypeConverters.
+    """
+    if w_from is w_to or not (is_unboxed(w_from) or is_unboxed(w_to)):
+        return code
+    return unbox(box(code, w_from), w_to)
+
+
+def py_name(fqn: FQN) -> str:
+    return fqn.c_name.replace("$", "__")
+
+
+class PyJitUnsupported(Exception):
+    """
+    Raised by PyFuncWriter when it finds a construct which it cannot
+    transpile.
+    """
+
+
+class W_PyJitFunc(W_Func):
+    """
+    A redshifted function which has been transpiled to Python.
+
+    The wrapper takes and returns boxed values, and it's what we call from
+    the VM. Transpiled functions call each other's pyfunc directly.
+    """
+
+    w_astfunc: W_ASTFunc
+    pyfunc: Callable
+    _wrapper: Callable
+
+    def __init__(
+        self, w_astfunc: W_ASTFunc, pyfunc: Callable, wrapper: Callable
+    ) -> None:
+        self.w_functype = w_astfunc.w_functype
+        self.qn = w_astfunc.qn
+        self.w_astfunc = w_astfunc
+        self.pyfunc = pyfunc
+        self._wrapper = wrapper
+
+    def __repr__(self) -> str:
+        return f"<spy function '{self.qn}' (pyjit)>"
+
+    def spy_call(self, vm: "SPyVM", args_w: list[W_Object]) -> W_Object:
+        return self._wrapper(*args_w)
+
+
+def pyjit(vm: "SPyVM") -> list[FQN]:
+    """
+    Transpile all the redshifted red functions of the VM, and replace them
+    with the corresponding W_PyJitFunc.
+
+    Return the list of the FQNs which have been transpiled.
+    """
+    jit = PyJit(vm)
+    return jit.jit_all()
+
+
+class PyJit:
+    """
+    Transpile a group of functions.
+
+    All the generated code lives in the same namespace, which contains:
+
+      - for each red W_ASTFunc, a function f_NAME which takes and returns
+        unboxed values. If the function could not be transpiled, f_NAME is a
+        trampoline which calls it through the VM.
+
+      - for each transpiled function, a wrapper w_NAME which takes and
+        returns boxed values.
+
+      - all the constants needed by the code (see new_const())
+    """
+
+    vm: "SPyVM"
+    ns: dict[str, Any]
+    consts: dict[int, str]
+    funcs: dict[FQN, W_ASTFunc]
+
+    def __init__(self, vm: "SPyVM") -> None:
+        self.vm = vm
+        self.consts = {}
+        self.funcs = {}
+        self.ns = {
+            "vm": vm,
+            "ll_call": vm.ll.call,
+            "globals_w": vm.globals_w,
+            "W_I32": W_I32,
+            "W_F64": W_F64,
+            "W_Str": W_Str,
+            "w_True": B.w_True,
+            "w_False": B.w_False,
+            "w_None": B.w_None,
+            "SPyRuntimeError": SPyRuntimeError,
+            "no_return": self.no_return,
+        }
+
+    @staticmethod
+    def no_return(loc: Loc) -> SPyTypeError:
+        msg = "reached the end of the function without a `return`"
+        return SPyTypeError.simple(msg, "no return", loc)
+
+    def new_const(self, prefix: str, value: Any) -> str:
+        """
+        Store value in the namespace, and return its name
+        """
+        name = self.consts.get(id(value))
+        if name is None:
+            name = f"{prefix}{len(self.consts)}"
+            self.consts[id(value)] = name
+            self.ns[name] = value
+        return name
+
+    def exec_source(self, src: str, fqn: FQN) -> None:
+        code = compile(src, f"<pyjit {fqn}>", "exec")
+        exec(code, self.ns)
+
+    def jit_all(self) -> list[FQN]:
+        for fqn, w_obj in self.vm.globals_w.items():
+            if (
+                isinstance(w_obj, W_ASTFunc)
+                and w_obj.redshifted
+                and w_obj.color == "red"
+            ):
+                self.funcs[fqn] = w_obj
+
+        # first, we create a trampoline for every function: they will be
+        # overwritten by the transpiled versions
+        for fqn, w_func in self.funcs.items():
+            self.exec_source(self.trampoline_source(fqn, w_func), fqn)
+
+        sources = {}
+        for fqn, w_func in self.funcs.items():
+            fw = PyFuncWriter(self, fqn, w_func)
+            try:
+                sources[fqn] = fw.emit()
+            except (PyJitUnsupported, SPyError):
+                # this function will be executed by ASTFrame. In particular,
+                # if the typechecker finds an error we want ASTFrame to report
+                # it at runtime, as it would happen without pyjit
+                pass
+
+        for fqn, src in sources.items():
+            self.exec_source(src, fqn)
+            name = py_name(fqn)
+            pyfunc = self.ns[f"f_{name}"]
+            wrapper = self.ns[f"w_{name}"]
+            w_jitfunc = W_PyJitFunc(self.funcs[fqn], pyfunc, wrapper)
+            self.vm.store_global(fqn, w_jitfunc)
+        return list(sources)
+
+    def trampoline_source(self, fqn: FQN, w_func: W_ASTFunc) -> str:
+        """
+        Generate f_NAME for a function which is NOT transpiled: it boxes the
+        arguments and calls the function through the VM.
+        """
+        w_functype = w_func.w_functype
+        name = py_name(fqn)
+        c_fqn = self.new_const("fqn", fqn)
+        params = [f"v{i}" for i in range(w_functype.arity)]
+        args_w = [box(v, p.w_type) for v, p in zip(params, w_functype.params)]
+        call = f"vm.call(globals_w[{c_fqn}], [{', '.join(args_w)}])"
+        out = TextBuilder()
+        out.wl(f"def f_{name}({', '.join(params)}):")
+        with out.indent():
+            out.wl(f"return {unbox(call, w_functype.w_restype)}")
+        return out.build()
+
+
+class PyFuncWriter:
+    """
+    Generate the Python source code for a redshifted W_ASTFunc.
+
+    fmt_expr returns a Python expression: the value it computes is unboxed
+    or not depending on the static type of the expression, see is_unboxed().
+    """
+
+    jit: PyJit
+    vm: "SPyVM"
+    fqn: FQN
+    w_func: W_ASTFunc
+    t: TypeChecker
+    out: TextBuilder
+
+    def __init__(self, jit: PyJit, fqn: FQN, w_func: W_ASTFunc) -> None:
+        self.jit = jit
+        self.vm = jit.vm
+        self.fqn = fqn
+        self.w_func = w_func
+        self.t = TypeChecker(self.vm, w_func)
+        self.out = TextBuilder()
+
+    def emit(self) -> str:
+        """
+        Emit the code for the whole function, plus its boxed wrapper
+        """
+        w_functype = self.w_func.w_functype
+        assert self.w_func.locals_types_w is not None
+        name = py_name(self.fqn)
+        params = [p.name for p in w_functype.params]
+        has_locals = any(
+            varname != "@return" and varname not in params
+            for varname in self.w_func.locals_types_w
+        )
+        args = ", ".join(f"v_{p}" for p in params)
+        self.out.wl(f"def f_{name}({args}):")
+        with self.out.indent():
+            if has_locals:
+                self.out.wl("try:")
+                with self.out.indent():
+                    self.emit_function_body()
+                self.out.wl("except UnboundLocalError:")
+                with self.out.indent():
+                    msg = "read from uninitialized local"
+                    self.out.wl(f"raise SPyRuntimeError({msg!r})")
+            else:
+                self.emit_function_body()
+        self.out.wl()
+        self.emit_wrapper(name)
+        return self.out.build()
+
+    def emit_function_body(self) -> None:
+        self.emit_body(self.w_func.funcdef.body)
+        w_restype = self.w_func.w_functype.w_restype
+        if w_restype in (B.w_void, B.w_dynamic):
+            self.out.wl("return w_None")
+        else:
+            loc = self.w_func.funcdef.loc.make_end_loc()
+            c_loc = self.jit.new_const("loc", loc)
+            self.out.wl(f"raise no_return({c_loc})")
+
+    def emit_wrapper(self, name: str) -> None:
+        w_functype = self.w_func.w_functype
+        params = [f"w{i}" for i in range(w_functype.arity)]
+        args = [unbox(w, p.w_type) for w, p in zip(params, w_functype.params)]
+        call = f"f_{name}({', '.join(args)})"
+        self.out.wl(f"def w_{name}({', '.join(params)}):")
+        with self.out.indent():
+            self.out.wl(f"return {box(call, w_functype.w_restype)}")
+
+    def emit_body(self, body: list[ast.Stmt]) -> None:
+        lineno = self.out.lineno
+        for stmt in body:
+            self.emit_stmt(stmt)
+        if self.out.lineno == lineno:
+            self.out.wl("pass")
+
+    def emit_stmt(self, stmt: ast.Stmt) -> None:
+        self.t.check_stmt(stmt)
+        magic_dispatch(self, "emit_stmt", stmt)
+
+    def emit_stmt_NotImplemented(self, stmt: ast.Stmt) -> None:
+        raise PyJitUnsupported(stmt.__class__.__name__)
+
+    def fmt_expr(self, expr: ast.Expr) -> str:
+        """
+        Return the Python expression for expr, after having applied the type
+        converter (if any).
+        """
+        color, w_type = self.t.check_expr(expr)
+        code = magic_dispatch(self, "fmt_expr", expr)
+        conv = self.t.expr_conv.get(expr)
+        if conv is not None:
+            code = self.fmt_conv(code, w_type, conv)
+        return code
+
+    def fmt_expr_NotImplemented(self, expr: ast.Expr) -> str:
+        raise PyJitUnsupported(expr.__class__.__name__)
+
+    def fmt_conv(self, code: str, w_type: W_Type, conv: Optional[TypeConverter]) -> str:
+        """
+        Apply the given TypeConverter to code, whose static type is w_type
+        """
+        if conv is None:
+            return code
+        if isinstance(conv, NumericConv):
+            if conv.w_fromtype is not B.w_i32 or conv.w_type is not B.w_f64:
+                raise PyJitUnsupported(f"NumericConv {conv.w_fromtype.name}")
+            return f"float({code})"
+        elif isinstance(conv, DynamicCast):
+            c_conv = self.jit.new_const("conv", conv)
+            w_code = box(code, w_type)
+            return unbox(f"{c_conv}.convert(vm, {w_code})", conv.w_type)
+        else:
+            raise PyJitUnsupported(conv.__class__.__name__)
+
+    def static_type(self, expr: ast.Expr) -> W_Type:
+        """
+        The static type of expr, after the type conversion (if any)
+        """
+        conv = self.t.expr_conv.get(expr)
+        if conv is not None:
+            return conv.w_type
+        _, w_type = self.t.check_expr(expr)
+        return w_type
+
+    # ===== statements =====
+
+    def emit_stmt_Pass(self, stmt: ast.Pass) -> None:
+        self.out.wl("pass")
+
+    def emit_stmt_Return(self, ret: ast.Return) -> None:
+        v = self.fmt_expr(ret.value)
+        w_restype = self.w_func.w_functype.w_restype
+        self.out.wl(f"return {recast(v, self.static_type(ret.value), w_restype)}")
+
+    def emit_stmt_VarDef(self, vardef: ast.VarDef) -> None:
+        # the types of the locals are known after redshift, nothing to emit
+        assert self.w_func.locals_types_w is not None
+        w_type = self.w_func.locals_types_w[vardef.name]
+        self.t.lazy_check_VarDef(vardef, w_type)
+
+    def emit_stmt_Assign(self, assign: ast.Assign) -> None:
+        v = self.fmt_expr(assign.value)
+        w_valtype = self.static_type(assign.value)
+        sym = self.w_func.funcdef.symtable.lookup_Assign(assign)
+        if sym.is_local:
+            w_type = self.t.locals_types_w[assign.target]
+            v = recast(v, w_valtype, w_type)
+            self.out.wl(f"v_{assign.target} = {v}")
+        elif sym.fqn is not None:
+            c_fqn = self.jit.new_const("fqn", sym.fqn)
+            self.out.wl(f"vm.store_global({c_fqn}, {box(v, w_valtype)})")
+        else:
+            raise PyJitUnsupported("closures")
+
+    def emit_stmt_StmtExpr(self, stmt: ast.StmtExpr) -> None:
+        v = self.fmt_expr(stmt.value)
+        self.out.wl(v)
+
+    def emit_stmt_If(self, if_node: ast.If) -> None:
+        test = self.fmt_bool(if_node.test)
+        self.out.wl(f"if {test}:")
+        with self.out.indent():
+            self.emit_body(if_node.then_body)
+        if if_node.else_body:
+            self.out.wl("else:")
+            with self.out.indent():
+                self.emit_body(if_node.else_body)
+
+    def emit_stmt_While(self, while_node: ast.While) -> None:
+        test = self.fmt_bool(while_node.test)
+        self.out.wl(f"while {test}:")
+        with self.out.indent():
+            self.emit_body(while_node.body)
+
+    def fmt_bool(self, expr: ast.Expr) -> str:
+        v = self.fmt_expr(expr)
+        return recast(v, self.static_type(expr), B.w_bool)
+
+    # ===== expressions =====
+
+    def fmt_expr_Constant(self, const: ast.Constant) -> str:
+        T = type(const.value)
+        if const.value is None:
+            return "w_None"
+        elif T is bool:
+            return repr(const.value)
+        elif T is int:
+            # make sure to wrap around exactly as W_I32 does
+            return repr(int(W_I32(const.value).value))
+        elif T is float:
+            return self.jit.new_const("f64_", const.value)
+        elif T is str:
+            # strings are immutable, so we can share the same spy_Str
+            assert isinstance(const.value, str)
+            w_str = W_Str(self.vm, const.value)
+            return self.jit.new_const("str", w_str) + ".ptr"
+        else:
+            raise PyJitUnsupported(f"Constant of type {T.__name__}")
+
+    def fmt_expr_FQNConst(self, const: ast.FQNConst) -> str:
+        # the global might be replaced by a W_PyJitFunc, so we need to look
+        # it up at runtime
+        c_fqn = self.jit.new_const("fqn", const.fqn)
+        _, w_type = self.t.check_expr(const)
+        return unbox(f"vm.lookup_global({c_fqn})", w_type)
+
+    def fmt_expr_Name(self, name: ast.Name) -> str:
+        sym = self.w_func.funcdef.symtable.lookup_Name(name)
+        if sym.is_local:
+            return f"v_{name.id}"
+        elif sym.fqn is not None:
+            c_fqn = self.jit.new_const("fqn", sym.fqn)
+            _, w_type = self.t.check_expr(name)
+            return unbox(f"globals_w[{c_fqn}]", w_type)
+        else:
+            raise PyJitUnsupported("closures")
+
+    def fmt_expr_Call(self, call: ast.Call) -> str:
+        if not isinstance(call.func, ast.FQNConst):
+            raise PyJitUnsupported("indirect calls")
+        w_opimpl = self.t.opimpl[call]
+        assert w_opimpl.is_direct_call()
+        fqn = call.func.fqn
+        w_func = self.vm.lookup_global(fqn)
+        assert isinstance(w_func, W_Func)
+        w_functype = w_func.w_functype
+        #
+        # compute the arguments, applying the converters of the opimpl, and
+        # adapt them to the representation expected by the params
+        assert w_opimpl._args_wv is not None
+        assert w_opimpl._converters is not None
+        orig_args = [call.func] + call.args
+        args = []
+        for param, wv_arg, conv in zip(
+            w_functype.params, w_opimpl._args_wv, w_opimpl._converters, strict=True
+        ):
+            arg = orig_args[wv_arg.i]
+            w_argtype = self.static_type(arg)
+            v = self.fmt_conv(self.fmt_expr(arg), w_argtype, conv)
+            if conv is not None:
+                w_argtype = conv.w_type
+            args.append(recast(v, w_argtype, param.w_type))
+
+        template = FQN2Template.get(fqn)
+        if template is not None:
+            return template.format(*args)
+        elif fqn in self.jit.funcs:
+            # direct call to the unboxed version
+            return f"f_{py_name(fqn)}({', '.join(args)})"
+        elif isinstance(w_func, W_BuiltinFunc):
+            c_func = self.jit.new_const("func", w_func)
+            args_w = [box(v, p.w_type) for v, p in zip(args, w_functype.params)]
+            res = f"vm.call({c_func}, [{', '.join(args_w)}])"
+            return unbox(res, w_functype.w_restype)
+        else:
+            raise PyJitUnsupported(f"call to {w_func}")
@@ -173,9 +173,9 @@ class SPyBackend:
     def fmt_expr_BinOp(self, binop: ast.BinOp) -> str:
         l = self.fmt_expr(binop.left)
         r = self.fmt_expr(binop.right)
-        if binop.left.precedence < binop.precedence:
+        if self.get_precedence(binop.left) < binop.precedence:
             l = f"({l})"
-        if binop.right.precedence < binop.precedence:
+        if self.get_precedence(binop.right) <= binop.precedence:
             r = f"({r})"
         return f"{l} {binop.op} {r}"
 
@@ -223,6 +223,17 @@ class SPyBackend:
             return self.FQN2BinOp.get(func.fqn)
         return None
 
+    def get_precedence(self, expr: ast.Expr) -> int:
+        """
+        Like expr.precedence, but taking into account the calls which are
+        formatted as BinOps
+        """
+        if isinstance(expr, ast.Call) and self.fqn_format == "short":
+            opclass = self.get_binop_maybe(expr.func)
+            if opclass:
+                return opclass.precedence
+        return expr.precedence
+
     def fmt_expr_Call(self, call: ast.Call) -> str:
         opclass = self.get_binop_maybe(call.func)
         if self.fqn_format == "short" and opclass:
@@ -2,6 +2,7 @@ import os
 from enum import Enum
 import py.path
 from spy.backend.c.cwriter import CModuleWriter
+from spy.fqn import FQN
 from spy.cbuild import get_toolchain
 from spy.vm.vm import SPyVM
 from spy.vm.module import W_Module
@@ -29,20 +30,73 @@ class Compiler:
     builddir: py.path.local
     file_c: py.path.local  # output file
     file_wasm: py.path.local  # output file
+    reachable: set[FQN]  # the red functions which are emitted
+    hoist: bool  # run vm.hoist_invariants() before emitting the C code
 
-    def __init__(self, vm: SPyVM, modname: str, builddir: py.path.local) -> None:
+    def __init__(
+        self,
+        vm: SPyVM,
+        modname: str,
+        builddir: py.path.local,
+        *,
+        hoist: bool = False,
+    ) -> None:
         self.vm = vm
+        self.hoist = hoist
         self.w_mod = vm.modules_w[modname]
         basename = modname
         self.file_c = builddir.join(f"{basename}.c")
         self.file_wasm = builddir.join(f"{basename}.wasm")
 
+    def get_exports(self) -> list[FQN]:
+        """
+        Return the FQNs of the names which are exported by the module.
+        """
+        # ok, this logic is wrong: we cannot know which names we want to
+        # export by simply looking at their type: for example, in case of
+        # variables we want to export "red variables" but we don't want to
+        # export "blue variabes" (I guess?). For now, let's just include
+        # red functions and integers
+        return [
+            fqn
+            for fqn, w_obj in self.w_mod.items_w()
+            if (
+                (isinstance(w_obj, W_ASTFunc) and w_obj.color == "red")
+                or isinstance(w_obj, W_I32)
+            )
+        ]
+
+    def get_roots(self, target: str) -> list[FQN]:
+        """
+        Return the entry points of the program: the functions which must be
+        emitted, together with everything which is reachable from them.
+
+        For WASM modules they are the exports, for executables it's main()
+        (or the exports, if there is no main()).
+        """
+        fqn_main = FQN.make_global(modname=self.w_mod.name, attr="main")
+        if target != "wasi" and fqn_main in self.vm.globals_w:
+            return [fqn_main]
+        return self.get_exports()
+
     def cwrite(self, target: str) -> py.path.local:
         """
         Convert the W_Module into a .c file
+
+        Only the functions which are reachable from the roots are redshifted
+        and emitted, see vm.redshift_reachable().
         """
+        roots = self.get_roots(target)
+        self.vm.inline(self.vm.redshift_reachable(roots))
+        # after inlining, some functions might be no longer reachable. This
+        # time nothing needs to be redshifted, we just walk the call graph
+        self.reachable = self.vm.redshift_reachable(roots)
+        if self.hoist:
+            self.vm.hoist_invariants(self.reachable)
         file_spy = py.path.local(self.w_mod.filepath)
-        self.cwriter = CModuleWriter(self.vm, self.w_mod, file_spy, self.file_c, target)
+        self.cwriter = CModuleWriter(
+            self.vm, self.w_mod, file_spy, self.file_c, target, self.reachable
+        )
         self.cwriter.write_c_source()
         if DUMP_C:
             print()
@@ -63,18 +117,12 @@ class Compiler:
         toolchain = get_toolchain(toolchain_type)
         file_c = self.cwrite(toolchain.TARGET)
         if toolchain.TARGET == "wasi":
-            # ok, this logic is wrong: we cannot know which names we want to
-            # export by simply looking at their type: for example, in case of
-            # variables we want to export "red variables" but we don't want to
-            # export "blue variabes" (I guess?). For now, let's just include
-            # red functions and integers
             exports = [
                 fqn.c_name
-                for fqn, w_obj in self.w_mod.items_w()
-                if (
-                    (isinstance(w_obj, W_ASTFunc) and w_obj.color == "red")
-                    or isinstance(w_obj, W_I32)
-                )
+                for fqn in self.get_exports()
+                # functions which have been created by the redshift are not
+                # roots, we export them only if they were emitted
+                if fqn in self.reachable or isinstance(self.vm.globals_w[fqn], W_I32)
             ]
             file_wasm = toolchain.c2wasm(
                 file_c,
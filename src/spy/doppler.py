@@ -1,16 +1,23 @@
-from typing import TYPE_CHECKING
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Optional
 
 from fixedint import FixedInt
 
 from spy import ast
 from spy.errors import SPyTypeError
 from spy.fqn import FQN
+from spy.irgen.symtable import SymTable
 from spy.location import Loc
 from spy.util import magic_dispatch
 from spy.vm.astframe import ASTFrame
 from spy.vm.b import B
-from spy.vm.function import W_ASTFunc, W_BuiltinFunc
-from spy.vm.object import W_Object, W_Type
+from spy.vm.bluecache import LogEntry
+from spy.vm.function import W_ASTFunc, W_BuiltinFunc, W_Func, W_FuncType
+from spy.vm.list import Meta_W_List, W_List
+from spy.vm.object import W_F64, W_I32, W_Bool, W_Object, W_Type
+from spy.vm.opimpl import W_OpImpl, W_Value
+from spy.vm.str import W_Str
 from spy.vm.typeconverter import JsRefConv
 
 if TYPE_CHECKING:
@@ -22,6 +29,585 @@ def redshift(vm: "SPyVM", w_func: W_ASTFunc) -> W_ASTFunc:
     return dop.redshift()
 
 
+def make_redshifted_func(
+    w_func: W_ASTFunc,
+    new_body: list[ast.Stmt],
+    locals_types_w: dict[str, W_Type],
+    symtable: Optional[SymTable] = None,
+) -> W_ASTFunc:
+    """
+    Make a copy of w_func with the given body. By default the new function
+    shares the symtable of the old one: optimizations which introduce new
+    local variables must pass their own.
+    """
+    if symtable is None:
+        symtable = w_func.funcdef.symtable
+    new_funcdef = w_func.funcdef.replace(body=new_body, symtable=symtable)
+    # all the non-local lookups are redshifted into constants, so the
+    # closure will be empty
+    return W_ASTFunc(
+        qn=w_func.qn,
+        closure=(),
+        w_functype=w_func.w_functype,
+        funcdef=new_funcdef,
+        locals_types_w=locals_types_w,
+    )
+
+
+# ====== parallel redshift ======
+#
+# The worker processes are forked from the main one, so they get a copy of
+# the whole VM for free. Each worker redshifts a contiguous chunk of the
+# functions and sends back, for each of them:
+#
+#   - the new body, plus the FQNs of the types of the locals;
+#
+#   - the blue calls which were recorded in the bluecache during the
+#     redshift;
+#
+#   - where to find the objects which got a new FQN (e.g. closures and
+#     builtin functions, see assign_fqn): they are always the result of one
+#     of the blue calls, or the function of a W_OpImpl returned by it.
+#
+# The main process merges the results in the same order as a serial
+# redshift (see ChunkMerger): it replays the blue calls on its own VM, so
+# that the bluecache gets the same entries and it obtains its own version of
+# the objects; then it assigns them an FQN, unless they already have one,
+# and rewrites the FQNs used by the new body accordingly. This way, the end
+# result is the same as with a serial redshift.
+#
+# A result is dropped, and the main process redshifts the function by
+# itself, only if it cannot be merged: when the redshift has other side
+# effects (e.g. it imports a module or mutates an object), when one of the
+# blue calls cannot be sent to the main process, when a new global cannot be
+# found in the results of the calls, or when the redshift fails. A worker
+# stops at the first function which cannot be merged, since the rest of its
+# chunk might depend on it.
+#
+# The same workers are reused for all the batches of a redshift (e.g. for
+# all the levels of vm.redshift_reachable), until some of them adds new
+# globals: see RedshiftPool.
+
+# the VM as seen by the worker processes, see RedshiftPool
+_worker_vm: Optional["SPyVM"] = None
+# how many of the RedshiftPool.updates have been applied to _worker_vm
+_worker_applied = 0
+
+# (new_body, {varname: fqn_of_the_type})
+PackedFunc = tuple[list[ast.Stmt], dict[str, FQN]]
+
+# a W_Object as returned by pack_obj
+PackedObj = tuple[Any, ...]
+
+# a blue call: (packed_w_func, packed_args_w)
+PackedCall = tuple[PackedObj, list[PackedObj]]
+
+# where to find a new global: (index of the blue call inside the chunk,
+# "result" or "opimpl")
+GlobalLoc = tuple[int, str]
+
+# (packed_func, calls, {worker_fqn: loc}): see _redshift_chunk
+FuncResult = tuple[PackedFunc, list[PackedCall], dict[FQN, GlobalLoc]]
+
+# see RedshiftPool.redshift_some
+PendingFunc = tuple["ChunkMerger", int]
+
+
+class StateDigest(NamedTuple):
+    """
+    A value which changes whenever something has side effects on the VM,
+    see SPyVM.state_digest. The entries of the bluecache are not included,
+    since the workers send them to the main process.
+    """
+
+    globals_version: int
+    n_fqns: int
+    n_modules: int
+    objects_version: int
+
+    def add_globals(self, n: int) -> "StateDigest":
+        """
+        Return the digest that we get by adding n new globals.
+        """
+        return self._replace(
+            globals_version=self.globals_version + n, n_fqns=self.n_fqns + n
+        )
+
+
+class CannotPack(Exception):
+    pass
+
+
+def assign_fqn(vm: "SPyVM", w_val: W_Object) -> FQN:
+    """
+    Assign an unique FQN to a prebuilt constant which doesn't have one, and
+    add it to the globals.
+
+    For now we know how to do it only for non-global functions.
+    """
+    if isinstance(w_val, W_ASTFunc):
+        # it's a closure, let's assign it an FQN and add to the globals
+        fqn = vm.get_FQN(w_val.qn, is_global=False)
+    elif isinstance(w_val, W_BuiltinFunc):
+        # builtin functions MUST be unique
+        fqn = vm.get_FQN(w_val.qn, is_global=True)
+    else:
+        assert False, "implement me"
+    vm.add_global(fqn, None, w_val)
+    return fqn
+
+
+def pack_obj(vm: "SPyVM", w_obj: W_Object, functypes: dict[int, FQN]) -> PackedObj:
+    """
+    Turn w_obj into something which can be pickled and turned back into an
+    equivalent object by unpack_obj, or raise CannotPack.
+
+    Primitives are sent by value, globals by FQN. W_Values and the prebuilt
+    list types are rebuilt from their content. Function types are not
+    interned, so they are sent as the FQN of a global function which has
+    them: functypes maps their id() to it.
+    """
+    if isinstance(w_obj, (W_I32, W_F64, W_Bool, W_Str)):
+        value = vm.unwrap(w_obj)
+        if isinstance(value, FixedInt):  # type: ignore
+            value = int(value)
+        return ("prim", value)
+    fqn = vm.reverse_lookup_global(w_obj)
+    if fqn is not None:
+        return ("global", fqn)
+    if isinstance(w_obj, W_Value):
+        w_blueval = w_obj._w_blueval
+        if w_blueval is None:
+            blueval = None
+            static_type = pack_obj(vm, w_obj.w_static_type, functypes)
+        else:
+            blueval = pack_obj(vm, w_blueval, functypes)
+            if vm.dynamic_type(w_blueval) is w_obj.w_static_type:
+                # e.g. the W_FuncType of a closure, which is not a global
+                static_type = ("typeof",)
+            else:
+                static_type = pack_obj(vm, w_obj.w_static_type, functypes)
+        return (
+            "Value",
+            w_obj.prefix,
+            w_obj.i,
+            static_type,
+            w_obj.loc,
+            w_obj.sym,
+            blueval,
+        )
+    for itemcls, listcls in Meta_W_List.CACHE.items():
+        if type(w_obj) is listcls:
+            items_w = w_obj.items_w  # type: ignore
+            items = [pack_obj(vm, w_item, functypes) for w_item in items_w]
+            return ("list", itemcls, items)
+    if isinstance(w_obj, W_FuncType) and id(w_obj) in functypes:
+        return ("functype", functypes[id(w_obj)])
+    raise CannotPack(w_obj)
+
+
+def unpack_obj(
+    vm: "SPyVM", packed: PackedObj, lookup: Callable[[FQN], W_Object]
+) -> W_Object:
+    """
+    The opposite of pack_obj. The globals are looked up by calling
+    lookup(fqn).
+    """
+    kind = packed[0]
+    if kind == "prim":
+        return vm.wrap(packed[1])
+    elif kind == "global":
+        return lookup(packed[1])
+    elif kind == "Value":
+        _, prefix, i, static_type, loc, sym, blueval = packed
+        w_blueval = None
+        if blueval is not None:
+            w_blueval = unpack_obj(vm, blueval, lookup)
+        if static_type == ("typeof",):
+            assert w_blueval is not None
+            w_static_type = vm.dynamic_type(w_blueval)
+        else:
+            w_static_type = unpack_obj(vm, static_type, lookup)
+            assert isinstance(w_static_type, W_Type)
+        return W_Value(prefix, i, w_static_type, loc, sym=sym, w_blueval=w_blueval)
+    elif kind == "list":
+        _, itemcls, items = packed
+        items_w = [unpack_obj(vm, item, lookup) for item in items]
+        return W_List[itemcls](items_w)  # type: ignore
+    elif kind == "functype":
+        w_func = lookup(packed[1])
+        assert isinstance(w_func, W_Func)
+        return w_func.w_functype
+    else:
+        assert False, f"unknown kind: {kind}"
+
+
+def find_global(log: list[LogEntry], w_obj: W_Object) -> Optional[GlobalLoc]:
+    """
+    Find w_obj in the results of the blue calls recorded in log.
+    """
+    for i in range(len(log) - 1, -1, -1):
+        w_result = log[i][2]
+        if w_result is w_obj:
+            return i, "result"
+        if isinstance(w_result, W_OpImpl) and w_result._w_func is w_obj:
+            return i, "opimpl"
+    return None
+
+
+def _redshift_chunk(
+    fqns: list[FQN], updates: list[tuple[FQN, PackedFunc]], digest: StateDigest
+) -> tuple[StateDigest, bool, list[Optional[FuncResult]]]:
+    """
+    Executed by the worker processes.
+
+    First, bring our copy of the VM in sync with the main process by storing
+    the functions which have been redshifted since we were forked. Then,
+    redshift the given functions, until we find one which cannot be merged
+    by the main process.
+
+    Return the state digest of our VM after the sync, so that the main
+    process can double check it, whether our VM has been modified (in which
+    case this process cannot be used anymore), and the results.
+    """
+    global _worker_applied
+    vm = _worker_vm
+    assert vm is not None
+    for fqn, packed in updates[_worker_applied:]:
+        w_func = vm.globals_w[fqn]
+        assert isinstance(w_func, W_ASTFunc)
+        vm._set_global(fqn, unpack_func(vm, w_func, packed))
+    _worker_applied = len(updates)
+    synced_digest = vm.state_digest()
+    res: list[Optional[FuncResult]] = [None] * len(fqns)
+    if synced_digest != digest:
+        return synced_digest, False, res
+    log: list[LogEntry] = []
+    functypes = {
+        id(w_obj.w_functype): fqn
+        for fqn, w_obj in reversed(vm.globals_w.items())
+        if isinstance(w_obj, W_Func)
+    }
+    vm.bluecache.log = log
+    try:
+        for i, fqn in enumerate(fqns):
+            result = _redshift_one(vm, fqn, log, functypes)
+            if result is None:
+                break
+            res[i] = result
+    finally:
+        vm.bluecache.log = None
+    return synced_digest, vm.state_digest() != digest, res
+
+
+def _redshift_one(
+    vm: "SPyVM", fqn: FQN, log: list[LogEntry], functypes: dict[int, FQN]
+) -> Optional[FuncResult]:
+    """
+    Redshift a function inside a worker and return what the main process
+    needs to merge it, or None if it's not possible.
+    """
+    w_func = vm.globals_w[fqn]
+    assert isinstance(w_func, W_ASTFunc)
+    digest = vm.state_digest()
+    n_globals = len(vm.globals_w)
+    n_calls = len(log)
+    try:
+        w_newfunc = redshift(vm, w_func)
+    except Exception:
+        # let the main process report the error
+        return None
+    n_new = len(vm.globals_w) - n_globals
+    if vm.state_digest() != digest.add_globals(n_new):
+        return None
+    new_fqns = list(vm.globals_w)[n_globals:] if n_new else []
+    new_globals = {}
+    for new_fqn in new_fqns:
+        w_obj = vm.globals_w[new_fqn]
+        loc = find_global(log, w_obj)
+        if loc is None:
+            return None
+        new_globals[new_fqn] = loc
+        if isinstance(w_obj, W_Func):
+            functypes.setdefault(id(w_obj.w_functype), new_fqn)
+    try:
+        calls = [
+            (
+                pack_obj(vm, w_f, functypes),
+                [pack_obj(vm, w_arg, functypes) for w_arg in args_w],
+            )
+            for w_f, args_w, _ in log[n_calls:]
+        ]
+    except CannotPack:
+        return None
+    packed = pack_func(vm, w_newfunc)
+    if packed is None:
+        return None
+    return packed, calls, new_globals
+
+
+
+def pack_func(vm: "SPyVM", w_func: W_ASTFunc) -> Optional[PackedFunc]:
+    """
+    Turn a redshifted function into something which can be pickled, or
+    return None if some of its local types is not a global.
+    """
+    assert w_func.locals_types_w is not None
+    types = {}
+    for varname, w_type in w_func.locals_types_w.items():
+        fqn = vm.reverse_lookup_global(w_type)
+        if fqn is None:
+            return None
+        types[varname] = fqn
+    return w_func.funcdef.body, types
+
+
+def unpack_func(vm: "SPyVM", w_func: W_ASTFunc, packed: PackedFunc) -> W_ASTFunc:
+    """
+    The opposite of pack_func: return the redshifted version of w_func.
+    """
+    new_body, types = packed
+    locals_types_w = {}
+    for varname, fqn in types.items():
+        w_type = vm.globals_w[fqn]
+        assert isinstance(w_type, W_Type)
+        locals_types_w[varname] = w_type
+    return make_redshifted_func(w_func, new_body, locals_types_w)
+
+
+class ChunkMerger:
+    """
+    Merge into the VM of the main process the results of a chunk of
+    functions redshifted by a worker.
+
+    The functions must be merged in order, by calling merge(): once one of
+    them cannot be merged (or is skipped), the rest of the chunk is dropped.
+    """
+
+    vm: "SPyVM"
+    results: list[Optional[FuncResult]]
+    # index of the next function to merge
+    next: int
+    # the results of the blue calls replayed so far
+    calls_w: list[W_Object]
+    # the new globals of the worker, and the FQNs that they have here
+    locs: dict[FQN, GlobalLoc]
+    fqn_map: dict[FQN, FQN]
+
+    def __init__(self, vm: "SPyVM", results: list[Optional[FuncResult]]) -> None:
+        self.vm = vm
+        self.results = results
+        self.next = 0
+        self.calls_w = []
+        self.locs = {}
+        self.fqn_map = {}
+
+    def merge(self, j: int, w_func: W_ASTFunc) -> Optional[W_ASTFunc]:
+        """
+        Return the redshifted version of w_func, which is the j-th function
+        of the chunk, or None if the caller must redshift it by itself.
+        """
+        result = self.results[j] if j == self.next else None
+        if result is None:
+            self.next = len(self.results)
+            return None
+        self.next += 1
+        packed, calls, new_globals = result
+        self.locs.update(new_globals)
+        try:
+            for packed_func, packed_args in calls:
+                w_f = unpack_obj(self.vm, packed_func, self.lookup)
+                assert isinstance(w_f, W_Func)
+                args_w = [unpack_obj(self.vm, arg, self.lookup) for arg in packed_args]
+                self.calls_w.append(self.vm.call(w_f, args_w))
+            # assign the FQNs in the same order as the worker did
+            for fqn in new_globals:
+                self.lookup(fqn)
+        except Exception:
+            self.next = len(self.results)
+            return None
+        new_body, types = packed
+        for stmt in new_body:
+            for const in stmt.walk(ast.FQNConst):
+                assert isinstance(const, ast.FQNConst)
+                const.fqn = self.fqn_map.get(const.fqn, const.fqn)
+        types = {varname: self.fqn_map.get(fqn, fqn) for varname, fqn in types.items()}
+        return unpack_func(self.vm, w_func, (new_body, types))
+
+    def lookup(self, fqn: FQN) -> W_Object:
+        """
+        Return the object which corresponds to the given FQN of the worker.
+        """
+        if fqn in self.locs:
+            if fqn not in self.fqn_map:
+                i, where = self.locs[fqn]
+                w_obj = self.calls_w[i]
+                if where == "opimpl":
+                    assert isinstance(w_obj, W_OpImpl)
+                    w_obj = w_obj._w_func
+                    assert w_obj is not None
+                new_fqn = self.vm.reverse_lookup_global(w_obj)
+                if new_fqn is None:
+                    new_fqn = assign_fqn(self.vm, w_obj)
+                self.fqn_map[fqn] = new_fqn
+            fqn = self.fqn_map[fqn]
+        w_obj = self.vm.lookup_global(fqn)
+        if w_obj is None:
+            raise KeyError(fqn)
+        return w_obj
+
+
+class RedshiftPool:
+    """
+    A pool of forked processes which redshift functions in parallel.
+
+    The workers get a copy of the VM when they are forked, and the pool is
+    reused for many calls to redshift_some(). To keep the copies in sync, the
+    main process must store the redshifted functions by calling store(): it
+    records them in `updates`, and the workers replay them before starting a
+    new chunk.
+
+    Any other change to the VM cannot be replayed: if the state digest of the
+    VM is not the one that the workers expect (e.g. because some functions
+    added new globals), the pool is restarted, i.e. the workers are forked
+    again.
+
+    If max_workers <= 1 or fork() is not available, no process is started
+    and redshift_some() does nothing.
+    """
+
+    vm: "SPyVM"
+    max_workers: int
+    executor: Optional[ProcessPoolExecutor]
+    updates: list[tuple[FQN, PackedFunc]]
+    # the state digest that the VM of the workers has after replaying all
+    # the updates
+    digest: Optional[StateDigest]
+
+    def __init__(self, vm: "SPyVM", max_workers: int) -> None:
+        self.vm = vm
+        self.max_workers = max_workers
+        self.executor = None
+        self.updates = []
+        self.digest = None
+
+    def __enter__(self) -> "RedshiftPool":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            self.max_workers > 1
+            and "fork" in multiprocessing.get_all_start_methods()
+        )
+
+    def in_sync(self) -> bool:
+        return self.executor is not None and self.vm.state_digest() == self.digest
+
+    def start(self) -> ProcessPoolExecutor:
+        global _worker_vm, _worker_applied
+        if self.executor is not None:
+            if self.in_sync():
+                return self.executor
+            self.close()
+        _worker_vm = self.vm
+        _worker_applied = 0
+        self.updates = []
+        self.digest = self.vm.state_digest()
+        # NOTE: the processes are forked when we submit the first task, so
+        # the VM must not change until then
+        self.executor = ProcessPoolExecutor(
+            self.max_workers, mp_context=multiprocessing.get_context("fork")
+        )
+        return self.executor
+
+    def close(self) -> None:
+        global _worker_vm
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+            _worker_vm = None
+
+    def store(self, fqn: FQN, w_newfunc: W_ASTFunc) -> None:
+        """
+        Store the redshifted version of fqn in the VM, and record it for the
+        workers if possible.
+        """
+        in_sync = self.in_sync()
+        self.vm._set_global(fqn, w_newfunc)
+        if in_sync:
+            packed = pack_func(self.vm, w_newfunc)
+            if packed is not None:
+                self.updates.append((fqn, packed))
+                self.digest = self.vm.state_digest()
+
+    def redshift_some(
+        self, funcs: list[tuple[FQN, W_ASTFunc]]
+    ) -> list[Optional[PendingFunc]]:
+        """
+        Try to redshift the given functions in the workers.
+
+        Return a list which contains, for each function, either a
+        (merger, index) pair or None if the caller must redshift it by
+        itself. The VM is not touched: it's up to the caller to merge the
+        results in order by calling merger.merge(index, w_func), and to store
+        the new functions by calling self.store().
+        """
+        res: list[Optional[PendingFunc]] = [None] * len(funcs)
+        if not self.enabled or len(funcs) < 2:
+            return res
+        executor = self.start()
+        n = len(funcs)
+        chunk_size = -(-n // self.max_workers)  # round up
+        chunks = [funcs[i : i + chunk_size] for i in range(0, n, chunk_size)]
+        futures = [
+            executor.submit(
+                _redshift_chunk, [fqn for fqn, _ in chunk], self.updates, self.digest
+            )
+            for chunk in chunks
+        ]
+        start = 0
+        restart = False
+        for chunk, fut in zip(chunks, futures):
+            try:
+                digest, modified, results = fut.result()
+            except Exception:
+                # e.g. the result could not be pickled: the caller will do
+                # the job
+                digest, modified, results = None, True, []
+            if digest == self.digest:
+                merger = ChunkMerger(self.vm, results)
+                for j in range(len(results)):
+                    res[start + j] = (merger, j)
+            else:
+                modified = True
+            restart = restart or modified
+            start += len(chunk)
+        if restart:
+            # some of the workers have a VM which is no longer in sync: fork
+            # new ones next time
+            self.close()
+        return res
+
+def always_returns(stmt: ast.Stmt) -> bool:
+    """
+    Return True if the execution never continues after stmt.
+    """
+    if isinstance(stmt, ast.Return):
+        return True
+    elif isinstance(stmt, ast.If):
+        return (
+            bool(stmt.then_body)
+            and bool(stmt.else_body)
+            and always_returns(stmt.then_body[-1])
+            and always_returns(stmt.else_body[-1])
+        )
+    return False
+
+
 class FuncDoppler:
     """
     Perform a redshift on a W_ASTFunc
@@ -35,24 +621,10 @@ class FuncDoppler:
         self.t = self.blue_frame.t
 
     def redshift(self) -> W_ASTFunc:
-        funcdef = self.w_func.funcdef
-        new_body = []
-        for stmt in funcdef.body:
-            new_body += self.shift_stmt(stmt)
-        new_funcdef = funcdef.replace(body=new_body)
-        new_qn = self.w_func.qn
-        # all the non-local lookups are redshifted into constants, so the
-        # closure will be empty
-        new_closure = ()
-        w_newfunctype = self.w_func.w_functype
-        w_newfunc = W_ASTFunc(
-            qn=new_qn,
-            closure=new_closure,
-            w_functype=w_newfunctype,
-            funcdef=new_funcdef,
-            locals_types_w=self.t.locals_types_w.copy(),
+        new_body = self.nonempty(self.funcdef.loc, self.shift_body(self.funcdef.body))
+        return make_redshifted_func(
+            self.w_func, new_body, self.t.locals_types_w.copy()
         )
-        return w_newfunc
 
     def blue_eval(self, expr: ast.Expr) -> ast.Expr:
         w_val = self.blue_frame.eval_expr(expr)
@@ -79,18 +651,7 @@ class FuncDoppler:
         # non-global functions
         fqn = self.vm.reverse_lookup_global(w_val)
         if fqn is None:
-            if isinstance(w_val, W_ASTFunc):
-                # it's a closure, let's assign it an FQN and add to the globals
-                fqn = self.vm.get_FQN(w_val.qn, is_global=False)
-                self.vm.add_global(fqn, None, w_val)
-            elif isinstance(w_val, W_BuiltinFunc):
-                # builtin functions MUST be unique
-                fqn = self.vm.get_FQN(w_val.qn, is_global=True)
-                self.vm.add_global(fqn, None, w_val)
-            else:
-                assert False, "implement me"
-
-        assert fqn is not None
+            fqn = assign_fqn(self.vm, w_val)
         return ast.FQNConst(loc, fqn)
 
     # =========
@@ -128,7 +689,7 @@ class FuncDoppler:
         return [vardef.replace(type=newtype)]
 
     def shift_stmt_Assign(self, assign: ast.Assign) -> list[ast.Stmt]:
-        sym = self.funcdef.symtable.lookup(assign.target)
+        sym = self.funcdef.symtable.lookup_Assign(assign)
         if sym.color == "red":
             newvalue = self.shift_expr(assign.value)
             return [assign.replace(value=newvalue)]
@@ -147,20 +708,45 @@ class FuncDoppler:
         return [stmt.replace(value=newvalue)]
 
     def shift_body(self, body: list[ast.Stmt]) -> list[ast.Stmt]:
-        newbody = []
+        """
+        Redshift a list of statements, dropping the ones which follow an
+        unconditional return.
+
+        Note that dead statements are still redshifted, so that they are
+        typechecked as usual.
+        """
+        newbody: list[ast.Stmt] = []
+        dead = False
         for stmt in body:
-            newbody += self.shift_stmt(stmt)
+            newstmts = self.shift_stmt(stmt)
+            if not dead:
+                newbody += newstmts
+                dead = bool(newbody) and always_returns(newbody[-1])
         return newbody
 
+    def nonempty(self, loc: Loc, body: list[ast.Stmt]) -> list[ast.Stmt]:
+        # a body might become empty because of dead branches, but backends
+        # expect at least a statement
+        return body or [ast.Pass(loc)]
+
     def shift_stmt_If(self, if_node: ast.If) -> list[ast.Stmt]:
         newtest = self.shift_expr(if_node.test)
         newthen = self.shift_body(if_node.then_body)
         newelse = self.shift_body(if_node.else_body)
+        if isinstance(newtest, ast.Constant):
+            # the test was blue: keep only the branch which is taken
+            if newtest.value:
+                return newthen
+            return newelse
+        newthen = self.nonempty(if_node.loc, newthen)
         return [if_node.replace(test=newtest, then_body=newthen, else_body=newelse)]
 
     def shift_stmt_While(self, while_node: ast.While) -> list[ast.While]:
         newtest = self.shift_expr(while_node.test)
         newbody = self.shift_body(while_node.body)
+        if isinstance(newtest, ast.Constant) and not newtest.value:
+            return []
+        newbody = self.nonempty(while_node.loc, newbody)
         return [while_node.replace(test=newtest, body=newbody)]
 
     # ==== expressions ====
@@ -31,22 +31,39 @@ fn_i32 = make_fn(i32)  # QN is 'test::fn', FQN is 'test::fn#1'
 fn_f64 = make_fn(f64)  # QN is 'test::fn', FQN is 'test::fn#2'
 
 See also SPyVM.get_FQN().
+
+QNs and FQNs are immutable and interned: building the same name twice returns
+the very same object. This makes it possible to precompute the hash, the
+fullname and the c_name, and to compare them by identity. They are used as
+dict keys all over the VM (e.g. vm.globals_w), so this matters.
 """
 
-from typing import Any
+from typing import Any, NoReturn
+
+
+def _readonly(self: Any, name: str, value: Any) -> NoReturn:
+    clsname = self.__class__.__name__
+    raise AttributeError(f"{clsname} objects are immutable")
 
 
 class QN:
+    __slots__ = ("modname", "attr", "fullname", "_hash")
     modname: str
     attr: str
+    fullname: str
+    _hash: int
+
+    # all the QNs ever created. Entries are never removed, so the table
+    # grows with the number of distinct names seen by the process
+    _interned: dict[tuple[str, str], "QN"] = {}
 
-    def __init__(
-        self,
+    def __new__(
+        cls,
         fullname: str | None = None,
         *,
         modname: str | None = None,
         attr: str | None = None,
-    ) -> None:
+    ) -> "QN":
         if fullname is None:
             assert modname is not None
             assert attr is not None
@@ -55,8 +72,23 @@ class QN:
             assert attr is None
             assert fullname.count("::") == 1
             modname, attr = fullname.split("::")
-        self.modname = modname
-        self.attr = attr
+        key = (modname, attr)
+        obj = cls._interned.get(key)
+        if obj is None:
+            obj = object.__new__(cls)
+            fullname = f"{modname}::{attr}"
+            object.__setattr__(obj, "modname", modname)
+            object.__setattr__(obj, "attr", attr)
+            object.__setattr__(obj, "fullname", fullname)
+            object.__setattr__(obj, "_hash", hash(fullname))
+            cls._interned[key] = obj
+        return obj
+
+    __setattr__ = _readonly
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # make sure that pickle & co. return the interned instance
+        return (QN, (self.fullname,))
 
     def __repr__(self) -> str:
         return f"QN({self.fullname!r})"
@@ -67,20 +99,24 @@ class QN:
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, QN):
             return NotImplemented
-        return self.fullname == other.fullname
+        # QNs are interned, so equal QNs are the same object
+        return self is other
 
     def __hash__(self) -> int:
-        return hash(self.fullname)
-
-    @property
-    def fullname(self) -> str:
-        return f"{self.modname}::{self.attr}"
+        return self._hash
 
 
 class FQN:
+    __slots__ = ("modname", "attr", "suffix", "fullname", "c_name", "_hash")
     modname: str
     attr: str
     suffix: str
+    fullname: str
+    c_name: str
+    _hash: int
+
+    # all the FQNs ever created, see QN._interned
+    _interned: dict[tuple[str, str, str], "FQN"] = {}
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         raise ValueError(
@@ -89,10 +125,20 @@ class FQN:
 
     @classmethod
     def make(cls, modname: str, attr: str, suffix: str) -> "FQN":
-        obj = cls.__new__(cls)
-        obj.modname = modname
-        obj.attr = attr
-        obj.suffix = suffix
+        key = (modname, attr, suffix)
+        obj = cls._interned.get(key)
+        if obj is None:
+            obj = cls.__new__(cls)
+            fullname = f"{modname}::{attr}"
+            if suffix != "":
+                fullname += "#" + suffix
+            object.__setattr__(obj, "modname", modname)
+            object.__setattr__(obj, "attr", attr)
+            object.__setattr__(obj, "suffix", suffix)
+            object.__setattr__(obj, "fullname", fullname)
+            object.__setattr__(obj, "c_name", cls._compute_c_name(*key))
+            object.__setattr__(obj, "_hash", hash(fullname))
+            cls._interned[key] = obj
         return obj
 
     @classmethod
@@ -117,12 +163,11 @@ class FQN:
         modname, attr = qn.split("::")
         return FQN.make(modname=modname, attr=attr, suffix=suffix)
 
-    @property
-    def fullname(self) -> str:
-        s = f"{self.modname}::{self.attr}"
-        if self.suffix != "":
-            s += "#" + self.suffix
-        return s
+    __setattr__ = _readonly
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # make sure that pickle & co. return the interned instance
+        return (FQN.make, (self.modname, self.attr, self.suffix))
 
     def __repr__(self) -> str:
         return f"FQN({self.fullname!r})"
@@ -133,15 +178,16 @@ class FQN:
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, FQN):
             return NotImplemented
-        return self.fullname == other.fullname
+        # FQNs are interned, so equal FQNs are the same object
+        return self is other
 
     def __hash__(self) -> int:
-        return hash(self.fullname)
+        return self._hash
 
-    @property
-    def c_name(self) -> str:
+    @staticmethod
+    def _compute_c_name(modname: str, attr: str, suffix: str) -> str:
         """
-        Return the C name for the corresponding FQN.
+        Compute the C name for the corresponding FQN.
 
         We need to do a bit of mangling:
 
@@ -161,10 +207,10 @@ class FQN:
         Becomes:
             spy_a_b_c$foo
         """
-        modname = self.modname.replace(".", "_")
-        cn = f"spy_{modname}${self.attr}"
-        if self.suffix != "":
-            cn += "$" + self.suffix
+        modname = modname.replace(".", "_")
+        cn = f"spy_{modname}${attr}"
+        if suffix != "":
+            cn += "$" + suffix
         return cn
 
     @property
@@ -0,0 +1,247 @@
+"""
+Hoist loop-invariant pure calls out of `while` loops.
+
+After redshift, the body of a loop often recomputes the same operator calls
+at every iteration, e.g. `n * 2` or `a * b + 1` where `n`, `a` and `b` are
+never modified inside the loop. We compute them once before the loop,
+store the result in a new local variable and use it inside the loop.
+
+A call can be hoisted if:
+
+  - the callee is a builtin marked as pure (see W_BuiltinFunc.pure). Pure
+    functions never raise, so it's fine to call them even if the loop runs
+    zero times, or if the call was inside an `if` which is never taken
+
+  - all its arguments are constants, other hoistable calls, or local
+    variables which are definitely assigned before the loop and never
+    assigned inside it. Globals and cells can be modified by any call, so
+    they are never invariant
+
+Identical calls inside the same loop are hoisted only once. Nested loops are
+processed from the outside in, so an expression which is invariant in both
+loops ends up outside of the outermost one.
+"""
+
+from dataclasses import fields
+from typing import TYPE_CHECKING, Any, Optional
+
+from spy import ast
+from spy.fqn import FQN
+from spy.irgen.symtable import Symbol, SymTable
+from spy.location import Loc
+from spy.vm.function import W_ASTFunc, W_BuiltinFunc
+from spy.vm.object import W_Type
+
+if TYPE_CHECKING:
+    from spy.vm.vm import SPyVM
+
+# {fqn: number of hoisted expressions}
+HoistReport = dict[FQN, int]
+
+
+def assigned_names(body: list[ast.Stmt]) -> set[str]:
+    """
+    All the local variables which might be assigned by body
+    """
+    res = set()
+    for stmt in body:
+        for node in stmt.walk():
+            if isinstance(node, ast.Assign):
+                res.add(node.target)
+            elif isinstance(node, ast.UnpackAssign):
+                res.update(node.targets)
+            elif isinstance(node, (ast.VarDef, ast.FuncDef)):
+                res.add(node.name)
+    return res
+
+
+def definitely_assigned(stmt: ast.Stmt) -> set[str]:
+    """
+    The local variables which are surely assigned after stmt has been
+    executed.
+    """
+    if isinstance(stmt, ast.Assign):
+        return {stmt.target}
+    elif isinstance(stmt, ast.UnpackAssign):
+        return set(stmt.targets)
+    elif isinstance(stmt, ast.FuncDef):
+        return {stmt.name}
+    elif isinstance(stmt, ast.If):
+        then_names = set()
+        for s in stmt.then_body:
+            then_names |= definitely_assigned(s)
+        else_names = set()
+        for s in stmt.else_body:
+            else_names |= definitely_assigned(s)
+        return then_names & else_names
+    else:
+        # in particular, the body of a While might never be executed
+        return set()
+
+
+class FuncHoister:
+    """
+    Hoist the loop-invariant calls out of all the loops of a redshifted
+    function.
+    """
+
+    vm: "SPyVM"
+    w_func: W_ASTFunc
+    symtable: SymTable
+    locals_types_w: dict[str, W_Type]
+    count: int
+    # the state of the loop which we are currently processing
+    variant: set[str]
+    defined: set[str]
+    hoisted: dict[Any, ast.Name]
+    preamble: list[ast.Stmt]
+
+    def __init__(self, vm: "SPyVM", w_func: W_ASTFunc) -> None:
+        assert w_func.locals_types_w is not None
+        self.vm = vm
+        self.w_func = w_func
+        self.symtable = w_func.funcdef.symtable.copy()
+        self.locals_types_w = w_func.locals_types_w.copy()
+        self.count = 0
+
+    def hoist(self) -> Optional[W_ASTFunc]:
+        """
+        Return the optimized version of w_func, or None if there is nothing
+        to hoist.
+        """
+        from spy.doppler import make_redshifted_func
+
+        params = {p.name for p in self.w_func.w_functype.params}
+        new_body = self.hoist_body(self.w_func.funcdef.body, params)
+        if self.count == 0:
+            return None
+        # the new variables have been added at the end of the symtable, so
+        # the existing slots don't change
+        self.symtable.assign_slots()
+        return make_redshifted_func(
+            self.w_func, new_body, self.locals_types_w, self.symtable
+        )
+
+    def hoist_body(self, body: list[ast.Stmt], defined: set[str]) -> list[ast.Stmt]:
+        """
+        Hoist the invariants of all the loops inside body. `defined` is the
+        set of locals which are definitely assigned before body, and it's
+        updated in place.
+        """
+        res: list[ast.Stmt] = []
+        for stmt in body:
+            if isinstance(stmt, ast.While):
+                res += self.hoist_While(stmt, defined)
+            elif isinstance(stmt, ast.If):
+                res.append(
+                    stmt.replace(
+                        then_body=self.hoist_body(stmt.then_body, defined.copy()),
+                        else_body=self.hoist_body(stmt.else_body, defined.copy()),
+                    )
+                )
+            else:
+                res.append(stmt)
+            defined |= definitely_assigned(stmt)
+        return res
+
+    def hoist_While(self, loop: ast.While, defined: set[str]) -> list[ast.Stmt]:
+        self.variant = assigned_names(loop.body)
+        self.defined = defined
+        self.hoisted = {}
+        self.preamble = []
+        new_loop = loop.replace(
+            test=self.rewrite(loop.test),
+            body=[self.rewrite(stmt) for stmt in loop.body],
+        )
+        preamble = self.preamble
+        # now we can process the nested loops
+        inner_defined = defined | {name.id for name in self.hoisted.values()}
+        new_loop = new_loop.replace(body=self.hoist_body(new_loop.body, inner_defined))
+        return preamble + [new_loop]
+
+    def rewrite(self, node: Any) -> Any:
+        """
+        Return a copy of node where the invariant calls are replaced by the
+        corresponding hoisted variables, or node itself if nothing changed.
+        """
+        if isinstance(node, ast.Call):
+            key = self.invariant_key(node)
+            if key is not None:
+                return self.hoist_call(node, key)
+        elif isinstance(node, ast.FuncDef):
+            return node
+        changes = {}
+        for f in fields(node):
+            value = getattr(node, f.name)
+            if isinstance(value, ast.Node):
+                new_value = self.rewrite(value)
+            elif isinstance(value, list) and value and isinstance(value[0], ast.Node):
+                new_value = [self.rewrite(item) for item in value]
+                if all(a is b for a, b in zip(new_value, value)):
+                    new_value = value
+            else:
+                continue
+            if new_value is not value:
+                changes[f.name] = new_value
+        if changes:
+            node = node.replace(**changes)
+        return node
+
+    def invariant_key(self, expr: ast.Expr) -> Any:
+        """
+        If expr is invariant in the current loop, return a hashable key
+        which identifies it, else None.
+        """
+        if isinstance(expr, ast.Constant):
+            return ("const", type(expr.value), expr.value)
+        elif isinstance(expr, ast.Name):
+            sym = self.symtable.lookup_maybe(expr.id)
+            if (
+                sym is None
+                or not sym.is_local
+                or sym.is_cell
+                or expr.id in self.variant
+                or expr.id not in self.defined
+            ):
+                return None
+            return ("name", expr.id)
+        elif isinstance(expr, ast.Call) and isinstance(expr.func, ast.FQNConst):
+            w_func = self.vm.lookup_global(expr.func.fqn)
+            if not isinstance(w_func, W_BuiltinFunc) or not w_func.pure:
+                return None
+            keys = []
+            for arg in expr.args:
+                key = self.invariant_key(arg)
+                if key is None:
+                    return None
+                keys.append(key)
+            return ("call", expr.func.fqn, *keys)
+        return None
+
+    def hoist_call(self, call: ast.Call, key: Any) -> ast.Expr:
+        name = self.hoisted.get(key)
+        if name is None:
+            assert isinstance(call.func, ast.FQNConst)
+            w_func = self.vm.lookup_global(call.func.fqn)
+            assert isinstance(w_func, W_BuiltinFunc)
+            w_restype = w_func.w_functype.w_restype
+            fqn_type = self.vm.reverse_lookup_global(w_restype)
+            if fqn_type is None:
+                return call
+            loc = call.loc
+            sym = self.new_local(loc, w_restype)
+            vardef = ast.VarDef(loc, "var", sym.name, ast.FQNConst(loc, fqn_type))
+            assign = ast.Assign(loc, loc, sym.name, call, target_sym=sym)
+            self.preamble += [vardef, assign]
+            name = self.hoisted[key] = ast.Name(loc, sym.name, sym=sym)
+            self.count += 1
+        return name.replace()
+
+    def new_local(self, loc: Loc, w_type: W_Type) -> Symbol:
+        i = 0
+        while f"_inv{i}" in self.symtable:
+            i += 1
+        sym = Symbol(f"_inv{i}", "red", loc=loc, type_loc=loc, level=0)
+        self.symtable.add(sym)
+        self.locals_types_w[sym.name] = w_type
+        return sym
@@ -0,0 +1,226 @@
+"""
+Inline small redshifted functions at their call sites.
+
+After redshift, every call to a function is an ast.Call whose func is an
+ast.FQNConst. If the callee is a red W_ASTFunc whose body is a single
+`return <expr>`, and <expr> is small enough, we can replace the call with
+<expr>, where the parameters are substituted by the arguments.
+
+To preserve the semantics, we inline only when it's obviously safe:
+
+  - <expr> can contain only calls, constants and the parameters
+
+  - arguments which are Names or Constants can be freely duplicated or
+    dropped. Any other argument must correspond to a parameter which is
+    used exactly once, there can be at most one of them, and <expr> can
+    call only the builtin operators: this way, the order in which side
+    effects happen doesn't change
+
+  - the static types must match exactly: each argument must have the type
+    of the corresponding parameter, and <expr> must have the return type
+    of the callee, else we would lose the implicit conversions which
+    happen during the call
+
+Inlining is recursive: the result of an inlined call is inlined again, but
+a function is never inlined inside itself, which guarantees termination.
+"""
+
+from dataclasses import fields
+from typing import TYPE_CHECKING, Any, Optional
+
+from spy import ast
+from spy.fqn import FQN
+from spy.vm.b import B
+from spy.vm.function import W_ASTFunc, W_Func
+from spy.vm.object import W_Type
+
+if TYPE_CHECKING:
+    from spy.vm.vm import SPyVM
+
+# maximum number of AST nodes of the expression of an inlined function
+INLINE_MAX_SIZE = 12
+
+# {(caller, callee): number of inlined call sites}
+InlineReport = dict[tuple[FQN, FQN], int]
+
+
+def is_trivial(expr: ast.Expr) -> bool:
+    return isinstance(expr, (ast.Name, ast.Constant))
+
+
+class Inliner:
+    vm: "SPyVM"
+    report: InlineReport
+
+    def __init__(self, vm: "SPyVM") -> None:
+        self.vm = vm
+        self.report = {}
+
+    def inline_func(self, fqn: FQN) -> None:
+        """
+        Inline the calls inside the redshifted function fqn, and replace it
+        with the new version if something changed.
+        """
+        from spy.doppler import make_redshifted_func
+
+        w_func = self.vm.globals_w[fqn]
+        assert isinstance(w_func, W_ASTFunc)
+        assert w_func.locals_types_w is not None
+        stack = [fqn]
+        new_body = [
+            self.rewrite(fqn, w_func, stmt, stack) for stmt in w_func.funcdef.body
+        ]
+        if any(a is not b for a, b in zip(new_body, w_func.funcdef.body)):
+            w_newfunc = make_redshifted_func(
+                w_func, new_body, w_func.locals_types_w.copy()
+            )
+            self.vm._set_global(fqn, w_newfunc)
+
+    def rewrite(
+        self, caller: FQN, w_caller: W_ASTFunc, node: Any, stack: list[FQN]
+    ) -> Any:
+        """
+        Return a copy of node where all the inlinable calls are inlined, or
+        node itself if nothing changed.
+        """
+        changes = {}
+        for f in fields(node):
+            value = getattr(node, f.name)
+            if isinstance(value, ast.Node):
+                new_value = self.rewrite(caller, w_caller, value, stack)
+            elif isinstance(value, list) and value and isinstance(value[0], ast.Node):
+                new_value = [
+                    self.rewrite(caller, w_caller, item, stack) for item in value
+                ]
+                if all(a is b for a, b in zip(new_value, value)):
+                    new_value = value
+            else:
+                continue
+            if new_value is not value:
+                changes[f.name] = new_value
+        if changes:
+            node = node.replace(**changes)
+        if isinstance(node, ast.Call):
+            node = self.inline_call_maybe(caller, w_caller, node, stack)
+        return node
+
+    def get_inlinable_expr(self, fqn: FQN) -> Optional[ast.Expr]:
+        """
+        Return the expression returned by fqn, if it's inlinable
+        """
+        w_func = self.vm.globals_w.get(fqn)
+        if (
+            not isinstance(w_func, W_ASTFunc)
+            or not w_func.redshifted
+            or w_func.color != "red"
+        ):
+            return None
+        body = w_func.funcdef.body
+        if len(body) != 1 or not isinstance(body[0], ast.Return):
+            return None
+        expr = body[0].value
+        params = {p.name for p in w_func.w_functype.params}
+        size = 0
+        for node in expr.walk():
+            size += 1
+            if isinstance(node, ast.Name):
+                if node.id not in params:
+                    return None
+            elif isinstance(node, ast.FQNConst):
+                if node.fqn == fqn:
+                    # directly recursive, inlining it is pointless
+                    return None
+            elif not isinstance(node, (ast.Call, ast.Constant)):
+                return None
+        if size > INLINE_MAX_SIZE:
+            return None
+        if self.static_type(w_func, expr) is not w_func.w_functype.w_restype:
+            return None
+        return expr
+
+    def static_type(self, w_func: W_ASTFunc, expr: ast.Expr) -> Optional[W_Type]:
+        """
+        Compute the static type of a redshifted expression inside w_func,
+        or None if we don't know it.
+        """
+        assert w_func.locals_types_w is not None
+        if isinstance(expr, ast.Constant):
+            T = type(expr.value)
+            if T is bool:
+                return B.w_bool
+            elif T is int:
+                return B.w_i32
+            elif T is float:
+                return B.w_f64
+            elif T is str:
+                return B.w_str
+            return None
+        elif isinstance(expr, ast.Name):
+            return w_func.locals_types_w.get(expr.id)
+        elif isinstance(expr, ast.Call) and isinstance(expr.func, ast.FQNConst):
+            w_callee = self.vm.globals_w.get(expr.func.fqn)
+            if isinstance(w_callee, W_Func):
+                return w_callee.w_functype.w_restype
+        return None
+
+    def inline_call_maybe(
+        self, caller: FQN, w_caller: W_ASTFunc, call: ast.Call, stack: list[FQN]
+    ) -> ast.Expr:
+        if not isinstance(call.func, ast.FQNConst):
+            return call
+        callee = call.func.fqn
+        if callee in stack:
+            # recursion guard
+            return call
+        expr = self.get_inlinable_expr(callee)
+        if expr is None:
+            return call
+        w_callee = self.vm.globals_w[callee]
+        assert isinstance(w_callee, W_ASTFunc)
+        params = w_callee.w_functype.params
+        if len(params) != len(call.args):
+            return call
+        #
+        # check the arguments
+        uses = {p.name: 0 for p in params}
+        for node in expr.walk(ast.Name):
+            assert isinstance(node, ast.Name)
+            uses[node.id] += 1
+        n_nontrivial = 0
+        for p, arg in zip(params, call.args):
+            if self.static_type(w_caller, arg) is not p.w_type:
+                return call
+            if not is_trivial(arg):
+                n_nontrivial += 1
+                if uses[p.name] != 1:
+                    return call
+        if n_nontrivial > 1:
+            return call
+        if n_nontrivial == 1:
+            for node in expr.walk(ast.FQNConst):
+                assert isinstance(node, ast.FQNConst)
+                if node.fqn.modname != "operator":
+                    return call
+        #
+        # substitute the parameters
+        args = {p.name: arg for p, arg in zip(params, call.args)}
+        new_expr = self.substitute(expr, args)
+        key = (caller, callee)
+        self.report[key] = self.report.get(key, 0) + 1
+        # inline the calls inside the new expression as well
+        stack.append(callee)
+        try:
+            return self.rewrite(caller, w_caller, new_expr, stack)
+        finally:
+            stack.pop()
+
+    def substitute(self, expr: ast.Expr, args: dict[str, ast.Expr]) -> ast.Expr:
+        if isinstance(expr, ast.Name):
+            return args[expr.id].replace()
+        elif isinstance(expr, ast.Call):
+            return expr.replace(
+                func=self.substitute(expr.func, args),
+                args=[self.substitute(arg, args) for arg in expr.args],
+            )
+        else:
+            return expr
@@ -1,22 +1,170 @@
-from typing import Any
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
 import py.path
 import spy.ast
 from spy.parser import Parser
 from spy.irgen.scope import ScopeAnalyzer
 from spy.irgen.modgen import ModuleGen
+from spy.irgen import modcache
 from spy.vm.vm import SPyVM
 from spy.vm.module import W_Module
 
 
-def make_w_mod_from_file(vm: SPyVM, f: py.path.local) -> W_Module:
+def make_w_mod_from_file(vm: SPyVM, modname: str, f: py.path.local) -> W_Module:
     """
     Glue together all the various pieces which are necessary to convert SPy
     source code into an W_Module.
+
+    Note that we cannot derive modname from the filename, because of
+    packages: e.g. module `a.b` might be in `a/b/__init__.spy`.
+    """
+    src = f.read_text("utf-8")
+    key = modcache.compute_key(vm, modname, str(f), src)
+    entry = modcache.load(vm, modname, key)
+    if entry is None:
+        parser = Parser(src, str(f))
+        mod = parser.parse()
+        return make_w_mod_from_ast(vm, modname, f, key, mod)
+    mod, mod_scope = entry
+    modgen = ModuleGen(vm, mod_scope, modname, mod, f)
+    return modgen.make_w_mod()
+
+
+def make_w_mod_from_ast(
+    vm: SPyVM, modname: str, f: py.path.local, key: str, mod: spy.ast.Module
+) -> W_Module:
+    """
+    Like make_w_mod_from_file, but starting from an already parsed module.
     """
-    parser = Parser.from_filename(str(f))
-    mod = parser.parse()
-    modname = f.purebasename
     scopes = ScopeAnalyzer(vm, modname, mod)
     scopes.analyze()
-    modgen = ModuleGen(vm, scopes, modname, mod, f)
+    mod_scope = scopes.by_module()
+    modcache.store(vm, modname, key, mod, mod_scope)
+    modgen = ModuleGen(vm, mod_scope, modname, mod, f)
     return modgen.make_w_mod()
+
+
+def parse_file(filename: str, src: str) -> spy.ast.Module:
+    """
+    Parse a single file. This is executed by the worker processes of
+    import_all, so it must not depend on the VM.
+    """
+    return Parser(src, filename).parse()
+
+
+@dataclass
+class PendingModule:
+    modname: str
+    f: py.path.local
+    src: str
+    key: str
+    # exactly one of these is set: either we found the module in the cache,
+    # or we need to wait for the parser
+    cached: Optional[modcache.Entry] = None
+    future: Optional["Future[spy.ast.Module]"] = None
+    mod: Optional[spy.ast.Module] = None
+
+    def get_mod(self) -> spy.ast.Module:
+        if self.mod is None:
+            if self.cached is not None:
+                self.mod = self.cached[0]
+            else:
+                assert self.future is not None
+                self.mod = self.future.result()
+        return self.mod
+
+    def get_deps(self) -> list[str]:
+        return [
+            decl.fqn.modname
+            for decl in self.get_mod().decls
+            if isinstance(decl, spy.ast.Import)
+        ]
+
+
+def import_all(vm: SPyVM, modnames: list[str], max_workers: int = 1) -> None:
+    """
+    Import the given modules and all the modules they import.
+
+    If max_workers > 1, the files are parsed in parallel by a pool of
+    processes, since parsing doesn't depend on the VM. Starting the pool
+    costs much more than parsing a few small files, so it's opt-in (see the
+    -j option of the spy command). Scope analysis and module execution happen
+    in the current process, one module at a time, in dependency order:
+    ScopeAnalyzer resolves the imported names against the live VM, so it
+    must run after the dependencies have been imported.
+
+    Imports which cannot be found are ignored here: they are reported by the
+    ScopeAnalyzer as usual.
+    """
+    pending: dict[str, PendingModule] = {}
+    executor: Optional[ProcessPoolExecutor] = None
+
+    def discover(modname: str, inline: bool = False) -> None:
+        if modname in vm.modules_w or modname in pending:
+            return
+        f = vm.find_module(modname)
+        if f is None:
+            return
+        src = f.read_text("utf-8")
+        key = modcache.compute_key(vm, modname, str(f), src)
+        pm = PendingModule(modname, f, src, key)
+        pm.cached = modcache.load_unchecked(vm, modname, key)
+        if pm.cached is None:
+            nonlocal executor
+            if executor is None and max_workers > 1 and not inline:
+                executor = ProcessPoolExecutor(max_workers)
+            if executor is None:
+                pm.mod = parse_file(str(f), src)
+            else:
+                pm.future = executor.submit(parse_file, str(f), src)
+        pending[modname] = pm
+
+    try:
+        # discover the import graph. The parsing happens in the background:
+        # we wait for the result only when we need the deps of a module
+        # we don't start the pool just for a single root module, since it's
+        # likely that we would end up parsing only that one
+        queue = list(modnames)
+        for modname in queue:
+            discover(modname, inline=len(queue) == 1)
+        seen = set(queue)
+        i = 0
+        while i < len(queue):
+            pm_maybe = pending.get(queue[i])
+            i += 1
+            if pm_maybe is not None:
+                for dep in pm_maybe.get_deps():
+                    if dep not in seen:
+                        seen.add(dep)
+                        discover(dep)
+                        queue.append(dep)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # import the modules in dependency order
+    done: set[str] = set()
+
+    def import_one(modname: str) -> None:
+        if modname in done or modname not in pending:
+            return
+        done.add(modname)
+        pm = pending[modname]
+        for dep in pm.get_deps():
+            import_one(dep)
+        if pm.cached is not None and modcache.check_imports(vm, pm.cached[0]):
+            mod, mod_scope = pm.cached
+            w_mod = ModuleGen(vm, mod_scope, modname, mod, pm.f).make_w_mod()
+        else:
+            if pm.cached is not None:
+                # the cached module has already been analyzed, we need a
+                # fresh one
+                pm.mod = parse_file(str(pm.f), pm.src)
+            w_mod = make_w_mod_from_ast(
+                vm, modname, pm.f, pm.key, pm.get_mod()
+            )
+        vm.modules_w[modname] = w_mod
+
+    for modname in modnames:
+        import_one(modname)
@@ -0,0 +1,153 @@
+"""
+On-disk cache for the front-end.
+
+Parsing and scope analysis (magic_py_parse, Parser and ScopeAnalyzer) are
+pure functions of the source code, so we can store their result on disk and
+reuse it as long as the source doesn't change.
+
+The cache is disabled by default. It is enabled by setting vm.cache_dir,
+which `spy --cache` points to the __spycache__ directory inside the build
+dir, and contains one pickle per module, {cache_dir}/{modname}.pickle. Each
+entry is tagged with a key which depends on:
+
+  - the content of the source file and its path (which is stored in all the
+    Locs)
+
+  - the source code of the front-end itself, so that modifying SPy
+    automatically invalidates all the caches
+
+  - the names which are exported by the builtin modules, since the
+    ScopeAnalyzer resolves them
+
+Imported names are resolved by the ScopeAnalyzer as well, but they depend on
+the state of the VM: so, when we load an entry, we check that all the
+imported names still exist, and we treat it as a miss otherwise.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+from typing import TYPE_CHECKING, Optional
+
+import py.path
+
+from spy import ast
+from spy.irgen.symtable import SymTable
+
+if TYPE_CHECKING:
+    from spy.vm.vm import SPyVM
+
+# the name of the directory used by `spy --cache`, inside the build dir
+CACHE_DIR = "__spycache__"
+
+# the modules whose source code influences the content of the cache
+FRONTEND_MODULES = [
+    "spy.ast",
+    "spy.fqn",
+    "spy.location",
+    "spy.magic_py_parse",
+    "spy.parser",
+    "spy.irgen.scope",
+    "spy.irgen.symtable",
+    "spy.irgen.modcache",
+]
+
+Entry = tuple[ast.Module, SymTable]
+
+_frontend_hash: Optional[bytes] = None
+
+
+def get_frontend_hash() -> bytes:
+    global _frontend_hash
+    if _frontend_hash is None:
+        h = hashlib.sha256()
+        h.update(sys.version.encode("utf-8"))
+        for modname in FRONTEND_MODULES:
+            __import__(modname)
+            filename = sys.modules[modname].__file__
+            assert filename is not None
+            with open(filename, "rb") as f:
+                h.update(f.read())
+        _frontend_hash = h.digest()
+    return _frontend_hash
+
+
+def compute_key(vm: "SPyVM", modname: str, filename: str, src: str) -> str:
+    h = hashlib.sha256()
+    h.update(get_frontend_hash())
+    for name in ("builtins", "operator"):
+        for fqn in vm.modules_w[name].keys():
+            h.update(fqn.fullname.encode("utf-8"))
+    h.update(modname.encode("utf-8"))
+    h.update(filename.encode("utf-8"))
+    h.update(src.encode("utf-8"))
+    return h.hexdigest()
+
+
+def get_cache_file(vm: "SPyVM", modname: str) -> Optional[py.path.local]:
+    """
+    Return the cache file for the given module, or None if the cache is
+    disabled.
+    """
+    if vm.cache_dir is None:
+        return None
+    return py.path.local(vm.cache_dir).join(f"{modname}.pickle")
+
+
+def load(vm: "SPyVM", modname: str, key: str) -> Optional[Entry]:
+    """
+    Return the cached (mod, mod_scope) for the given module, or None.
+    """
+    entry = load_unchecked(vm, modname, key)
+    if entry is None or not check_imports(vm, entry[0]):
+        return None
+    return entry
+
+
+def load_unchecked(vm: "SPyVM", modname: str, key: str) -> Optional[Entry]:
+    """
+    Like load(), but don't check the imports. The caller is responsible to
+    call check_imports() before using the entry.
+    """
+    cache_file = get_cache_file(vm, modname)
+    if cache_file is None:
+        return None
+    try:
+        with open(cache_file, "rb") as fp:
+            cached_key, mod, mod_scope = pickle.load(fp)
+    except Exception:
+        # missing or corrupted cache
+        return None
+    if cached_key != key:
+        return None
+    return mod, mod_scope
+
+
+def check_imports(vm: "SPyVM", mod: ast.Module) -> bool:
+    """
+    Check that all the names imported by mod exist. If not, the caller should
+    ignore the cache and let the ScopeAnalyzer report the error.
+    """
+    for decl in mod.decls:
+        if isinstance(decl, ast.Import) and vm.lookup_global(decl.fqn) is None:
+            return False
+    return True
+
+
+def store(
+    vm: "SPyVM", modname: str, key: str, mod: ast.Module, mod_scope: SymTable
+) -> None:
+    cache_file = get_cache_file(vm, modname)
+    if cache_file is None:
+        return
+    tmp = cache_file.new(basename=f"{cache_file.basename}.{os.getpid()}.tmp")
+    try:
+        cache_file.dirpath().ensure(dir=True)
+        with open(tmp, "wb") as fp:
+            pickle.dump((key, mod, mod_scope), fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except OSError:
+        # the cache is just an optimization: if we cannot write it (e.g.
+        # because the directory is read-only), we just go on
+        pass
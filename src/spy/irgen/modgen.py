@@ -2,7 +2,6 @@ import py
 from spy import ast
 from spy.location import Loc
 from spy.fqn import QN
-from spy.irgen.scope import ScopeAnalyzer
 from spy.irgen.symtable import SymTable
 from spy.errors import SPyTypeError
 from spy.vm.vm import SPyVM
@@ -21,18 +20,18 @@ class ModuleGen:
     vm: SPyVM
     modname: str
     mod: ast.Module
-    scopes: ScopeAnalyzer
+    mod_scope: SymTable
 
     def __init__(
         self,
         vm: SPyVM,
-        scopes: ScopeAnalyzer,
+        mod_scope: SymTable,
         modname: str,
         mod: ast.Module,
         file_spy: py.path.local,
     ) -> None:
         self.vm = vm
-        self.scopes = scopes
+        self.mod_scope = mod_scope
         self.modname = modname
         self.mod = mod
         self.file_spy = file_spy
@@ -73,7 +72,7 @@ class ModuleGen:
             args=[],
             return_type=ast.Name(loc=loc, id="object"),
             body=[],
-            symtable=self.scopes.by_module(),
+            symtable=self.mod_scope,
         )
 
     def gen_FuncDef(self, frame: ASTFrame, funcdef: ast.FuncDef) -> None:
@@ -57,6 +57,7 @@ class ScopeAnalyzer:
         for decl in self.mod.decls:
             self.flatten(decl)
         assert len(self.stack) == 2
+        self.mod_scope.assign_slots()
 
     def by_module(self) -> SymTable:
         return self.mod_scope
@@ -212,9 +213,19 @@ class ScopeAnalyzer:
             return
         # the name was found but in an outer scope. Let's "capture" it.
         assert sym
-        new_sym = sym.replace(level=level)
         assert varname not in self.scope
-        self.scope.add(new_sym)
+        if sym.fqn is not None:
+            # globals are looked up by FQN, no need for cells
+            self.scope.add(sym.replace(level=level))
+            return
+        # it's a local variable of an outer function: it must be stored in a
+        # Cell, and all the scopes in between must capture it as well, so
+        # that they can pass the cell down when they create the closure
+        sym.is_cell = True
+        for i in range(level):
+            scope = self.stack[-1 - i]
+            if varname not in scope:
+                scope.add(sym.replace(level=level - i, is_cell=False))
 
     def flatten(self, node: ast.Node) -> None:
         """
@@ -239,11 +250,14 @@ class ScopeAnalyzer:
             self.flatten(stmt)
         self.pop_scope()
         #
+        inner_scope.assign_slots()
         funcdef.symtable = inner_scope
 
     def flatten_Name(self, name: ast.Name) -> None:
         self.capture_maybe(name.id)
+        name.sym = self.scope.lookup_maybe(name.id)
 
     def flatten_Assign(self, assign: ast.Assign) -> None:
         self.capture_maybe(assign.target)
+        assign.target_sym = self.scope.lookup_maybe(assign.target)
         self.flatten(assign.value)
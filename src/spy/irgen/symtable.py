@@ -1,4 +1,5 @@
 from typing import Optional, Literal, TYPE_CHECKING, Any
+from collections.abc import Iterable
 from dataclasses import dataclass, KW_ONLY, replace
 from spy.fqn import FQN
 from spy.location import Loc
@@ -6,6 +7,7 @@ from spy.errors import SPyScopeError
 from spy.textbuilder import ColorFormatter
 
 if TYPE_CHECKING:
+    from spy import ast
     from spy.vm.vm import SPyVM
 
 Color = Literal["red", "blue"]
@@ -32,6 +34,15 @@ class Symbol:
     level: int
     fqn: FQN | None = None
 
+    # filled by SymTable.assign_slots():
+    #   - for local variables, the index in ASTFrame._locals
+    #   - for closed-over variables, the index in W_ASTFunc.closure
+    slot: int = -1
+
+    # True if this local variable is captured by some inner function: in
+    # that case, its slot contains a Cell instead of the value itself
+    is_cell: bool = False
+
     def replace(self, **kwargs: Any) -> "Symbol":
         return replace(self, **kwargs)
 
@@ -47,10 +58,17 @@ class Symbol:
 class SymTable:
     name: str  # just for debugging
     _symbols: dict[str, Symbol]
+    # see assign_slots()
+    nslots: int
+    cell_slots: list[int]
+    freevars: list[str]
 
     def __init__(self, name: str) -> None:
         self.name = name
         self._symbols = {}
+        self.nslots = 0
+        self.cell_slots = []
+        self.freevars = []
 
     @classmethod
     def from_builtins(cls, vm: "SPyVM") -> "SymTable":
@@ -82,11 +100,79 @@ class SymTable:
     def add(self, sym: Symbol) -> None:
         self._symbols[sym.name] = sym
 
+    def copy(self) -> "SymTable":
+        """
+        Make a copy which can be extended with new symbols without affecting
+        the original. The Symbols are shared, so their slots must not change:
+        call assign_slots() only if the new symbols are added at the end.
+        """
+        res = SymTable(self.name)
+        res._symbols = self._symbols.copy()
+        res.nslots = self.nslots
+        res.cell_slots = self.cell_slots[:]
+        res.freevars = self.freevars[:]
+        return res
+
+    def assign_slots(self) -> None:
+        """
+        Give an index to all the local and closed-over variables.
+
+        Local variables are stored in a fixed-size list by ASTFrame: see
+        ASTFrame._locals. Closed-over variables are stored in W_ASTFunc.closure,
+        in the same order as self.freevars.
+
+        Globals don't need a slot, because they are looked up by FQN.
+        """
+        self.nslots = 0
+        self.cell_slots = []
+        self.freevars = []
+        for sym in self._symbols.values():
+            if sym.is_local:
+                sym.slot = self.nslots
+                self.nslots += 1
+                if sym.is_cell:
+                    self.cell_slots.append(sym.slot)
+            elif sym.fqn is None:
+                sym.slot = len(self.freevars)
+                self.freevars.append(sym.name)
+
+    def symbols(self) -> Iterable[Symbol]:
+        return self._symbols.values()
+
     def lookup(self, name: str) -> Symbol:
         return self._symbols[name]
 
     def lookup_maybe(self, name: str) -> Symbol | None:
         return self._symbols.get(name)
 
+    def lookup_Name(self, name: "ast.Name") -> Symbol:
+        """
+        Like lookup(name.id), but use the Symbol cached on the node, if any.
+        """
+        sym = name.sym
+        if sym is None:
+            sym = name.sym = self._symbols[name.id]
+        return sym
+
+    def lookup_Name_maybe(self, name: "ast.Name") -> Symbol | None:
+        """
+        Like lookup_maybe(name.id), but use the Symbol cached on the node, if
+        any.
+        """
+        sym = name.sym
+        if sym is None:
+            sym = name.sym = self._symbols.get(name.id)
+        return sym
+
+    def lookup_Assign(self, assign: "ast.Assign") -> Symbol:
+        """
+        Like lookup(assign.target), but use the Symbol cached on the node, if
+        any.
+        """
+        sym = assign.target_sym
+        if sym is None:
+            sym = assign.target_sym = self._symbols[assign.target]
+        return sym
+
     def __contains__(self, name: str) -> bool:
         return name in self._symbols
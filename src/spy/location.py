@@ -1,20 +1,99 @@
 from __future__ import annotations
 
-import dataclasses
-from dataclasses import dataclass
+from typing import Any, ClassVar
+
+# number of bits used to store each of the line/col numbers inside
+# Loc._packed
+_BITS = 32
+_MASK = (1 << _BITS) - 1
 
 
-@dataclass
 class Loc:
     """
     Represent a location inside the source code
+
+    Every AST node has its own Loc, so they must be compact: the filename is
+    stored as an index into a global table of filenames, and the four
+    line/col numbers are packed into a single int. Locs are immutable.
     """
 
-    filename: str
-    line_start: int
-    line_end: int
-    col_start: int
-    col_end: int
+    __slots__ = ("_file_id", "_packed")
+    _file_id: int
+    _packed: int
+
+    # global table of all the filenames which we have seen so far
+    _filenames: ClassVar[list[str]] = []
+    _file_ids: ClassVar[dict[str, int]] = {}
+
+    def __init__(
+        self,
+        filename: str,
+        line_start: int,
+        line_end: int,
+        col_start: int,
+        col_end: int,
+    ) -> None:
+        file_id = self._file_ids.get(filename)
+        if file_id is None:
+            file_id = len(self._filenames)
+            self._filenames.append(filename)
+            self._file_ids[filename] = file_id
+        for n in (line_start, line_end, col_start, col_end):
+            assert 0 <= n <= _MASK, f"invalid line/col number: {n}"
+        object.__setattr__(self, "_file_id", file_id)
+        object.__setattr__(
+            self,
+            "_packed",
+            line_start
+            | (line_end << _BITS)
+            | (col_start << (2 * _BITS))
+            | (col_end << (3 * _BITS)),
+        )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Loc objects are immutable")
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # file ids are valid only inside the current process, so we pickle
+        # the filename instead
+        return (Loc, self.astuple())
+
+    @property
+    def filename(self) -> str:
+        return self._filenames[self._file_id]
+
+    @property
+    def line_start(self) -> int:
+        return self._packed & _MASK
+
+    @property
+    def line_end(self) -> int:
+        return (self._packed >> _BITS) & _MASK
+
+    @property
+    def col_start(self) -> int:
+        return (self._packed >> (2 * _BITS)) & _MASK
+
+    @property
+    def col_end(self) -> int:
+        return self._packed >> (3 * _BITS)
+
+    def astuple(self) -> tuple[str, int, int, int, int]:
+        return (
+            self.filename,
+            self.line_start,
+            self.line_end,
+            self.col_start,
+            self.col_end,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Loc):
+            return NotImplemented
+        return self._file_id == other._file_id and self._packed == other._packed
+
+    def __hash__(self) -> int:
+        return hash((self._file_id, self._packed))
 
     @classmethod
     def fake(cls) -> Loc:
@@ -35,8 +114,16 @@ class Loc:
         c2 = end.col_end
         return cls(start.filename, l1, l2, c1, c2)
 
-    def replace(self, **kwargs: int) -> Loc:
-        return dataclasses.replace(self, **kwargs)
+    def replace(self, **kwargs: Any) -> Loc:
+        filename, l1, l2, c1, c2 = self.astuple()
+        return Loc(
+            filename=kwargs.pop("filename", filename),
+            line_start=kwargs.pop("line_start", l1),
+            line_end=kwargs.pop("line_end", l2),
+            col_start=kwargs.pop("col_start", c1),
+            col_end=kwargs.pop("col_end", c2),
+            **kwargs,
+        )
 
     def make_end_loc(self) -> Loc:
         """
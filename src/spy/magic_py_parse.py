@@ -13,34 +13,31 @@ The idea is the following:
 2. search for pairs of NAMEs starting with 'var' (from the point of view of
    the tokenizer, 'var' is a plain NAME
 
-3. remove the 'var' token, and keep track of the location in which it was seen
+3. rewrite the source in place, replacing 'var x' with 'x' followed by the
+   same amount of whitespace, and keep track of the location in which it was
+   seen
 
-4. turn back the (modified) tokens into source code
+4. parse the rewritten source code into an AST
 
-5. parse the generated source code into an AST
+5. set "is_var = True" on the ast.Name nodes which are the targets of
+   assignments found at point (3). All the other ast.Name nodes don't have
+   the attribute at all: use getattr(node, "is_var", False) to read it.
 
-6. add a new field "is_var: bool" to all ast.Name nodes, using the infos
-   gathered at point (3)
+It is important to make sure that the rewritten source has exactly the same
+lines and columns as the original, because we want the AST to contain
+location info which match the actual file on disk: this is why the name is
+padded with whitespace.
 
-It is important to make sure that whitespace is preserved as much as possible,
-because we want the AST to contain location info which match the actual file
-on disk. For this, we use the `untokenize` module (available on PyPI) which
-does exactly that.
+If the source doesn't contain 'var' at all, we don't need to tokenize it.
 """
 
-from dataclasses import dataclass
 import ast as py_ast
-from tokenize import tokenize, NAME, TokenInfo
-from io import BytesIO
-import untokenize
+from io import StringIO
+from tokenize import generate_tokens, NAME, TokenInfo
 
-
-@dataclass(frozen=True)
-class LocInfo:
-    lineno: int
-    end_lineno: int
-    col_offset: int
-    end_col_offset: int
+# (lineno, col_offset) of the names which are declared with 'var'. Note that
+# col_offset is in UTF-8 bytes, as in the nodes of py_ast
+VarLocs = set[tuple[int, int]]
 
 
 def magic_py_parse(src: str) -> py_ast.Module:
@@ -50,34 +47,52 @@ def magic_py_parse(src: str) -> py_ast.Module:
     """
     src2, var_locs = preprocess(src)
     py_mod = py_ast.parse(src2)
+    if var_locs:
+        mark_vars(py_mod.body, var_locs)
+    return py_mod
 
-    for node in py_ast.walk(py_mod):
-        if isinstance(node, py_ast.Name):
-            assert node.end_lineno is not None
-            assert node.end_col_offset is not None
-            loc = LocInfo(
-                node.lineno, node.end_lineno, node.col_offset, node.end_col_offset
-            )
-            node.is_var = loc in var_locs
 
-    return py_mod
+def mark_vars(body: list[py_ast.stmt], var_locs: VarLocs) -> None:
+    """
+    Set is_var on the targets of the assignments found in var_locs.
+
+    'var' is valid only in front of an assignment target, so we need to look
+    only at statements, not at all the nodes.
+    """
+    for stmt in body:
+        if isinstance(stmt, py_ast.AnnAssign):
+            targets = [stmt.target]
+        elif isinstance(stmt, py_ast.Assign):
+            targets = stmt.targets
+        else:
+            targets = []
+        for target in targets:
+            if (
+                isinstance(target, py_ast.Name)
+                and (target.lineno, target.col_offset) in var_locs
+            ):
+                target.is_var = True
+        for field in ("body", "orelse", "finalbody"):
+            inner = getattr(stmt, field, None)
+            if inner:
+                mark_vars(inner, var_locs)
+        for handler in getattr(stmt, "handlers", ()):
+            mark_vars(handler.body, var_locs)
 
 
 def get_tokens(src: str) -> list[TokenInfo]:
-    readline = BytesIO(src.encode("utf-8")).readline
-    return list(tokenize(readline))
+    readline = StringIO(src).readline
+    return list(generate_tokens(readline))
 
 
-def preprocess(src: str) -> tuple[str, set[LocInfo]]:
+def preprocess(src: str) -> tuple[str, VarLocs]:
+    var_locs: VarLocs = set()
+    if "var" not in src:
+        return src, var_locs
+
     tokens = get_tokens(src)
-    newtokens = []
-    i = 0
-    N = len(tokens)
-    var_locs = set()
-
-    while i < N - 1:
-        tok0 = tokens[i]
-        tok1 = tokens[i + 1]
+    lines: list[str] | None = None
+    for tok0, tok1 in zip(tokens, tokens[1:]):
         if tok0.type == NAME and tok0.string == "var" and tok1.type == NAME:
             # tok0 is 'var'
             # tok1 is the name
@@ -89,26 +104,17 @@ def preprocess(src: str) -> tuple[str, set[LocInfo]]:
             # so that the Locs in the final AST maps to the correct places in
             # the original source code.
             var_l0, var_c0 = tok0.start
-            var_l1, var_c1 = tok0.end
-            name_l0, name_c0 = tok1.start
             name_l1, name_c1 = tok1.end
-            assert var_l0 == var_l1 == name_l0 == name_l1, "multiline var not supported"
-            spaces = " " * (name_c0 - var_c0)
-            newtok = TokenInfo(
-                NAME, tok1.string + spaces, tok0.start, tok1.end, tok1.line
-            )
-            newtokens.append(newtok)
-            # compute the location info of the future ast.Name
-            loc = LocInfo(
-                lineno=var_l0,
-                end_lineno=var_l0,
-                col_offset=var_c0,
-                end_col_offset=var_c0 + len(tok1.string),
-            )
-            var_locs.add(loc)
-            i += 1
-        else:
-            newtokens.append(tok0)
-        i += 1
-    src2 = untokenize.untokenize(newtokens)
-    return src2, var_locs
+            assert var_l0 == name_l1, "multiline var not supported"
+            if lines is None:
+                lines = src.splitlines(keepends=True)
+            line = lines[var_l0 - 1]
+            spaces = " " * (name_c1 - var_c0 - len(tok1.string))
+            lines[var_l0 - 1] = line[:var_c0] + tok1.string + spaces + line[name_c1:]
+            # the tokenizer counts characters, but the AST counts bytes
+            col_offset = len(line[:var_c0].encode("utf-8"))
+            var_locs.add((var_l0, col_offset))
+
+    if lines is None:
+        return src, var_locs
+    return "".join(lines), var_locs
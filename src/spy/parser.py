@@ -249,7 +249,7 @@ class Parser:
         assign = self.from_py_stmt_Assign(py_node)
         assert isinstance(assign, spy.ast.Assign)
         kind: spy.ast.VarKind = "const"
-        if py_node.targets[0].is_var:  # type: ignore
+        if getattr(py_node.targets[0], "is_var", False):
             kind = "var"
         vardef = spy.ast.VarDef(
             loc=py_node.loc,
@@ -277,7 +277,7 @@ class Parser:
         # local VarDef are always 'var' (for now?)
         is_local = not is_global
         kind: spy.ast.VarKind
-        if is_local or py_node.target.is_var:
+        if is_local or getattr(py_node.target, "is_var", False):
             kind = "var"
         else:
             kind = "const"
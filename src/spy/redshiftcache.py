@@ -0,0 +1,288 @@
+"""
+On-disk cache for the redshift.
+
+The redshift of a function is a pure function of its source code, of the
+"blue inputs" which it can see and of the implementation of SPy itself
+(which includes all the operators). If none of them changes, we can reuse
+the redshifted body computed by a previous run.
+
+Like modcache, the cache is disabled by default and it's enabled by setting
+vm.cache_dir (e.g. with `spy --cache`). The cache of each module is stored
+in {cache_dir}/{modname}.redshift.pickle, and maps the FQN of each function
+to (key, packed_func). The key is a hash of:
+
+  - the source code of SPy (all the .py files of the package), so that
+    modifying an operator invalidates all the caches
+
+  - the source code of the function, including its position inside the
+    file (which ends up in all the Locs of the redshifted body)
+
+  - a fingerprint of all the globals and closed-over values which the
+    function and its inner functions can see. Blue functions are
+    fingerprinted recursively by source code, red functions only by their
+    signature (the redshifted body references them by FQN). If we don't
+    know how to fingerprint a value (e.g. a module object), the function is
+    not cached.
+
+Functions whose redshift has side effects on the VM (e.g. because it gives
+an FQN to a closure) are never cached, since a cache hit would skip them.
+For the same reason, an entry is used only if all the FQNConsts which it
+contains refer to globals which already exist.
+"""
+
+import hashlib
+import os
+import pickle
+from typing import TYPE_CHECKING, Any, Optional
+
+import py.path
+
+import spy
+from spy import ast
+from spy.doppler import PackedFunc, pack_func, unpack_func
+from spy.fqn import FQN
+from spy.location import Loc
+from spy.vm.b import B
+from spy.vm.function import W_ASTFunc, W_BuiltinFunc
+from spy.vm.modules.types import W_TypeDef
+from spy.vm.object import W_Bool, W_F64, W_I32, W_Object, W_Type
+from spy.vm.opimpl import W_OpImpl
+from spy.vm.str import W_Str
+
+if TYPE_CHECKING:
+    from spy.vm.vm import SPyVM
+
+# {fqn.fullname: (key, packed_func)}
+CacheData = dict[str, tuple[str, PackedFunc]]
+
+_spy_hash: Optional[bytes] = None
+
+
+def get_spy_hash() -> bytes:
+    global _spy_hash
+    if _spy_hash is None:
+        h = hashlib.sha256()
+        root = os.path.dirname(spy.__file__)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(".py"):
+                    with open(os.path.join(dirpath, filename), "rb") as f:
+                        h.update(f.read())
+        _spy_hash = h.digest()
+    return _spy_hash
+
+
+class RedshiftCache:
+    """
+    Store and reuse the redshifted version of W_ASTFuncs across runs.
+
+    The cache files are loaded lazily, the first time that we look up a
+    function of the corresponding module, and written by flush().
+    """
+
+    vm: "SPyVM"
+    data: dict[py.path.local, CacheData]
+    dirty: set[py.path.local]
+    # the content of the source files, to compute the keys
+    lines: dict[str, Optional[list[str]]]
+    hits: int
+    misses: int
+
+    def __init__(self, vm: "SPyVM") -> None:
+        self.vm = vm
+        self.data = {}
+        self.dirty = set()
+        self.lines = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache_file(self, fqn: FQN) -> py.path.local:
+        assert self.vm.cache_dir is not None
+        cache_dir = py.path.local(self.vm.cache_dir)
+        return cache_dir.join(f"{fqn.modname}.redshift.pickle")
+
+    def get_data(self, cache_file: py.path.local) -> CacheData:
+        data = self.data.get(cache_file)
+        if data is None:
+            try:
+                with open(cache_file, "rb") as fp:
+                    data = pickle.load(fp)
+                assert isinstance(data, dict)
+            except Exception:
+                # missing or corrupted cache
+                data = {}
+            self.data[cache_file] = data
+        return data
+
+    # ======== keys ========
+
+    def compute_key(self, fqn: FQN, w_func: W_ASTFunc) -> Optional[str]:
+        """
+        Compute the cache key for w_func, or None if it cannot be cached.
+        """
+        if self.vm.cache_dir is None:
+            return None
+        fp = self.fingerprint_func(w_func, set())
+        if fp is None:
+            return None
+        h = hashlib.sha256()
+        h.update(get_spy_hash())
+        h.update(fqn.fullname.encode("utf-8"))
+        h.update(repr(fp).encode("utf-8"))
+        return h.hexdigest()
+
+    def get_source(self, loc: Loc) -> Optional[str]:
+        filename = loc.filename
+        if filename not in self.lines:
+            try:
+                with open(filename, encoding="utf-8") as f:
+                    self.lines[filename] = f.readlines()
+            except OSError:
+                self.lines[filename] = None
+        lines = self.lines[filename]
+        if lines is None:
+            return None
+        src = "".join(lines[loc.line_start - 1 : loc.line_end])
+        return f"{filename}:{loc.line_start}:{loc.col_start}\n{src}"
+
+    def fingerprint_func(self, w_func: W_ASTFunc, seen: set[int]) -> Any:
+        """
+        Return a fingerprint of the source code of w_func and of all the
+        values that it can see, or None.
+        """
+        funcdef = w_func.funcdef
+        src = self.get_source(funcdef.loc)
+        if src is None:
+            return None
+        res: list[Any] = [src]
+        # closed-over variables
+        for cell in w_func.closure:
+            if cell.w_value is None:
+                return None
+            fp = self.fingerprint(cell.w_value, seen)
+            if fp is None:
+                return None
+            res.append(fp)
+        # globals, including the ones seen by the inner functions
+        for node in funcdef.walk(ast.FuncDef):
+            assert isinstance(node, ast.FuncDef)
+            for sym in node.symtable.symbols():
+                if sym.fqn is None or sym.is_local:
+                    continue
+                if sym.color == "red":
+                    # red globals are not seen by the redshift: only their
+                    # type matters
+                    w_type = self.vm.lookup_global_type(sym.fqn)
+                    res.append(("red", sym.fqn.fullname, repr(w_type)))
+                    continue
+                w_obj = self.vm.lookup_global(sym.fqn)
+                if w_obj is None:
+                    return None
+                fp = self.fingerprint(w_obj, seen)
+                if fp is None:
+                    return None
+                res.append((sym.fqn.fullname, fp))
+        return tuple(res)
+
+    def fingerprint(self, w_obj: W_Object, seen: set[int]) -> Any:
+        vm = self.vm
+        if isinstance(w_obj, (W_I32, W_F64, W_Bool, W_Str)) or w_obj is B.w_None:
+            w_type = vm.dynamic_type(w_obj)
+            return ("value", w_type.name, repr(vm.unwrap(w_obj)))
+        elif w_obj is W_OpImpl.NULL:
+            return ("NULL",)
+        elif isinstance(w_obj, W_TypeDef):
+            # typedefs are mutable: their special methods can be set after
+            # creation
+            if id(w_obj) in seen:
+                return ("typedef", w_obj.name)
+            seen.add(id(w_obj))
+            parts = [
+                self.fingerprint(w_obj.w_origintype, seen),
+                self.fingerprint(w_obj.w_getattr, seen),
+                self.fingerprint(w_obj.w_setattr, seen),
+            ]
+            if None in parts:
+                return None
+            return ("typedef", w_obj.name, *parts)
+        elif isinstance(w_obj, W_Type):
+            return ("type", w_obj.name)
+        elif isinstance(w_obj, W_BuiltinFunc):
+            return ("builtin", str(w_obj.qn), repr(w_obj.w_functype))
+        elif isinstance(w_obj, W_ASTFunc):
+            functype = repr(w_obj.w_functype)
+            if w_obj.color == "red":
+                return ("red", str(w_obj.qn), functype)
+            if id(w_obj) in seen:
+                return ("blue", str(w_obj.qn))
+            seen.add(id(w_obj))
+            fp = self.fingerprint_func(w_obj, seen)
+            if fp is None:
+                return None
+            return ("blue", str(w_obj.qn), functype, fp)
+        else:
+            return None
+
+    # ======== lookup and store ========
+
+    def lookup(
+        self, fqn: FQN, w_func: W_ASTFunc, key: Optional[str]
+    ) -> Optional[W_ASTFunc]:
+        if key is None:
+            return None
+        data = self.get_data(self.get_cache_file(fqn))
+        entry = data.get(fqn.fullname)
+        if entry is None or entry[0] != key or not self.is_valid(entry[1]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return unpack_func(self.vm, w_func, entry[1])
+
+    def is_valid(self, packed: PackedFunc) -> bool:
+        """
+        Check that all the globals referenced by the entry exist
+        """
+        body, types = packed
+        for fqn in types.values():
+            if not isinstance(self.vm.lookup_global(fqn), W_Type):
+                return False
+        for stmt in body:
+            for const in stmt.walk(ast.FQNConst):
+                assert isinstance(const, ast.FQNConst)
+                if const.fqn not in self.vm.globals_w:
+                    return False
+        return True
+
+    def store(self, fqn: FQN, key: Optional[str], w_newfunc: W_ASTFunc) -> None:
+        if key is None:
+            return
+        packed = pack_func(self.vm, w_newfunc)
+        if packed is None:
+            return
+        for stmt in packed[0]:
+            for const in stmt.walk(ast.FQNConst):
+                assert isinstance(const, ast.FQNConst)
+                if const.fqn.suffix != "":
+                    # non-global FQNs are assigned in order of creation, so
+                    # they are not stable across runs
+                    return
+        cache_file = self.get_cache_file(fqn)
+        self.get_data(cache_file)[fqn.fullname] = (key, packed)
+        self.dirty.add(cache_file)
+
+    def flush(self) -> None:
+        """
+        Write all the modified cache files to disk
+        """
+        for cache_file in sorted(self.dirty):
+            tmp = cache_file.new(basename=f"{cache_file.basename}.{os.getpid()}.tmp")
+            try:
+                cache_file.dirpath().ensure(dir=True)
+                with open(tmp, "wb") as fp:
+                    pickle.dump(self.data[cache_file], fp, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cache_file)
+            except OSError:
+                # the cache is just an optimization, see modcache.store
+                pass
+        self.dirty.clear()
@@ -16,6 +16,14 @@ class AnythingClass:
 ANYTHING: typing.Any = AnythingClass()
 
 
+# dispatch tables used by magic_dispatch and lookup_visitor_method. They are
+# in the form {visitor_class: {prefix: {obj_class: function}}}. They are never
+# cleared, so they keep alive all the classes which they mention: this is
+# fine for the visitors and the AST nodes, which are defined at import time.
+_DISPATCH_TABLES: dict[type, dict[str, dict[type, typing.Any]]] = {}
+_VISITOR_TABLES: dict[type, dict[str, dict[type, typing.Any]]] = {}
+
+
 @typing.no_type_check
 def magic_dispatch(self, prefix, obj, *args, **kwargs):
     """
@@ -31,15 +39,53 @@ def magic_dispatch(self, prefix, obj, *args, **kwargs):
         def visit_int(self): ...
         def visit_str(self): ...
         def visit_float(self): ...
+
+    If the method doesn't exist, we fall back to `{prefix}_NotImplemented`.
+
+    The method is looked up on the class of `self`, only the first time, and
+    then stored in a per-class dispatch table. This means that:
+
+      - attributes of the instance are ignored: you cannot override a
+        visitor method on a single object, e.g. by monkeypatching it
+
+      - methods which are added to the class later are not seen
     """
-    methname = f"{prefix}_{obj.__class__.__name__}"
-    meth = getattr(self, methname, None)
+    try:
+        meth = _DISPATCH_TABLES[self.__class__][prefix][obj.__class__]
+    except KeyError:
+        meth = _fill_dispatch_table(self.__class__, prefix, obj.__class__)
+    return meth(self, obj, *args, **kwargs)
+
+
+@typing.no_type_check
+def _fill_dispatch_table(cls, prefix, objcls):
+    methname = f"{prefix}_{objcls.__name__}"
+    meth = getattr(cls, methname, None)
     if meth is None:
-        meth = getattr(self, f"{prefix}_NotImplemented", None)
+        meth = getattr(cls, f"{prefix}_NotImplemented", None)
         if meth is None:
-            clsname = self.__class__.__name__
-            raise NotImplementedError(f"{clsname}.{methname}")
-    return meth(obj, *args, **kwargs)
+            raise NotImplementedError(f"{cls.__name__}.{methname}")
+    _DISPATCH_TABLES.setdefault(cls, {}).setdefault(prefix, {})[objcls] = meth
+    return meth
+
+
+@typing.no_type_check
+def lookup_visitor_method(cls, prefix, objcls):
+    """
+    Return the unbound method `{prefix}_{objcls.__name__}` of `cls`, or None
+    if it doesn't exist.
+
+    Like magic_dispatch, the method is looked up on the class and the result
+    is cached in a per-class table, with the same caveats. Used by
+    ast.Node.visit.
+    """
+    try:
+        return _VISITOR_TABLES[cls][prefix][objcls]
+    except KeyError:
+        pass
+    meth = getattr(cls, f"{prefix}_{objcls.__name__}", None)
+    _VISITOR_TABLES.setdefault(cls, {}).setdefault(prefix, {})[objcls] = meth
+    return meth
 
 
 @typing.no_type_check
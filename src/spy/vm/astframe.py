@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from enum import Enum
 from types import NoneType
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from spy import ast
 from spy.errors import (
@@ -9,9 +10,10 @@ from spy.errors import (
     SPyRuntimeError
 )
 from spy.fqn import QN
+from spy.irgen.symtable import Symbol
 from spy.util import magic_dispatch
 from spy.vm.b import B
-from spy.vm.function import W_Func, W_FuncType, W_ASTFunc, Namespace
+from spy.vm.function import W_Func, W_FuncType, W_ASTFunc, Cell
 from spy.vm.list import W_List
 from spy.vm.object import W_Object, W_Type
 from spy.vm.tuple import W_Tuple
@@ -21,75 +23,135 @@ if TYPE_CHECKING:
     from spy.vm.vm import SPyVM
 
 
-class Return(Exception):
-    w_value: W_Object
+class Signal(Enum):
+    """
+    Non-local control flow.
 
-    def __init__(self, w_value: W_Object) -> None:
-        self.w_value = w_value
+    exec_stmt() returns None if the execution continues with the next
+    statement, or a Signal otherwise. The signal is propagated by the
+    statements which contain a body (e.g. If and While) until it reaches the
+    node which handles it.
+
+    RETURN is handled by run(): the value to return is in frame.w_result.
+    break and continue will be implemented as new signals handled by While.
+    """
+
+    RETURN = "return"
 
 
 class ASTFrame:
     vm: SPyVM
     w_func: W_ASTFunc
     funcdef: ast.FuncDef
-    _locals: Namespace
+    # one item for each local variable, indexed by Symbol.slot. The slots of
+    # variables which are captured by inner functions contain a Cell
+    _locals: list[W_Object | Cell | None]
+    # the value to return, see Signal.RETURN
+    w_result: W_Object | None
     t: TypeChecker
 
-    def __init__(self, vm: SPyVM, w_func: W_ASTFunc) -> None:
+    def __init__(
+        self, vm: SPyVM, w_func: W_ASTFunc, t: TypeChecker | None = None
+    ) -> None:
         assert isinstance(w_func, W_ASTFunc)
         self.vm = vm
         self.w_func = w_func
         self.funcdef = w_func.funcdef
-        self._locals = {}
-        self.t = TypeChecker(vm, self.w_func)
+        symtable = self.funcdef.symtable
+        self._locals = [None] * symtable.nslots
+        for i in symtable.cell_slots:
+            self._locals[i] = Cell()
+        self.w_result = None
+        if t is None:
+            t = TypeChecker(vm, self.w_func)
+        else:
+            assert t.w_func is w_func
+        self.t = t
 
     def __repr__(self) -> str:
         return f"<ASTFrame for {self.w_func.qn}>"
 
     def store_local(self, name: str, w_value: W_Object) -> None:
-        self._locals[name] = w_value
+        sym = self.funcdef.symtable.lookup(name)
+        self.store_sym(sym, w_value)
 
     def load_local(self, name: str) -> W_Object:
-        w_obj = self._locals.get(name)
+        sym = self.funcdef.symtable.lookup(name)
+        return self.load_sym(sym)
+
+    def store_sym(self, sym: Symbol, w_value: W_Object) -> None:
+        if sym.is_cell:
+            cell = self._locals[sym.slot]
+            assert isinstance(cell, Cell)
+            cell.w_value = w_value
+        else:
+            self._locals[sym.slot] = w_value
+
+    def load_sym(self, sym: Symbol) -> W_Object:
+        w_obj = self._locals[sym.slot]
+        if sym.is_cell:
+            assert isinstance(w_obj, Cell)
+            w_obj = w_obj.w_value
         if w_obj is None:
             raise SPyRuntimeError("read from uninitialized local")
+        assert isinstance(w_obj, W_Object)
         return w_obj
 
+    def get_cell(self, name: str) -> Cell:
+        """
+        Return the Cell for the given name, which must be either a captured
+        local variable or a closed-over variable.
+        """
+        sym = self.funcdef.symtable.lookup(name)
+        if sym.is_local:
+            cell = self._locals[sym.slot]
+        else:
+            cell = self.w_func.closure[sym.slot]
+        assert isinstance(cell, Cell)
+        return cell
+
     def run(self, args_w: list[W_Object]) -> W_Object:
         self.init_arguments(args_w)
-        try:
-            for stmt in self.funcdef.body:
-                self.exec_stmt(stmt)
-            #
-            # we reached the end of the function. If it's void, we can return
-            # None, else it's an error.
-            if self.w_func.w_functype.w_restype in (B.w_void, B.w_dynamic):
-                return B.w_None
-            loc = self.w_func.funcdef.loc.make_end_loc()
-            msg = "reached the end of the function without a `return`"
-            raise SPyTypeError.simple(msg, "no return", loc)
-
-        except Return as e:
-            return e.w_value
+        signal = self.exec_body(self.funcdef.body)
+        if signal is Signal.RETURN:
+            assert self.w_result is not None
+            return self.w_result
+        #
+        # we reached the end of the function. If it's void, we can return
+        # None, else it's an error.
+        if self.w_func.w_functype.w_restype in (B.w_void, B.w_dynamic):
+            return B.w_None
+        loc = self.w_func.funcdef.loc.make_end_loc()
+        msg = "reached the end of the function without a `return`"
+        raise SPyTypeError.simple(msg, "no return", loc)
 
     def init_arguments(self, args_w: list[W_Object]) -> None:
         """
         Store the arguments in args_w in the appropriate local var
         """
-        w_functype = self.w_func.w_functype
         params = self.w_func.w_functype.params
-        arglocs = [arg.loc for arg in self.funcdef.args]
-        for loc, param, w_arg in zip(arglocs, params, args_w, strict=True):
-            # we assume that the arguments' types are correct. It's not the
-            # job of astframe to raise SPyTypeError if there is a type
-            # mismatch here, it is the job of vm.call_function
-            assert self.vm.isinstance(w_arg, param.w_type)
+        # we assume that the arguments' types are correct. It's not the job
+        # of astframe to raise SPyTypeError if there is a type mismatch here,
+        # it is the job of vm.call (or of the typechecker, for
+        # vm.call_trusted). Checking them again is expensive, so we do it
+        # only in debug mode
+        if self.vm.check_trusted_calls:
+            for param, w_arg in zip(params, args_w, strict=True):
+                assert self.vm.isinstance(w_arg, param.w_type)
+        for param, w_arg in zip(params, args_w, strict=True):
             self.store_local(param.name, w_arg)
 
-    def exec_stmt(self, stmt: ast.Stmt) -> None:
+    def exec_stmt(self, stmt: ast.Stmt) -> Optional[Signal]:
         self.t.check_stmt(stmt)
         return magic_dispatch(self, "exec_stmt", stmt)
 
+    def exec_body(self, body: list[ast.Stmt]) -> Optional[Signal]:
+        for stmt in body:
+            signal = self.exec_stmt(stmt)
+            if signal is not None:
+                return signal
+        return None
+
     def eval_expr(self, expr: ast.Expr) -> W_Object:
         self.t.check_expr(expr)
         typeconv = self.t.expr_conv.get(expr)
@@ -109,9 +171,9 @@ class ASTFrame:
 
     # ==== statements ====
 
-    def exec_stmt_Return(self, ret: ast.Return) -> None:
-        w_val = self.eval_expr(ret.value)
-        raise Return(w_val)
+    def exec_stmt_Return(self, ret: ast.Return) -> Signal:
+        self.w_result = self.eval_expr(ret.value)
+        return Signal.RETURN
 
     def exec_stmt_FuncDef(self, funcdef: ast.FuncDef) -> None:
         # evaluate the functype
@@ -125,8 +187,8 @@ class ASTFrame:
         # create the w_func
         modname = self.w_func.qn.modname  # the module of the "outer" function
         qn = QN(modname=modname, attr=funcdef.name)
-        # XXX we should capture only the names actually used in the inner func
-        closure = self.w_func.closure + (self._locals,)
+        # capture only the cells actually used by the inner func
+        closure = tuple(self.get_cell(name) for name in funcdef.symtable.freevars)
         w_func = W_ASTFunc(w_functype, qn, funcdef, closure)
         self.store_local(funcdef.name, w_func)
 
@@ -136,7 +198,8 @@ class ASTFrame:
 
     def exec_stmt_Assign(self, assign: ast.Assign) -> None:
         w_val = self.eval_expr(assign.value)
-        self._exec_assign(assign.target, w_val)
+        sym = self.funcdef.symtable.lookup_Assign(assign)
+        self._exec_assign(sym, w_val)
 
     def exec_stmt_UnpackAssign(self, unpack: ast.UnpackAssign) -> None:
         w_tup = self.eval_expr(unpack.value)
@@ -148,15 +211,15 @@ class ASTFrame:
                 f"Wrong number of values to unpack: expected {exp}, got {got}"
             )
         for target, w_val in zip(unpack.targets, w_tup.items_w):
-            self._exec_assign(target, w_val)
+            sym = self.funcdef.symtable.lookup(target)
+            self._exec_assign(sym, w_val)
 
-    def _exec_assign(self, target: str, w_val: W_Object) -> None:
+    def _exec_assign(self, sym: Symbol, w_val: W_Object) -> None:
         # XXX this is semi-wrong. We need to add an AST field to keep track of
         # which scope we want to assign to. For now we just assume that if
         # it's not local, it's module.
-        sym = self.funcdef.symtable.lookup(target)
         if sym.is_local:
-            self.store_local(target, w_val)
+            self.store_sym(sym, w_val)
         elif sym.fqn is not None:
             assert sym.color == "red"
             self.vm.store_global(sym.fqn, w_val)
@@ -180,22 +243,22 @@ class ASTFrame:
     def exec_stmt_StmtExpr(self, stmt: ast.StmtExpr) -> None:
         self.eval_expr(stmt.value)
 
-    def exec_stmt_If(self, if_node: ast.If) -> None:
+    def exec_stmt_If(self, if_node: ast.If) -> Optional[Signal]:
         w_cond = self.eval_expr(if_node.test)
         if self.vm.is_True(w_cond):
-            for stmt in if_node.then_body:
-                self.exec_stmt(stmt)
+            return self.exec_body(if_node.then_body)
         else:
-            for stmt in if_node.else_body:
-                self.exec_stmt(stmt)
+            return self.exec_body(if_node.else_body)
 
-    def exec_stmt_While(self, while_node: ast.While) -> None:
+    def exec_stmt_While(self, while_node: ast.While) -> Optional[Signal]:
         while True:
             w_cond = self.eval_expr(while_node.test)
             if self.vm.is_False(w_cond):
                 break
-            for stmt in while_node.body:
-                self.exec_stmt(stmt)
+            signal = self.exec_body(while_node.body)
+            if signal is not None:
+                return signal
+        return None
 
     # ==== expressions ====
 
@@ -212,7 +275,7 @@ class ASTFrame:
         return w_value
 
     def eval_expr_Name(self, name: ast.Name) -> W_Object:
-        sym = self.w_func.funcdef.symtable.lookup(name.id)
+        sym = self.w_func.funcdef.symtable.lookup_Name(name)
         if sym.fqn is not None:
             w_value = self.vm.lookup_global(sym.fqn)
             assert (
@@ -220,9 +283,8 @@ class ASTFrame:
             ), f"{sym.fqn} not found. Bug in the ScopeAnalyzer?"
             return w_value
         if sym.is_local:
-            return self.load_local(name.id)
-        namespace = self.w_func.closure[sym.level]
-        w_value = namespace[sym.name]
+            return self.load_sym(sym)
+        w_value = self.w_func.closure[sym.slot].w_value
         assert w_value is not None
         return w_value
 
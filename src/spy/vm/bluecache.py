@@ -1,5 +1,4 @@
-from collections import defaultdict
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Optional
 
 from spy.vm.function import W_Func
 from spy.vm.object import W_Object
@@ -9,33 +8,93 @@ if TYPE_CHECKING:
 
 ARGS_W = list[W_Object]
 ENTRY = tuple[ARGS_W, W_Object]
+KEY = tuple[Any, ...]
+# (w_func, args_w, w_result), see BlueCache.log
+LogEntry = tuple[W_Func, ARGS_W, W_Object]
 
 
 class BlueCache:
     """
     Store and record the results of blue functions.
 
-    Currently this is very inefficient, because for every W_Func it records a
-    list of calls, and then during lookup it does a linear search.
+    For every W_Func we keep a dict which maps the keys of the arguments (as
+    computed by W_Object.spy_key) to the corresponding entry, so that lookups
+    are O(1).
 
-    We should use a SPy dict, as soon as we have it.
+    Arguments which don't have a key are stored in a separate list, and
+    looked up by doing a linear search which uses vm.universal_eq.
+
+    Note that entries also store args_w: this is needed to keep the
+    arguments alive, since some keys are based on id().
     """
 
     vm: "SPyVM"
-    data: defaultdict[W_Func, list[ENTRY]]
+    data: dict[W_Func, dict[KEY, ENTRY]]
+    slow_data: dict[W_Func, list[ENTRY]]
+    hits: int
+    misses: int
+    # total number of recorded entries
+    records: int
+    # if not None, all the recorded entries are appended here: this is used
+    # by the workers of doppler.RedshiftPool
+    log: Optional[list[LogEntry]]
 
     def __init__(self, vm: "SPyVM"):
         self.vm = vm
-        self.data = defaultdict(list)
+        self.data = {}
+        self.slow_data = {}
+        self.hits = 0
+        self.misses = 0
+        self.records = 0
+        self.log = None
+
+    def make_key(self, args_w: ARGS_W) -> Optional[KEY]:
+        """
+        Compute the key for the given args_w, or None if at least one of the
+        args doesn't have a key.
+        """
+        keys = []
+        for w_arg in args_w:
+            key = w_arg.spy_key(self.vm)
+            if key is None:
+                return None
+            keys.append(key)
+        return tuple(keys)
 
     def record(self, w_func: W_Func, args_w: ARGS_W, w_result: W_Object) -> None:
+        self.records += 1
+        if self.log is not None:
+            self.log.append((w_func, args_w, w_result))
         entry = (args_w, w_result)
-        self.data[w_func].append(entry)
+        key = self.make_key(args_w)
+        if key is None:
+            self.slow_data.setdefault(w_func, []).append(entry)
+        else:
+            self.data.setdefault(w_func, {})[key] = entry
 
     def lookup(self, w_func: W_Func, got_args_w: ARGS_W) -> W_Object | None:
-        entries = self.data[w_func]
-        # if w_func.qn == QN('operator::CALL_METHOD'):
-        # import pdb;pdb.set_trace()
+        w_result = self._lookup(w_func, got_args_w)
+        if w_result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return w_result
+
+    def _lookup(self, w_func: W_Func, got_args_w: ARGS_W) -> W_Object | None:
+        hashed = self.data.get(w_func, {})
+        slow_entries = self.slow_data.get(w_func, [])
+        key = self.make_key(got_args_w)
+        if key is None:
+            # we cannot hash the args, so we need to compare them against
+            # ALL the recorded entries
+            entries = list(hashed.values()) + slow_entries
+        else:
+            entry = hashed.get(key)
+            if entry is not None:
+                return entry[1]
+            # the args might still be equal to some args which don't have a
+            # key
+            entries = slow_entries
         for args_w, w_result in entries:
             if self.args_w_eq(args_w, got_args_w):
                 return w_result
@@ -0,0 +1,387 @@
+"""
+Alternative execution engine for W_ASTFunc.
+
+ASTFrame walks the AST at every execution: for every node it has to compute
+the name of the method to call (see magic_dispatch), and to look up the
+results of the typechecker (opimpls, type converters, symbols, etc.).
+
+ClosureFrame has exactly the same semantics, but the first time that a node
+is executed it is "compiled" into a Python closure which has all these infos
+pre-bound: the next executions just call the closure.
+
+Compilation is lazy and happens node by node, so that type errors are
+reported exactly at the same time as ASTFrame would (e.g., a type error in
+a branch which is never executed is never reported).
+
+The closures are valid only as long as the TypeChecker which they were
+compiled against: see W_ASTFunc.spy_call and TypeChecker.is_reusable().
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from spy import ast
+from spy.errors import SPyRuntimeError, SPyTypeError
+from spy.util import magic_dispatch
+from spy.vm.astframe import ASTFrame, Signal
+from spy.vm.b import B
+from spy.vm.function import W_ASTFunc, W_Func
+from spy.vm.object import W_Object
+from spy.vm.typechecker import TypeChecker
+
+if TYPE_CHECKING:
+    from spy.vm.vm import SPyVM
+
+StmtFn = Callable[["ClosureFrame"], Signal | None]
+ExprFn = Callable[["ClosureFrame"], W_Object]
+
+
+class ClosureFrame(ASTFrame):
+    code: ClosureCompiler
+
+    def __init__(self, vm: SPyVM, w_func: W_ASTFunc, t: TypeChecker) -> None:
+        super().__init__(vm, w_func, t)
+        code = w_func.cached_code
+        if code is None or code.t is not t:
+            code = ClosureCompiler(vm, w_func, t)
+            w_func.cached_code = code
+        self.code = code
+
+    def __repr__(self) -> str:
+        return f"<ClosureFrame for {self.w_func.qn}>"
+
+    def exec_stmt(self, stmt: ast.Stmt) -> Signal | None:
+        fn = self.code.stmts.get(stmt)
+        if fn is None:
+            fn = self.code.compile_stmt(stmt)
+        return fn(self)
+
+    def eval_expr(self, expr: ast.Expr) -> W_Object:
+        fn = self.code.exprs.get(expr)
+        if fn is None:
+            fn = self.code.compile_expr(expr)
+        return fn(self)
+
+
+class ClosureCompiler:
+    """
+    Compile the statements and expressions of a W_ASTFunc into closures.
+
+    Each closure takes the ClosureFrame as its only argument.
+    """
+
+    vm: SPyVM
+    w_func: W_ASTFunc
+    t: TypeChecker
+    stmts: dict[ast.Stmt, StmtFn]
+    exprs: dict[ast.Expr, ExprFn]
+
+    def __init__(self, vm: SPyVM, w_func: W_ASTFunc, t: TypeChecker) -> None:
+        self.vm = vm
+        self.w_func = w_func
+        self.t = t
+        self.stmts = {}
+        self.exprs = {}
+
+    def compile_stmt(self, stmt: ast.Stmt) -> StmtFn:
+        self.t.check_stmt(stmt)
+        fn = magic_dispatch(self, "compile_stmt", stmt)
+        self.stmts[stmt] = fn
+        return fn
+
+    def compile_expr(self, expr: ast.Expr) -> ExprFn:
+        self.t.check_expr(expr)
+        fn = magic_dispatch(self, "compile_expr", expr)
+        typeconv = self.t.expr_conv.get(expr)
+        if typeconv is not None:
+            # apply the type converter
+            vm = self.vm
+            unconverted_fn = fn
+
+            def fn(frame: ClosureFrame) -> W_Object:
+                return typeconv.convert(vm, unconverted_fn(frame))
+
+        self.exprs[expr] = fn
+        return fn
+
+    # ==== generic fallbacks ====
+    #
+    # Nodes which don't have a specialized compile_* method are executed by
+    # the corresponding ASTFrame method: this is fine for the nodes which are
+    # rarely executed, e.g. FuncDef and VarDef. Note that they still use
+    # compiled closures for their children, because they call
+    # frame.exec_stmt() and frame.eval_expr().
+
+    def compile_stmt_NotImplemented(self, stmt: ast.Stmt) -> StmtFn:
+        methname = f"exec_stmt_{stmt.__class__.__name__}"
+        meth = getattr(ClosureFrame, methname, None)
+        if meth is None:
+            raise NotImplementedError(f"ClosureFrame.{methname}")
+
+        def exec_generic(frame: ClosureFrame) -> Signal | None:
+            return meth(frame, stmt)
+
+        return exec_generic
+
+    def compile_expr_NotImplemented(self, expr: ast.Expr) -> ExprFn:
+        methname = f"eval_expr_{expr.__class__.__name__}"
+        meth = getattr(ClosureFrame, methname, None)
+        if meth is None:
+            raise NotImplementedError(f"ClosureFrame.{methname}")
+
+        def eval_generic(frame: ClosureFrame) -> W_Object:
+            return meth(frame, expr)
+
+        return eval_generic
+
+    def compile_body(self, body: list[ast.Stmt]) -> StmtFn:
+        # the statements of the body are compiled lazily by frame.exec_stmt,
+        # to make sure that we typecheck only the ones which are executed
+        def exec_body(frame: ClosureFrame) -> Signal | None:
+            for stmt in body:
+                signal = frame.exec_stmt(stmt)
+                if signal is not None:
+                    return signal
+            return None
+
+        return exec_body
+
+    # ==== statements ====
+
+    def compile_stmt_Return(self, ret: ast.Return) -> StmtFn:
+        value_fn = self.compile_expr(ret.value)
+
+        def exec_return(frame: ClosureFrame) -> Signal:
+            frame.w_result = value_fn(frame)
+            return Signal.RETURN
+
+        return exec_return
+
+    def compile_stmt_StmtExpr(self, stmt: ast.StmtExpr) -> StmtFn:
+        value_fn = self.compile_expr(stmt.value)
+
+        def exec_stmtexpr(frame: ClosureFrame) -> None:
+            value_fn(frame)
+
+        return exec_stmtexpr
+
+    def compile_stmt_Assign(self, assign: ast.Assign) -> StmtFn:
+        value_fn = self.compile_expr(assign.value)
+        sym = self.w_func.funcdef.symtable.lookup_Assign(assign)
+        if sym.is_cell:
+
+            def exec_assign_cell(frame: ClosureFrame) -> None:
+                frame.store_sym(sym, value_fn(frame))
+
+            return exec_assign_cell
+
+        elif sym.is_local:
+            slot = sym.slot
+
+            def exec_assign_local(frame: ClosureFrame) -> None:
+                frame._locals[slot] = value_fn(frame)
+
+            return exec_assign_local
+
+        elif sym.fqn is not None:
+            assert sym.color == "red"
+            vm = self.vm
+            fqn = sym.fqn
+
+            def exec_assign_global(frame: ClosureFrame) -> None:
+                vm.store_global(fqn, value_fn(frame))
+
+            return exec_assign_global
+
+        else:
+            assert False, "closures not implemented yet"
+
+    def compile_stmt_If(self, if_node: ast.If) -> StmtFn:
+        test_fn = self.compile_expr(if_node.test)
+        then_fn = self.compile_body(if_node.then_body)
+        else_fn = self.compile_body(if_node.else_body)
+        w_True = B.w_True
+
+        def exec_if(frame: ClosureFrame) -> Signal | None:
+            if test_fn(frame) is w_True:
+                return then_fn(frame)
+            else:
+                return else_fn(frame)
+
+        return exec_if
+
+    def compile_stmt_While(self, while_node: ast.While) -> StmtFn:
+        test_fn = self.compile_expr(while_node.test)
+        body_fn = self.compile_body(while_node.body)
+        w_False = B.w_False
+
+        def exec_while(frame: ClosureFrame) -> Signal | None:
+            while test_fn(frame) is not w_False:
+                signal = body_fn(frame)
+                if signal is not None:
+                    return signal
+            return None
+
+        return exec_while
+
+    # ==== expressions ====
+
+    def compile_expr_Constant(self, const: ast.Constant) -> ExprFn:
+        # constants are immutable, so we can wrap them only once
+        w_const = self.vm.wrap(const.value)
+
+        def eval_constant(frame: ClosureFrame) -> W_Object:
+            return w_const
+
+        return eval_constant
+
+    def compile_expr_FQNConst(self, const: ast.FQNConst) -> ExprFn:
+        # NOTE: we cannot prebind the value, because the global might be
+        # replaced (e.g. by vm.redshift())
+        vm = self.vm
+        fqn = const.fqn
+
+        def eval_fqnconst(frame: ClosureFrame) -> W_Object:
+            w_value = vm.lookup_global(fqn)
+            assert w_value is not None
+            return w_value
+
+        return eval_fqnconst
+
+    def compile_expr_Name(self, name: ast.Name) -> ExprFn:
+        sym = self.w_func.funcdef.symtable.lookup_Name(name)
+        if sym.fqn is not None:
+            vm = self.vm
+            fqn = sym.fqn
+
+            def eval_global(frame: ClosureFrame) -> W_Object:
+                w_value = vm.lookup_global(fqn)
+                assert w_value is not None, f"{fqn} not found. Bug in the ScopeAnalyzer?"
+                return w_value
+
+            return eval_global
+
+        if sym.is_cell:
+
+            def eval_cell(frame: ClosureFrame) -> W_Object:
+                return frame.load_sym(sym)
+
+            return eval_cell
+
+        if sym.is_local:
+            slot = sym.slot
+
+            def eval_local(frame: ClosureFrame) -> W_Object:
+                w_value = frame._locals[slot]
+                if w_value is None:
+                    raise SPyRuntimeError("read from uninitialized local")
+                return w_value  # type: ignore
+
+            return eval_local
+
+        cell = self.w_func.closure[sym.slot]
+
+        def eval_outer(frame: ClosureFrame) -> W_Object:
+            w_value = cell.w_value
+            assert w_value is not None
+            return w_value
+
+        return eval_outer
+
+    def compile_expr_BinOp(self, binop: ast.BinOp) -> ExprFn:
+        w_opimpl = self.t.opimpl[binop]
+        assert w_opimpl, "bug in the typechecker"
+        vm = self.vm
+        l_fn = self.compile_expr(binop.left)
+        r_fn = self.compile_expr(binop.right)
+
+        def eval_binop(frame: ClosureFrame) -> W_Object:
+            w_l = l_fn(frame)
+            w_r = r_fn(frame)
+            return w_opimpl.call(vm, [w_l, w_r])
+
+        return eval_binop
+
+    compile_expr_Add = compile_expr_BinOp
+    compile_expr_Sub = compile_expr_BinOp
+    compile_expr_Mul = compile_expr_BinOp
+    compile_expr_Div = compile_expr_BinOp
+    compile_expr_Eq = compile_expr_BinOp
+    compile_expr_NotEq = compile_expr_BinOp
+    compile_expr_Lt = compile_expr_BinOp
+    compile_expr_LtE = compile_expr_BinOp
+    compile_expr_Gt = compile_expr_BinOp
+    compile_expr_GtE = compile_expr_BinOp
+
+    def compile_expr_Call(self, call: ast.Call) -> ExprFn:
+        color, w_functype = self.t.check_expr(call.func)
+        w_opimpl = self.t.opimpl[call]
+        vm = self.vm
+        func_fn = self.compile_expr(call.func)
+        args_fns = [self.compile_expr(arg) for arg in call.args]
+        is_direct_call = w_opimpl.is_direct_call()
+        w_STATIC_TYPE = B.w_STATIC_TYPE
+
+        def eval_call(frame: ClosureFrame) -> W_Object:
+            w_func = func_fn(frame)
+
+            # STATIC_TYPE is a special case, because it doesn't evaluate its
+            # arguments
+            if w_func is w_STATIC_TYPE:
+                return frame._eval_STATIC_TYPE(call)
+
+            if is_direct_call:
+                # see ASTFrame.eval_expr_Call
+                assert color == "blue", "indirect calls not supported"
+                if w_functype is B.w_dynamic:
+                    if not isinstance(w_func, W_Func):
+                        t = vm.dynamic_type(w_func)
+                        raise SPyTypeError(f"cannot call objects of type `{t.name}`")
+                else:
+                    assert isinstance(w_func, W_Func)
+
+            args_w = [w_func] + [fn(frame) for fn in args_fns]
+            return w_opimpl.call(vm, args_w)
+
+        return eval_call
+
+    def compile_expr_CallMethod(self, op: ast.CallMethod) -> ExprFn:
+        w_opimpl = self.t.opimpl[op]
+        vm = self.vm
+        target_fn = self.compile_expr(op.target)
+        w_method = vm.wrap(op.method)
+        args_fns = [self.compile_expr(arg) for arg in op.args]
+
+        def eval_callmethod(frame: ClosureFrame) -> W_Object:
+            w_target = target_fn(frame)
+            args_w = [w_target, w_method] + [fn(frame) for fn in args_fns]
+            return w_opimpl.call(vm, args_w)
+
+        return eval_callmethod
+
+    def compile_expr_GetItem(self, op: ast.GetItem) -> ExprFn:
+        w_opimpl = self.t.opimpl[op]
+        vm = self.vm
+        value_fn = self.compile_expr(op.value)
+        index_fn = self.compile_expr(op.index)
+
+        def eval_getitem(frame: ClosureFrame) -> W_Object:
+            w_val = value_fn(frame)
+            w_i = index_fn(frame)
+            return w_opimpl.call(vm, [w_val, w_i])
+
+        return eval_getitem
+
+    def compile_expr_GetAttr(self, op: ast.GetAttr) -> ExprFn:
+        w_opimpl = self.t.opimpl[op]
+        vm = self.vm
+        value_fn = self.compile_expr(op.value)
+        w_attr = vm.wrap(op.attr)
+
+        def eval_getattr(frame: ClosureFrame) -> W_Object:
+            w_val = value_fn(frame)
+            return w_opimpl.call(vm, [w_val, w_attr])
+
+        return eval_getattr
@@ -10,13 +10,30 @@ from spy.vm.object import W_Object, W_Type, W_Void
 
 if TYPE_CHECKING:
     from spy.vm.vm import SPyVM
+    from spy.vm.typechecker import TypeChecker
+    from spy.vm.closureframe import ClosureCompiler
 
 # we cannot import B due to circular imports, let's fake it
 B_w_Void = W_Void._w
 
-# dictionary which contains local vars in an ASTFrame. The type is defined
-# here because it's also used by W_ASTFunc.closure.
-Namespace = dict[str, Optional[W_Object]]
+
+class Cell:
+    """
+    Box containing a local variable which is captured by some inner function.
+
+    The outer ASTFrame stores the Cell in its _locals, and W_ASTFunc.closure
+    contains the cells of all the variables referenced by the inner function,
+    so that both see the same value.
+    """
+
+    __slots__ = ("w_value",)
+    w_value: Optional[W_Object]
+
+    def __init__(self, w_value: Optional[W_Object] = None) -> None:
+        self.w_value = w_value
+
+    def __repr__(self) -> str:
+        return f"<Cell {self.w_value}>"
 
 
 @dataclass
@@ -158,17 +175,23 @@ class W_DirectCall(W_Func):
 
 class W_ASTFunc(W_Func):
     funcdef: ast.FuncDef
-    closure: tuple[Namespace, ...]
+    # one Cell for each name in funcdef.symtable.freevars
+    closure: tuple[Cell, ...]
     # types of local variables: this is non-None IIF the function has been
     # redshifted.
     locals_types_w: dict[str, W_Type] | None
+    # the TypeChecker used by the last call, which is reused by the next
+    # calls as long as it's still valid: see TypeChecker.is_reusable()
+    cached_typechecker: Optional["TypeChecker"]
+    # the closures compiled by ClosureFrame, see closureframe.py
+    cached_code: Optional["ClosureCompiler"]
 
     def __init__(
         self,
         w_functype: W_FuncType,
         qn: QN,
         funcdef: ast.FuncDef,
-        closure: tuple[Namespace, ...],
+        closure: tuple[Cell, ...],
         *,
         locals_types_w: dict[str, W_Type] | None = None,
     ) -> None:
@@ -177,6 +200,8 @@ class W_ASTFunc(W_Func):
         self.funcdef = funcdef
         self.closure = closure
         self.locals_types_w = locals_types_w
+        self.cached_typechecker = None
+        self.cached_code = None
 
     @property
     def redshifted(self) -> bool:
@@ -193,8 +218,19 @@ class W_ASTFunc(W_Func):
 
     def spy_call(self, vm: "SPyVM", args_w: list[W_Object]) -> W_Object:
         from spy.vm.astframe import ASTFrame
+        from spy.vm.typechecker import TypeChecker
 
-        frame = ASTFrame(vm, self)
+        t = self.cached_typechecker
+        if t is None or not t.is_reusable():
+            t = TypeChecker(vm, self)
+            self.cached_typechecker = t
+        frame: ASTFrame
+        if vm.interp_engine == "closure":
+            from spy.vm.closureframe import ClosureFrame
+
+            frame = ClosureFrame(vm, self, t)
+        else:
+            frame = ASTFrame(vm, self, t)
         return frame.run(args_w)
 
 
@@ -205,13 +241,35 @@ class W_BuiltinFunc(W_Func):
     """
 
     pyfunc: Callable
+    # arith functions are simple red functions (e.g. i32_add) which don't
+    # need the services offered by vm.call: if the types of the arguments
+    # have already been checked, W_OpImpl.call can invoke _pyfunc directly.
+    # Note that this bypasses vm.call_trusted too: when
+    # vm.check_trusted_calls is set, the fast path is disabled so that the
+    # debug checks are done also for them.
+    arith: bool
+    # pure functions have no side effects and never raise: calling them
+    # twice with the same arguments gives the same result, and a call whose
+    # result is not needed can be skipped. See spy.hoister.
+    pure: bool
 
-    def __init__(self, w_functype: W_FuncType, qn: QN, pyfunc: Callable) -> None:
+    def __init__(
+        self,
+        w_functype: W_FuncType,
+        qn: QN,
+        pyfunc: Callable,
+        *,
+        arith: bool = False,
+        pure: bool = False,
+    ) -> None:
+        assert not (arith and w_functype.color == "blue")
         self.w_functype = w_functype
         self.qn = qn
         # _pyfunc should NEVER be called directly, because it bypasses the
-        # bluecache
+        # bluecache. The only exception are arith functions, see above
         self._pyfunc = pyfunc
+        self.arith = arith
+        self.pure = pure
 
     def __repr__(self) -> str:
         return f"<spy function '{self.qn}' (builtin)>"
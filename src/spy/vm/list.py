@@ -121,6 +121,16 @@ def _make_W_List(w_T: W_Type) -> type[W_List]:
         def spy_unwrap(self, vm: "SPyVM") -> list[Any]:
             return [vm.unwrap(w_item) for w_item in self.items_w]
 
+        def spy_key(self, vm: "SPyVM") -> Any:
+            # lists compare by value, see op_EQ below
+            keys = []
+            for w_item in self.items_w:
+                key = w_item.spy_key(vm)
+                if key is None:
+                    return None
+                keys.append(key)
+            return ("list", id(W_MyList), tuple(keys))
+
         @staticmethod
         def op_GETITEM(vm: "SPyVM", wv_obj: "W_Value", wv_i: "W_Value") -> W_OpImpl:
             @no_type_check
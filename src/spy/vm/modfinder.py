@@ -0,0 +1,97 @@
+import os
+from typing import Optional
+import py.path
+
+
+class ModuleFinder:
+    """
+    Find the .spy file which contains a given module.
+
+    All the entries of `path` are searched in order. A module `a.b.c` is
+    found either as a package, `{entry}/a/b/c/__init__.spy`, or as a single
+    file, `{entry}/a/b/c.spy`; if both exist, the package wins.
+
+    To avoid stat()ing every candidate file for every module, we list each
+    directory only once and cache the result: `listings` maps a dirname to
+    a dict {entry_name: is_dir}, or to None if the directory doesn't exist.
+    The cached listings can become stale if files are created after we list
+    a directory: this is why find() retries with fresh listings before
+    giving up.
+
+    `locations` records the file where each module was found. Once a module
+    has been resolved, it always resolves to the same file until
+    invalidate_caches() is called: the modcache key includes the path of
+    the file, so this is what allows to reuse the cache across runs.
+    """
+
+    path: list[str]
+    listings: dict[str, Optional[dict[str, bool]]]
+    locations: dict[str, py.path.local]
+
+    def __init__(self, path: list[str]) -> None:
+        # NOTE: this is the very same list as vm.path, so that modifications
+        # to it are seen by the finder
+        self.path = path
+        self.listings = {}
+        self.locations = {}
+
+    def invalidate_caches(self) -> None:
+        self.listings.clear()
+        self.locations.clear()
+
+    def find(self, modname: str) -> Optional[py.path.local]:
+        """
+        Return the .spy file which contains the given module, or None.
+        """
+        f = self.locations.get(modname)
+        if f is not None:
+            return f
+        f = self._find(modname)
+        if f is None and self.listings:
+            # maybe the module was created after we listed the directories:
+            # try again with fresh listings. This costs a full re-listing,
+            # but it happens only for modules which are not found, which is
+            # usually an error anyway.
+            self.listings.clear()
+            f = self._find(modname)
+        if f is not None:
+            self.locations[modname] = f
+        return f
+
+    def _find(self, modname: str) -> Optional[py.path.local]:
+        *pkgs, name = modname.split(".")
+        for entry in self.path:
+            dirname = entry
+            for pkg in pkgs:
+                if not self._isdir(dirname, pkg):
+                    break
+                dirname = os.path.join(dirname, pkg)
+            else:
+                pkgdir = os.path.join(dirname, name)
+                if self._isdir(dirname, name) and self._isfile(pkgdir, "__init__.spy"):
+                    return py.path.local(pkgdir).join("__init__.spy")
+                if self._isfile(dirname, f"{name}.spy"):
+                    return py.path.local(dirname).join(f"{name}.spy")
+        return None
+
+    def _listdir(self, dirname: str) -> Optional[dict[str, bool]]:
+        try:
+            return self.listings[dirname]
+        except KeyError:
+            pass
+        listing: Optional[dict[str, bool]]
+        try:
+            with os.scandir(dirname) as it:
+                listing = {e.name: e.is_dir() for e in it}
+        except OSError:
+            listing = None
+        self.listings[dirname] = listing
+        return listing
+
+    def _isdir(self, dirname: str, name: str) -> bool:
+        listing = self._listdir(dirname)
+        return listing is not None and listing.get(name) is True
+
+    def _isfile(self, dirname: str, name: str) -> bool:
+        listing = self._listdir(dirname)
+        return listing is not None and listing.get(name) is False
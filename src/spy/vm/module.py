@@ -17,6 +17,7 @@ class W_Module(W_Object):
     vm: "SPyVM"
     name: str
     filepath: str
+    fqns: list[FQN]
     _frozen: bool
     __spy_storage_category__ = "reference"
 
@@ -24,6 +25,10 @@ class W_Module(W_Object):
         self.vm = vm
         self.name = name
         self.filepath = filepath
+        # the FQNs of all the globals of this module, in insertion order. It
+        # is kept up to date by vm.add_global, so that keys() and items_w()
+        # don't need to scan all the vm.globals_w
+        self.fqns = []
 
     def __repr__(self) -> str:
         return f"<spy module {self.name}>"
@@ -84,14 +89,12 @@ class W_Module(W_Object):
         self.vm.store_global(fqn, w_value)
 
     def keys(self) -> Iterable[FQN]:
-        for fqn in self.vm.globals_w.keys():
-            if fqn.modname == self.name:
-                yield fqn
+        return iter(self.fqns)
 
     def items_w(self) -> Iterable[tuple[FQN, W_Object]]:
-        for fqn, w_obj in self.vm.globals_w.items():
-            if fqn.modname == self.name:
-                yield fqn, w_obj
+        globals_w = self.vm.globals_w
+        for fqn in self.fqns:
+            yield fqn, globals_w[fqn]
 
     def pp(self) -> None:
         """
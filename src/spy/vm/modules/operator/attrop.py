@@ -110,6 +110,7 @@ def opimpl_member(kind: OpKind, vm: "SPyVM", w_type: W_Type, attr: str) -> W_OpI
             vm: "SPyVM", w_obj: W_Class, w_attr: W_Str, w_val: W_Value
         ) -> W_Void:
             setattr(w_obj, field, w_val)
+            vm.objects_version += 1
 
         return W_OpImpl.simple(vm.wrap_func(opimpl_set))
 
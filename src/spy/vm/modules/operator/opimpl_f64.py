@@ -1,5 +1,6 @@
-from typing import TYPE_CHECKING, Any
-from spy.vm.object import W_Object, W_F64, W_Bool
+from typing import TYPE_CHECKING
+from spy.vm.b import B
+from spy.vm.object import W_F64, W_Bool
 from . import OP
 
 if TYPE_CHECKING:
@@ -7,62 +8,65 @@ if TYPE_CHECKING:
 
 # the following style is a bit too verbose. We could greatly reduce code
 # duplication by using some metaprogramming, but it might become too
-# magic. Or, it would be nice to have automatic unwrapping.
-# Let's to the dumb&verbose thing for now
+# magic. Let's to the dumb&verbose thing for now.
+#
+# These are arith builtins (see W_BuiltinFunc.arith): they are called
+# directly by W_OpImpl.call, and we don't typecheck the arguments because
+# the typechecker already did.
+#
+# They are also pure (see W_BuiltinFunc.pure), except f64_div which can
+# raise ZeroDivisionError.
 
 
-def _f64_op(vm: "SPyVM", w_a: W_Object, w_b: W_Object, fn: Any) -> Any:
-    a = vm.unwrap_f64(w_a)
-    b = vm.unwrap_f64(w_b)
-    res = fn(a, b)
-    return vm.wrap(res)
+def _bool(res: bool) -> W_Bool:
+    return B.w_True if res else B.w_False
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_add(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_F64:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a + b)
+    return W_F64(w_a.value + w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_sub(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_F64:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a - b)
+    return W_F64(w_a.value - w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_mul(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_F64:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a * b)
+    return W_F64(w_a.value * w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True)
 def f64_div(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_F64:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a / b)
+    return W_F64(w_a.value / w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_eq(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_Bool:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a == b)
+    return _bool(w_a.value == w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_ne(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_Bool:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a != b)
+    return _bool(w_a.value != w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_lt(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_Bool:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a < b)
+    return _bool(w_a.value < w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_le(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_Bool:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a <= b)
+    return _bool(w_a.value <= w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_gt(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_Bool:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a > b)
+    return _bool(w_a.value > w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def f64_ge(vm: "SPyVM", w_a: W_F64, w_b: W_F64) -> W_Bool:
-    return _f64_op(vm, w_a, w_b, lambda a, b: a >= b)
+    return _bool(w_a.value >= w_b.value)
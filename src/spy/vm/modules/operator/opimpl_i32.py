@@ -1,5 +1,6 @@
-from typing import TYPE_CHECKING, Any
-from spy.vm.object import W_Object, W_I32, W_Bool
+from typing import TYPE_CHECKING
+from spy.vm.b import B
+from spy.vm.object import W_I32, W_Bool
 from . import OP
 
 if TYPE_CHECKING:
@@ -7,63 +8,73 @@ if TYPE_CHECKING:
 
 # the following style is a bit too verbose. We could greatly reduce code
 # duplication by using some metaprogramming, but it might become too
-# magic. Or, it would be nice to have automatic unwrapping.
-# Let's to the dumb&verbose thing for now
-
-
-def _i32_op(vm: "SPyVM", w_a: W_Object, w_b: W_Object, fn: Any) -> Any:
-    a = vm.unwrap_i32(w_a)
-    b = vm.unwrap_i32(w_b)
-    res = fn(a, b)
-    return vm.wrap(res)
-
-
-@OP.builtin
+# magic. Let's to the dumb&verbose thing for now.
+#
+# These are arith builtins (see W_BuiltinFunc.arith): they are called
+# directly by W_OpImpl.call, so they must be as fast as possible. In
+# particular:
+#
+#   - we don't typecheck the arguments: the typechecker already did
+#
+#   - we do the math on plain ints, which is much faster than using the
+#     fixedint.Int32 operators: W_I32.make takes care of wrapping around
+#
+#   - W_I32.make reuses the prebuilt W_I32 for small ints
+#
+# They are also pure (see W_BuiltinFunc.pure), except i32_div which can
+# raise ZeroDivisionError.
+
+
+def _bool(res: bool) -> W_Bool:
+    return B.w_True if res else B.w_False
+
+
+@OP.builtin(arith=True, pure=True)
 def i32_add(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_I32:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a + b)
+    return W_I32.make(int(w_a.value) + int(w_b.value))
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_sub(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_I32:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a - b)
+    return W_I32.make(int(w_a.value) - int(w_b.value))
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_mul(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_I32:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a * b)
+    return W_I32.make(int(w_a.value) * int(w_b.value))
 
 
 # XXX: should we do floor division or float division?
-@OP.builtin
+@OP.builtin(arith=True)
 def i32_div(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_I32:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a // b)
+    return W_I32.make(int(w_a.value) // int(w_b.value))
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_eq(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_Bool:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a == b)
+    return _bool(w_a.value == w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_ne(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_Bool:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a != b)
+    return _bool(w_a.value != w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_lt(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_Bool:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a < b)
+    return _bool(w_a.value < w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_le(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_Bool:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a <= b)
+    return _bool(w_a.value <= w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_gt(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_Bool:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a > b)
+    return _bool(w_a.value > w_b.value)
 
 
-@OP.builtin
+@OP.builtin(arith=True, pure=True)
 def i32_ge(vm: "SPyVM", w_a: W_I32, w_b: W_I32) -> W_Bool:
-    return _i32_op(vm, w_a, w_b, lambda a, b: a >= b)
+    return _bool(w_a.value >= w_b.value)
@@ -6,6 +6,9 @@ from . import OP
 if TYPE_CHECKING:
     from spy.vm.vm import SPyVM
 
+# str_add and str_mul are not pure: they allocate a new string, and
+# spy_str_mul doesn't check for negative counts. str_eq and str_ne are.
+
 
 @OP.builtin
 def str_add(vm: "SPyVM", w_a: W_Str, w_b: W_Str) -> W_Str:
@@ -23,7 +26,7 @@ def str_mul(vm: "SPyVM", w_a: W_Str, w_b: W_I32) -> W_Str:
     return W_Str.from_ptr(vm, ptr_c)
 
 
-@OP.builtin
+@OP.builtin(pure=True)
 def str_eq(vm: "SPyVM", w_a: W_Str, w_b: W_Str) -> W_Bool:
     assert isinstance(w_a, W_Str)
     assert isinstance(w_b, W_Str)
@@ -31,7 +34,7 @@ def str_eq(vm: "SPyVM", w_a: W_Str, w_b: W_Str) -> W_Bool:
     return vm.wrap(bool(res))  # type: ignore
 
 
-@OP.builtin
+@OP.builtin(pure=True)
 def str_ne(vm: "SPyVM", w_a: W_Str, w_b: W_Str) -> W_Bool:
     assert isinstance(w_a, W_Str)
     assert isinstance(w_b, W_Str)
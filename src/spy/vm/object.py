@@ -91,6 +91,19 @@ class W_Object:
             f"(inter-level type: {py_type})"
         )
 
+    def spy_key(self, vm: SPyVM) -> Any:
+        """
+        Return an hashable interp-level key which identifies the object.
+
+        It is used by BlueCache to lookup the results of blue calls in O(1).
+        The invariant is that if two objects have the same key, then
+        vm.universal_eq() must consider them equal.
+
+        By default objects don't have a key, and BlueCache falls back to a
+        linear search using vm.universal_eq.
+        """
+        return None
+
     # ==== OPERATOR SUPPORT ====
     #
     # operators are the central concept which drives the semantic of SPy
@@ -207,6 +220,11 @@ class W_Type(W_Object):
     def spy_unwrap(self, vm: SPyVM) -> type[W_Object]:
         return self.pyclass
 
+    def spy_key(self, vm: SPyVM) -> Any:
+        # types compare by identity. Note that we cannot use self as a key
+        # because some subclasses (e.g. W_FuncType) are not hashable
+        return ("type", id(self))
+
     def is_reference_type(self, vm: SPyVM) -> bool:
         return self.pyclass.__spy_storage_category__ == "reference"
 
@@ -449,17 +467,38 @@ W_Void._w_singleton = W_Void.__new__(W_Void)
 @spytype("i32")
 class W_I32(W_Object):
     value: fixedint.Int32
+    # prebuilt instances for small integers, see W_I32.make
+    SMALL_MIN: ClassVar[int] = -5
+    SMALL_MAX: ClassVar[int] = 256
+    _small_ints: ClassVar[list[W_I32]]
 
     def __init__(self, value: int | fixedint.Int32) -> None:
         assert type(value) in (int, fixedint.Int32)
         self.value = fixedint.Int32(value)
 
+    @staticmethod
+    def make(value: int | fixedint.Int32) -> W_I32:
+        """
+        Like W_I32(value), but reuse the prebuilt instances for small
+        integers. W_I32 are immutable, so it's safe to share them.
+        """
+        if W_I32.SMALL_MIN <= value <= W_I32.SMALL_MAX:
+            return W_I32._small_ints[value - W_I32.SMALL_MIN]
+        return W_I32(value)
+
     def __repr__(self) -> str:
         return f"W_I32({self.value})"
 
     def spy_unwrap(self, vm: SPyVM) -> fixedint.Int32:
         return self.value
 
+    def spy_key(self, vm: SPyVM) -> Any:
+        # i32 and f64 share the same kind of key, because 1 == 1.0
+        return ("num", int(self.value))
+
+
+W_I32._small_ints = [W_I32(i) for i in range(W_I32.SMALL_MIN, W_I32.SMALL_MAX + 1)]
+
 
 @spytype("f64")
 class W_F64(W_Object):
@@ -475,6 +514,12 @@ class W_F64(W_Object):
     def spy_unwrap(self, vm: SPyVM) -> float:
         return self.value
 
+    def spy_key(self, vm: SPyVM) -> Any:
+        if self.value != self.value:
+            # NaN is not equal to itself, so it cannot have a key
+            return None
+        return ("num", self.value)
+
 
 @spytype("bool")
 class W_Bool(W_Object):
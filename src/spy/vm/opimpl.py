@@ -12,7 +12,7 @@ from spy.fqn import QN
 from spy.location import Loc
 from spy.irgen.symtable import Symbol
 from spy.vm.object import Member, W_Type, W_Object, spytype, W_Bool
-from spy.vm.function import W_Func, W_FuncType, W_DirectCall
+from spy.vm.function import W_Func, W_FuncType, W_DirectCall, W_BuiltinFunc
 from spy.vm.sig import spy_builtin
 
 if TYPE_CHECKING:
@@ -74,6 +74,17 @@ class W_Value(W_Object):
     def is_blue(self):
         return self._w_blueval is not None
 
+    def spy_key(self, vm: "SPyVM") -> Any:
+        # this must be kept in sync with value_eq. Note that the prefix is
+        # NOT part of the key.
+        w_type_key = id(self.w_static_type)
+        if self._w_blueval is None:
+            return ("Value", self.i, w_type_key, None)
+        bluekey = self._w_blueval.spy_key(vm)
+        if bluekey is None:
+            return None
+        return ("Value", self.i, w_type_key, bluekey)
+
     @property
     def w_blueval(self) -> W_Object:
         assert self._w_blueval is not None
@@ -213,10 +224,26 @@ class W_OpImpl(W_Object):
             if conv is not None:
                 w_arg = conv.convert(vm, w_arg)
             real_args_w.append(w_arg)
+        w_func = self._w_func
+        if (
+            isinstance(w_func, W_BuiltinFunc)
+            and w_func.arith
+            and not vm.check_trusted_calls
+        ):
+            # fast path: the typechecker already guaranteed that the types
+            # of the args are correct, so we don't need to go through vm.call
+            return w_func._pyfunc(vm, *real_args_w)
+        # the typechecker already checked the types of the arguments, so we
+        # can use call_trusted. The only exception is when we call an object
+        # whose static type is not its actual functype (e.g., if it's
+        # `dynamic`): in that case, the args have been checked against the
+        # wrong signature
         if self.is_direct_call():
             w_func = orig_args_w[0]
+            if w_func.w_functype is self._w_func.w_functype:
+                return vm.call_trusted(w_func, real_args_w)
             return vm.call(w_func, real_args_w)
-        return vm.call(self._w_func, real_args_w)
+        return vm.call_trusted(self._w_func, real_args_w)
 
     def redshift_args(self, vm: "SPyVM", orig_args: list[ast.Expr]) -> list[ast.Expr]:
         assert self.is_valid()
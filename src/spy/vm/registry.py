@@ -67,7 +67,14 @@ class ModuleRegistry:
 
         return decorator
 
-    def builtin(self, pyfunc: Callable | None = None, *, color: Color = "red") -> Any:
+    def builtin(
+        self,
+        pyfunc: Callable | None = None,
+        *,
+        color: Color = "red",
+        arith: bool = False,
+        pure: bool = False,
+    ) -> Any:
         """
         Register a builtin function on the module. We support two different
         syntaxes:
@@ -75,15 +82,17 @@ class ModuleRegistry:
         @MOD.builtin
         def foo(): ...
 
-        @MOD.builtin(color='...')
+        @MOD.builtin(color='...', arith=..., pure=...)
         def foo(): ...
+
+        See spy_builtin for the meaning of the options.
         """
 
         def decorator(pyfunc: Callable) -> SPyBuiltin:
             attr = pyfunc.__name__
             qn = QN(modname=self.modname, attr=attr)
             # apply the @spy_builtin decorator to pyfunc
-            spyfunc = spy_builtin(qn, color=color)(pyfunc)
+            spyfunc = spy_builtin(qn, color=color, arith=arith, pure=pure)(pyfunc)
             w_func = spyfunc._w
             setattr(self, f"w_{attr}", w_func)
             self.content.append((qn, w_func))
@@ -56,7 +56,9 @@ def functype_from_sig(fn: Callable, color: Color) -> W_FuncType:
     return W_FuncType(func_params, w_restype, color=color)
 
 
-def spy_builtin(qn: QN, color: Color = "red") -> Callable:
+def spy_builtin(
+    qn: QN, color: Color = "red", arith: bool = False, pure: bool = False
+) -> Callable:
     """
     Decorator to make an interp-level function wrappable by the VM.
 
@@ -77,10 +79,16 @@ def spy_builtin(qn: QN, color: Color = "red") -> Callable:
     Note that the decorated object is no longer the original function, but an
     instance of SPyBuiltin: among the other things, this ensures that blue
     calls are correctly cached.
+
+    If arith=True, the function can be called directly by W_OpImpl.call,
+    without going through vm.call: see W_BuiltinFunc.arith.
+
+    If pure=True, the optimizer is allowed to move, merge or drop the calls
+    to the function: see W_BuiltinFunc.pure.
     """
 
     def decorator(fn: Callable) -> SPyBuiltin:
-        return SPyBuiltin(fn, qn, color)
+        return SPyBuiltin(fn, qn, color, arith, pure)
 
     return decorator
 
@@ -89,10 +97,17 @@ class SPyBuiltin:
     fn: Callable
     _w: W_BuiltinFunc
 
-    def __init__(self, fn: Callable, qn: QN, color: Color) -> None:
+    def __init__(
+        self,
+        fn: Callable,
+        qn: QN,
+        color: Color,
+        arith: bool = False,
+        pure: bool = False,
+    ) -> None:
         self.fn = fn
         w_functype = functype_from_sig(fn, color)
-        self._w = W_BuiltinFunc(w_functype, qn, fn)
+        self._w = W_BuiltinFunc(w_functype, qn, fn, arith=arith, pure=pure)
 
     @property
     def w_functype(self) -> W_FuncType:
@@ -73,6 +73,9 @@ class W_Str(W_Object):
     def spy_unwrap(self, vm: "SPyVM") -> str:
         return self._as_str()
 
+    def spy_key(self, vm: "SPyVM") -> tuple[str, bytes]:
+        return ("str", self.get_utf8())
+
     @staticmethod
     def op_GETITEM(vm: "SPyVM", wv_obj: W_Value, wv_i: W_Value) -> W_OpImpl:
         @spy_builtin(QN("operator::str_getitem"))
@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING, NoReturn, Literal
 
 from spy import ast
 from spy.errors import SPyTypeError, SPyNameError, maybe_plural
+from spy.fqn import FQN
 from spy.irgen.symtable import Symbol, Color
 from spy.location import Loc
 from spy.util import magic_dispatch
@@ -50,6 +51,9 @@ class TypeChecker:
     expr_conv: dict[ast.Expr, TypeConverter]
     opimpl: dict[ast.Node, W_OpImpl]
     locals_types_w: dict[str, W_Type]
+    checked_stmts: set[ast.Stmt]
+    globals_types_w: dict[FQN, W_Type]
+    has_stable_locals: bool
 
     def __init__(self, vm: SPyVM, w_func: W_ASTFunc) -> None:
         self.vm = vm
@@ -61,8 +65,72 @@ class TypeChecker:
         self.expr_conv = {}
         self.opimpl = {}
         self.locals_types_w = {}
+        self.checked_stmts = set()
+        # the types of the globals which we looked up: see is_reusable()
+        self.globals_types_w = {}
+        self.has_stable_locals = self.compute_stable_locals()
         self.declare_arguments()
 
+    def compute_stable_locals(self) -> bool:
+        """
+        Check whether the types of the locals are guaranteed to be the same
+        for every call of the function.
+
+        This is the case if all the type annotations which are evaluated
+        lazily (i.e., the ones of VarDefs and inner FuncDefs) depend only on
+        blue globals and closed-over variables.
+        """
+
+        def is_stable(expr: ast.Expr) -> bool:
+            for node in expr.walk(ast.Name):
+                assert isinstance(node, ast.Name)
+                sym = self.funcdef.symtable.lookup_maybe(node.id)
+                if sym is None or sym.is_local:
+                    return False
+                if sym.fqn is not None and sym.color == "red":
+                    return False
+            return True
+
+        def check_body(body: list[ast.Stmt]) -> bool:
+            for stmt in body:
+                if isinstance(stmt, ast.VarDef):
+                    exprs = [stmt.type]
+                elif isinstance(stmt, ast.FuncDef):
+                    exprs = [arg.type for arg in stmt.args] + [stmt.return_type]
+                elif isinstance(stmt, ast.If):
+                    exprs = []
+                    if not check_body(stmt.then_body + stmt.else_body):
+                        return False
+                elif isinstance(stmt, ast.While):
+                    exprs = []
+                    if not check_body(stmt.body):
+                        return False
+                else:
+                    exprs = []
+                if not all(is_stable(expr) for expr in exprs):
+                    return False
+            return True
+
+        return check_body(self.funcdef.body)
+
+    def is_reusable(self) -> bool:
+        """
+        Check whether the results computed so far can be reused by a new
+        ASTFrame for the same function (see W_ASTFunc.spy_call).
+
+        The static types of globals are computed by looking at their dynamic
+        types, so if a global changed its type in the meantime, we need to
+        start from scratch.
+        """
+        if not self.has_stable_locals:
+            return False
+        for fqn, w_type in self.globals_types_w.items():
+            w_value = self.vm.lookup_global(fqn)
+            assert w_value is not None
+            if self.vm.dynamic_type(w_value) is not w_type:
+                return False
+        return True
+
     def declare_arguments(self) -> None:
         """
         Declare the local vars for the arguments and @return
@@ -115,11 +183,14 @@ class TypeChecker:
         Else, return None.
         """
         if isinstance(expr, ast.Name):
-            return self.funcdef.symtable.lookup_maybe(expr.id)
+            return self.funcdef.symtable.lookup_Name_maybe(expr)
         return None
 
     def check_stmt(self, stmt: ast.Stmt) -> None:
+        if stmt in self.checked_stmts:
+            return
         magic_dispatch(self, "check_stmt", stmt)
+        self.checked_stmts.add(stmt)
 
     def check_expr(self, expr: ast.Expr) -> tuple[Color, W_Type]:
         """
@@ -180,7 +251,7 @@ class TypeChecker:
         """
 
     def lazy_check_VarDef(self, vardef: ast.VarDef, w_type: W_Type) -> None:
-        self.declare_local(vardef.name, w_type)
+        self.declare_local_lazily(vardef.name, w_type)
 
     def check_stmt_FuncDef(self, funcdef: ast.FuncDef) -> None:
         """
@@ -191,7 +262,18 @@ class TypeChecker:
         """
         See check_stmt_VarDef and lazy_check_VarDef
         """
-        self.declare_local(funcdef.name, w_type)
+        self.declare_local_lazily(funcdef.name, w_type)
+
+    def declare_local_lazily(self, name: str, w_type: W_Type) -> None:
+        """
+        Lazy declarations are executed every time the VarDef or FuncDef is
+        executed, e.g. inside loops or by multiple frames which share the
+        same TypeChecker: the second time, the local is already declared.
+        """
+        if name in self.locals_types_w:
+            assert self.locals_types_w[name] == w_type
+            return
+        self.declare_local(name, w_type)
 
     def check_stmt_StmtExpr(self, stmt: ast.StmtExpr) -> None:
         pass
@@ -259,8 +341,7 @@ class TypeChecker:
     # ==== expressions ====
 
     def check_expr_Name(self, name: ast.Name) -> tuple[Color, W_Type]:
-        varname = name.id
-        sym = self.funcdef.symtable.lookup_maybe(varname)
+        sym = self.funcdef.symtable.lookup_Name_maybe(name)
         if sym is None:
             msg = f"name `{name.id}` is not defined"
             raise SPyNameError.simple(msg, "not found in this scope", name.loc)
@@ -269,12 +350,13 @@ class TypeChecker:
             # FQNs. For now, we just look it up and use the dynamic type
             w_value = self.vm.lookup_global(sym.fqn)
             assert w_value is not None
-            return sym.color, self.vm.dynamic_type(w_value)
+            w_type = self.vm.dynamic_type(w_value)
+            self.globals_types_w[sym.fqn] = w_type
+            return sym.color, w_type
         if sym.is_local:
             return sym.color, self.locals_types_w[name.id]
         # closed-over variables are always blue
-        namespace = self.w_func.closure[sym.level]
-        w_value = namespace[sym.name]
+        w_value = self.w_func.closure[sym.slot].w_value
         assert w_value is not None
         return "blue", self.vm.dynamic_type(w_value)
 
@@ -1,12 +1,13 @@
 import py
-from typing import Any
+from typing import Any, Optional
 from collections.abc import Iterable
-import itertools
+from enum import Enum
 from types import FunctionType
 import fixedint
+from spy import ast
 from spy.fqn import QN, FQN
 from spy import libspy
-from spy.doppler import redshift
+from spy.doppler import PendingFunc, RedshiftPool, StateDigest, redshift
 from spy.errors import SPyTypeError
 from spy.vm.object import W_Object, W_Type, W_I32, W_F64, W_Bool, W_Dynamic
 from spy.vm.str import W_Str
@@ -17,6 +18,10 @@ from spy.vm.module import W_Module
 from spy.vm.opimpl import W_OpImpl, W_Value, value_eq
 from spy.vm.registry import ModuleRegistry
 from spy.vm.bluecache import BlueCache
+from spy.vm.modfinder import ModuleFinder
+from spy.redshiftcache import RedshiftCache
+from spy.inliner import Inliner, InlineReport
+from spy.hoister import FuncHoister, HoistReport
 
 from spy.vm.modules.builtins import BUILTINS
 from spy.vm.modules.operator import OPERATOR
@@ -24,6 +29,24 @@ from spy.vm.modules.types import TYPES, W_TypeDef
 from spy.vm.modules.rawbuffer import RAW_BUFFER
 from spy.vm.modules.jsffi import JSFFI
 
+# debug flag: if True, vm.call_trusted checks the types of the arguments as
+# vm.call does. Useful to find bugs in the typechecker. It is read when the
+# VM is created, see SPyVM.check_trusted_calls.
+CHECK_TRUSTED_CALLS = False
+
+
+class InterpEngine(str, Enum):
+    """
+    Which engine is used to execute W_ASTFuncs:
+
+      - ast: walk the AST at each execution (see ASTFrame)
+      - closure: compile each node into a Python closure the first time it's
+        executed (see ClosureFrame)
+    """
+
+    ast = "ast"
+    closure = "closure"
+
 
 class SPyVM:
     """
@@ -36,19 +59,51 @@ class SPyVM:
     ll: libspy.LLSPyInstance
     globals_types: dict[FQN, W_Type]
     globals_w: dict[FQN, W_Object]
+    # reverse index of globals_w: id(w_obj) -> FQNs which contain w_obj. It
+    # must be kept in sync with globals_w, see _set_global()
+    globals_reverse: dict[int, list[FQN]]
+    # incremented every time a global is set: it is used to detect whether
+    # an operation had side effects on the globals
+    globals_version: int
+    # incremented every time that SPy code mutates an interp-level object,
+    # e.g. the __getattr__ of a TypeDef: see state_digest()
+    objects_version: int
     modules_w: dict[str, W_Module]
     unique_fqns: set[FQN]
+    # for each non-global QN, the next suffix to try: see get_FQN()
+    next_fqn_suffix: dict[QN, int]
     path: list[str]
+    finder: ModuleFinder
     bluecache: BlueCache
+    interp_engine: InterpEngine
+    # copy of CHECK_TRUSTED_CALLS, so that the hot paths don't need to look
+    # up the global
+    check_trusted_calls: bool
+    # number of processes used by redshift: see doppler.RedshiftPool
+    redshift_workers: int
+    redshift_cache: RedshiftCache
+    # directory of the on-disk caches, see spy.irgen.modcache. None means
+    # that the caches are disabled
+    cache_dir: Optional[str]
 
     def __init__(self) -> None:
         self.ll = libspy.LLSPyInstance(libspy.LLMOD)
         self.globals_types = {}
         self.globals_w = {}
+        self.globals_reverse = {}
+        self.globals_version = 0
+        self.objects_version = 0
         self.modules_w = {}
         self.unique_fqns = set()
+        self.next_fqn_suffix = {}
         self.path = []
+        self.finder = ModuleFinder(self.path)
         self.bluecache = BlueCache(self)
+        self.interp_engine = InterpEngine.ast
+        self.check_trusted_calls = CHECK_TRUSTED_CALLS
+        self.redshift_workers = 1
+        self.redshift_cache = RedshiftCache(self)
+        self.cache_dir = None
         self.make_module(BUILTINS)  # builtins::
         self.make_module(OPERATOR)  # operator::
         self.make_module(TYPES)  # types::
@@ -60,18 +115,39 @@ class SPyVM:
 
         if modname in self.modules_w:
             return self.modules_w[modname]
-        # XXX for now we assume that we find the module as a single file in
-        # the only vm.path entry. Eventually we will need a proper import
-        # mechanism and support for packages
-        assert self.path, "vm.path not set"
-        file_spy = py.path.local(self.path[0]).join(f"{modname}.spy")
-        w_mod = make_w_mod_from_file(self, file_spy)
+        file_spy = self.find_module(modname)
+        if file_spy is None:
+            # let make_w_mod_from_file report the error
+            file_spy = py.path.local(self.path[0]).join(f"{modname}.spy")
+        w_mod = make_w_mod_from_file(self, modname, file_spy)
         self.modules_w[modname] = w_mod
         return w_mod
 
+    def import_all(self, modnames: list[str], max_workers: int = 1) -> list[W_Module]:
+        """
+        Import the given modules and, recursively, all the modules which
+        they import. If max_workers > 1, the files are parsed in parallel:
+        see spy.irgen.irgen.import_all.
+        """
+        from spy.irgen.irgen import import_all
+
+        import_all(self, modnames, max_workers)
+        return [self.import_(modname) for modname in modnames]
+
+    def find_module(self, modname: str) -> Optional[py.path.local]:
+        """
+        Return the .spy file which contains the given module, or None: see
+        ModuleFinder for the details.
+        """
+        assert self.path, "vm.path not set"
+        return self.finder.find(modname)
+
     def redshift(self) -> None:
         """
         Perform a redshift on all W_ASTFunc.
+
+        If self.redshift_workers > 1, the functions are redshifted in
+        parallel. The result is the same as with a serial redshift.
         """
 
         def should_redshift(w_func: W_ASTFunc) -> bool:
@@ -83,19 +159,160 @@ class SPyVM:
                 if isinstance(w_func, W_ASTFunc) and should_redshift(w_func):
                     yield fqn, w_func
 
-        while True:
-            funcs = list(get_funcs())
-            if not funcs:
-                break
-            self._redshift_some(funcs)
+        with RedshiftPool(self, self.redshift_workers) as pool:
+            while True:
+                funcs = list(get_funcs())
+                if not funcs:
+                    break
+                self._redshift_some(funcs, pool)
+        self.redshift_cache.flush()
+
+    def redshift_reachable(self, roots: Iterable[FQN]) -> set[FQN]:
+        """
+        Perform a redshift only on the W_ASTFuncs which are reachable from
+        the given roots.
+
+        After redshift, all the functions called by a red function are
+        referenced by an ast.FQNConst: we start from the roots and follow
+        them transitively. Functions which are never reached are left
+        untouched, so that a program which uses only a small part of a big
+        library doesn't pay for the rest.
+
+        Return the FQNs of all the reachable red functions, which is what a
+        backend needs to emit.
 
-    def _redshift_some(self, funcs: list[tuple[FQN, W_ASTFunc]]) -> None:
-        for fqn, w_func in funcs:
+        The graph is visited breadth-first, and each level is redshifted as
+        a whole by _redshift_some, so that it can be done in parallel.
+        """
+        reachable: set[FQN] = set()
+        level = list(roots)
+        with RedshiftPool(self, self.redshift_workers) as pool:
+            while level:
+                new_fqns = []
+                funcs = []
+                for fqn in level:
+                    if fqn in reachable:
+                        continue
+                    w_func = self.globals_w.get(fqn)
+                    if not isinstance(w_func, W_ASTFunc) or w_func.color == "blue":
+                        continue
+                    reachable.add(fqn)
+                    new_fqns.append(fqn)
+                    if not w_func.redshifted:
+                        funcs.append((fqn, w_func))
+                self._redshift_some(funcs, pool)
+                level = []
+                for fqn in new_fqns:
+                    w_func = self.globals_w[fqn]
+                    assert isinstance(w_func, W_ASTFunc)
+                    for const in w_func.funcdef.walk(ast.FQNConst):
+                        assert isinstance(const, ast.FQNConst)
+                        level.append(const.fqn)
+        self.redshift_cache.flush()
+        return reachable
+
+    def inline(self, fqns: Optional[Iterable[FQN]] = None) -> InlineReport:
+        """
+        Inline small functions at their call sites, inside the given
+        redshifted functions or inside all of them: see spy.inliner.
+
+        Return which functions have been inlined where.
+        """
+        if fqns is None:
+            fqns = [
+                fqn
+                for fqn, w_obj in self.globals_w.items()
+                if isinstance(w_obj, W_ASTFunc) and w_obj.redshifted
+            ]
+        inliner = Inliner(self)
+        for fqn in list(fqns):
+            inliner.inline_func(fqn)
+        return inliner.report
+
+    def hoist_invariants(self, fqns: Optional[Iterable[FQN]] = None) -> HoistReport:
+        """
+        Hoist the loop-invariant pure calls out of the loops of the given
+        redshifted functions, or of all of them: see spy.hoister.
+
+        Return how many expressions have been hoisted out of each function.
+        """
+        if fqns is None:
+            fqns = [
+                fqn
+                for fqn, w_obj in self.globals_w.items()
+                if isinstance(w_obj, W_ASTFunc) and w_obj.redshifted
+            ]
+        report = {}
+        for fqn in list(fqns):
+            w_func = self.globals_w[fqn]
+            assert isinstance(w_func, W_ASTFunc)
+            hoister = FuncHoister(self, w_func)
+            w_newfunc = hoister.hoist()
+            if w_newfunc is not None:
+                self._set_global(fqn, w_newfunc)
+                report[fqn] = hoister.count
+        return report
+
+    def state_digest(self) -> StateDigest:
+        """
+        Return a value which changes whenever something has side effects on
+        the VM: new or modified globals, new FQNs (e.g. for closures), new
+        modules or mutated objects.
+
+        This is used to check which side effects the redshift of a function
+        had, see doppler.RedshiftPool.
+        """
+        return StateDigest(
+            self.globals_version,
+            len(self.unique_fqns),
+            len(self.modules_w),
+            self.objects_version,
+        )
+
+    def _redshift_some(
+        self, funcs: list[tuple[FQN, W_ASTFunc]], pool: RedshiftPool
+    ) -> None:
+        cache = self.redshift_cache
+        keys = [cache.compute_key(fqn, w_func) for fqn, w_func in funcs]
+        shifted_w = [
+            cache.lookup(fqn, w_func, key) for (fqn, w_func), key in zip(funcs, keys)
+        ]
+        misses = [i for i, w_newfunc in enumerate(shifted_w) if w_newfunc is None]
+        pending: list[Optional[PendingFunc]] = [None] * len(funcs)
+        for i, p in zip(misses, pool.redshift_some([funcs[i] for i in misses])):
+            pending[i] = p
+        # the cache keys were computed before the functions which we redshift
+        # here touched the globals: once one of them does, we must recompute
+        # the keys (stale). The results of the workers can still be merged,
+        # unless a function had side effects other than new globals (dirty)
+        stale = False
+        dirty = False
+        for i, (fqn, w_func) in enumerate(funcs):
             assert w_func.color != "blue"
             assert not w_func.redshifted
-            w_newfunc = redshift(self, w_func)
+            w_newfunc = shifted_w[i]
+            p = None if dirty else pending[i]
+            if stale:
+                keys[i] = cache.compute_key(fqn, w_func)
+                if p is None:
+                    w_newfunc = cache.lookup(fqn, w_func, keys[i])
+            if w_newfunc is None:
+                digest = self.state_digest()
+                n_globals = len(self.globals_w)
+                if p is not None:
+                    merger, j = p
+                    w_newfunc = merger.merge(j, w_func)
+                if w_newfunc is None:
+                    w_newfunc = redshift(self, w_func)
+                n_new = len(self.globals_w) - n_globals
+                stale = stale or self.globals_version != digest.globals_version
+                dirty = dirty or self.state_digest() != digest.add_globals(n_new)
+                # the entries of the bluecache are just a memo, so it's fine
+                # to skip them when we get the function from the cache
+                if self.globals_version == digest.globals_version:
+                    cache.store(fqn, keys[i], w_newfunc)
             assert w_newfunc.redshifted
-            self.globals_w[fqn] = w_newfunc
+            pool.store(fqn, w_newfunc)
 
     def register_module(self, w_mod: W_Module) -> None:
         assert w_mod.name not in self.modules_w
@@ -118,24 +335,30 @@ class SPyVM:
         the same global twice.
 
         For non globals (e.g., closures) the algorithm is simple: to compute
-        an unique suffix, we just increment a numeric counter.
+        an unique suffix, we just increment a numeric counter. We remember the
+        counter of each QN, so that we don't need to probe all the suffixes
+        which have already been used.
         """
         if is_global:
             fqn = FQN.make_global(modname=qn.modname, attr=qn.attr)
         else:
-            # XXX this is potentially quadratic if we create tons of
-            # conflicting FQNs, but for now we don't care
-            for n in itertools.count():
+            n = self.next_fqn_suffix.get(qn, 0)
+            while True:
                 fqn = FQN.make(modname=qn.modname, attr=qn.attr, suffix=str(n))
+                n += 1
                 if fqn not in self.unique_fqns:
                     break
+            self.next_fqn_suffix[qn] = n
         assert fqn not in self.unique_fqns
         self.unique_fqns.add(fqn)
         return fqn
 
     def add_global(self, fqn: FQN, w_type: W_Type | None, w_value: W_Object) -> None:
         assert isinstance(fqn, FQN)
-        assert fqn.modname in self.modules_w
+        # the module keeps the list of its globals, see W_Module.fqns
+        assert (
+            fqn.modname in self.modules_w
+        ), f"cannot add global {fqn}: module `{fqn.modname}` is not registered"
         assert fqn not in self.globals_w
         assert fqn not in self.globals_types
         if w_type is None:
@@ -143,7 +366,8 @@ class SPyVM:
         else:
             assert self.isinstance(w_value, w_type)
         self.globals_types[fqn] = w_type
-        self.globals_w[fqn] = w_value
+        self._set_global(fqn, w_value)
+        self.modules_w[fqn.modname].fqns.append(fqn)
 
     def lookup_global_type(self, fqn: FQN) -> W_Type | None:
         assert isinstance(fqn, FQN)
@@ -156,18 +380,33 @@ class SPyVM:
         return self.globals_w.get(fqn)
 
     def reverse_lookup_global(self, w_val: W_Object) -> FQN | None:
-        # XXX we should maintain a reverse-lookup table instead of doing a
-        # linear search
-        for fqn, w_obj in self.globals_w.items():
-            if w_val is w_obj:
-                return fqn
+        fqns = self.globals_reverse.get(id(w_val))
+        if fqns:
+            return fqns[0]
         return None
 
     def store_global(self, fqn: FQN, w_value: W_Object) -> None:
         assert isinstance(fqn, FQN)
         w_type = self.globals_types[fqn]
         assert self.isinstance(w_value, w_type)
+        self._set_global(fqn, w_value)
+
+    def _set_global(self, fqn: FQN, w_value: W_Object) -> None:
+        """
+        Set globals_w[fqn] and update the reverse index accordingly.
+
+        The index is keyed by id(), which is safe because globals_w keeps all
+        the indexed objects alive.
+        """
+        w_old = self.globals_w.get(fqn)
+        if w_old is not None:
+            fqns = self.globals_reverse[id(w_old)]
+            fqns.remove(fqn)
+            if not fqns:
+                del self.globals_reverse[id(w_old)]
         self.globals_w[fqn] = w_value
+        self.globals_version += 1
+        self.globals_reverse.setdefault(id(w_value), []).append(fqn)
 
     def dynamic_type(self, w_obj: W_Object) -> W_Type:
         assert isinstance(w_obj, W_Object)
@@ -246,7 +485,7 @@ class SPyVM:
         if value is None:
             return B.w_None
         if T in (int, fixedint.Int32):
-            return W_I32(value)
+            return W_I32.make(value)
         if T is float:
             return W_F64(value)
         if T is bool:
@@ -298,16 +537,29 @@ class SPyVM:
         return self.unwrap(w_value)  # type: ignore
 
     def call(self, w_func: W_Func, args_w: list[W_Object]) -> W_Object:
+        return self._call(w_func, args_w, check_types=True)
+
+    def call_trusted(self, w_func: W_Func, args_w: list[W_Object]) -> W_Object:
+        """
+        Like vm.call, but assume that the types of the arguments are already
+        known to be correct, e.g. because they have been checked by the
+        typechecker. See also CHECK_TRUSTED_CALLS.
+        """
+        return self._call(w_func, args_w, check_types=self.check_trusted_calls)
+
+    def _call(
+        self, w_func: W_Func, args_w: list[W_Object], *, check_types: bool
+    ) -> W_Object:
         if w_func.color == "blue":
             # for blue functions, we memoize the result
             w_result = self.bluecache.lookup(w_func, args_w)
             if w_result is not None:
                 return w_result
-            w_result = self._call_func(w_func, args_w)
+            w_result = self._call_func(w_func, args_w, check_types=check_types)
             self.bluecache.record(w_func, args_w, w_result)
             return w_result
         # for red functions, we just call them
-        return self._call_func(w_func, args_w)
+        return self._call_func(w_func, args_w, check_types=check_types)
 
     def call_OP(self, w_func: W_Func, args_wv: list[W_Value]) -> W_OpImpl:
         """
@@ -319,11 +571,14 @@ class SPyVM:
         assert isinstance(w_opimpl, W_OpImpl)
         return w_opimpl
 
-    def _call_func(self, w_func: W_Func, args_w: list[W_Object]) -> W_Object:
+    def _call_func(
+        self, w_func: W_Func, args_w: list[W_Object], *, check_types: bool = True
+    ) -> W_Object:
         w_functype = w_func.w_functype
         assert w_functype.arity == len(args_w)
-        for param, w_arg in zip(w_functype.params, args_w):
-            self.typecheck(w_arg, param.w_type)
+        if check_types:
+            for param, w_arg in zip(w_functype.params, args_w):
+                self.typecheck(w_arg, param.w_type)
         return w_func.spy_call(self, args_w)
 
     def eq(self, w_a: W_Dynamic, w_b: W_Dynamic) -> W_Bool:
@@ -1,4 +0,0 @@
-from tokenize import TokenInfo
-
-def untokenize(tokens: list[TokenInfo]) -> str:
-    ...
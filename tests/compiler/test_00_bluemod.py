@@ -102,3 +102,37 @@ class TestBlueMod:
         w_42 = self.vm.call(w_add5, [self.vm.wrap(37)])
         res = self.vm.unwrap(w_42)
         assert res == 42
+
+    def test_closure_captures_cells(self):
+        mod = self.import_(
+            """
+        @blue
+        def make_adder(x):
+            def adder(y: i32) -> i32:
+                return x+y
+            x = x * 2
+            return adder
+
+        @blue
+        def make_nested(x):
+            @blue
+            def middle():
+                def inner(y: i32) -> i32:
+                    return x+y
+                return inner
+            return middle()
+        """
+        )
+        w_mod = mod.w_mod
+        # the inner function sees the updated value of x
+        w_add = self.vm.call(w_mod.getattr("make_adder"), [self.vm.wrap(5)])
+        assert isinstance(w_add, W_ASTFunc)
+        assert len(w_add.closure) == 1
+        w_res = self.vm.call(w_add, [self.vm.wrap(1)])
+        assert self.vm.unwrap(w_res) == 11
+        #
+        # x is passed down through middle()
+        w_inner = self.vm.call(w_mod.getattr("make_nested"), [self.vm.wrap(5)])
+        assert isinstance(w_inner, W_ASTFunc)
+        w_res = self.vm.call(w_inner, [self.vm.wrap(1)])
+        assert self.vm.unwrap(w_res) == 6
@@ -3,8 +3,9 @@ import pytest
 from spy.errors import SPyTypeError
 from spy.fqn import FQN
 from spy.vm.b import B
+from spy.vm.vm import InterpEngine
 
-from ..support import CompilerTest, expect_errors, no_C, skip_backends
+from ..support import CompilerTest, expect_errors, no_C, only_interp, skip_backends
 
 
 class TestBasic(CompilerTest):
@@ -502,6 +503,83 @@ class TestBasic(CompilerTest):
         assert mod.factorial(0) == 1
         assert mod.factorial(5) == 120
 
+    def test_return_from_nested_body(self):
+        mod = self.compile(
+            """
+        def find(n: i32) -> i32:
+            i = 0
+            while i < 100:
+                if i * i >= n:
+                    if i > 0:
+                        return i
+                    return -1
+                i = i + 1
+            return -2
+        """
+        )
+        assert mod.find(0) == -1
+        assert mod.find(10) == 4
+        assert mod.find(100000) == -2
+
+    def test_blue_if_while(self):
+        mod = self.compile(
+            """
+        LEVEL: i32 = 2
+
+        def foo(x: i32) -> i32:
+            if LEVEL > 1:
+                x = x * 10
+            else:
+                x = x * 100
+            while LEVEL < 0:
+                x = x + 1
+            if LEVEL == 2:
+                return x
+            return -1
+        """
+        )
+        assert mod.foo(3) == 30
+
+    def test_loop_invariants(self):
+        mod = self.compile(
+            """
+        def foo(a: i32, b: i32, n: i32) -> i32:
+            tot = 0
+            i = 0
+            while i < n:
+                tot = tot + a * b + i
+                if i > 100:
+                    a = 0
+                j = 0
+                while j < b * 2:
+                    tot = tot + a * b
+                    j = j + 1
+                i = i + 1
+            return tot
+        """,
+            hoist=True,
+        )
+        assert mod.foo(3, 4, 5) == 5 * (12 + 8 * 12) + 10
+        assert mod.foo(3, 4, 0) == 0
+
+    def test_loop_invariant_str_mul(self):
+        mod = self.compile(
+            """
+        def foo(s: str, n: i32) -> str:
+            res = ""
+            i = 0
+            while i < n:
+                res = res + s * n
+                i = i + 1
+            return res
+        """,
+            hoist=True,
+        )
+        assert mod.foo("ab", 2) == "abababab"
+        # the loop runs zero times, so str_mul must never be called with a
+        # negative count
+        assert mod.foo("ab", -1) == ""
+
     def test_if_error(self):
         # XXX: eventually, we want to introduce the concept of "truth value"
         # and insert automatic conversions but for now the condition must be a
@@ -751,7 +829,7 @@ class TestBasic(CompilerTest):
         assert mod.type_ne(B.w_i32, B.w_i32) == False
         assert mod.type_ne(B.w_i32, B.w_str) == True
 
-    @skip_backends("doppler", "C", reason="we need lazy errors")
+    @skip_backends("doppler", "pyjit", "C", reason="we need lazy errors")
     def test_equality(self):
         mod = self.compile(
             """
@@ -846,3 +924,87 @@ class TestBasic(CompilerTest):
             ("Call not allowed here", "inc()"),
         )
         self.compile_raises(src, "foo", errors)
+
+    def test_vardef_in_loop(self):
+        mod = self.compile(
+            """
+        def foo() -> i32:
+            i = 0
+            tot = 0
+            while i < 3:
+                x: i32 = i * 2
+                tot = tot + x
+                i = i + 1
+            return tot
+        """
+        )
+        assert mod.foo() == 6
+
+    @only_interp
+    def test_typechecker_is_reused(self):
+        mod = self.compile(
+            """
+        def foo(x: i32) -> i32:
+            y: i32 = x + 1
+            return y
+        """
+        )
+        assert mod.foo(1) == 2
+        w_foo = mod.foo.w_func
+        t = w_foo.cached_typechecker
+        assert t is not None
+        assert mod.foo(2) == 3
+        assert w_foo.cached_typechecker is t
+
+    @only_interp
+    def test_typechecker_global_changes_type(self):
+        mod = self.compile(
+            """
+        var x: dynamic = 1
+
+        def foo() -> dynamic:
+            return x * 2
+        """
+        )
+        assert mod.foo() == 2
+        self.w_mod.setattr("x", self.vm.wrap("ab"))
+        assert mod.foo() == "abab"
+
+    @only_interp
+    def test_closure_engine(self):
+        self.vm.interp_engine = InterpEngine.closure
+        mod = self.compile(
+            """
+        def foo(n: i32) -> i32:
+            i = 0
+            tot = 0
+            while i < n:
+                tot = tot + i
+                i = i + 1
+            return tot
+        """
+        )
+        assert mod.foo(4) == 6
+        w_foo = mod.foo.w_func
+        code = w_foo.cached_code
+        assert code is not None
+        n = len(code.exprs)
+        assert mod.foo(5) == 10
+        # the nodes are compiled only once
+        assert w_foo.cached_code is code
+        assert len(code.exprs) == n
+
+    @only_interp
+    def test_closure_engine_lazy_errors(self):
+        self.vm.interp_engine = InterpEngine.closure
+        mod = self.compile(
+            """
+        def foo(x: i32) -> i32:
+            if x == 0:
+                return 1
+            return x + "hello"
+        """
+        )
+        assert mod.foo(0) == 1
+        with pytest.raises(SPyTypeError):
+            mod.foo(1)
@@ -69,3 +69,117 @@ class TestBasic(CompilerTest):
             main = InterpModuleWrapper(self.vm, w_main)
             assert delta.get_delta() == 10
             assert main.inc(4) == 14
+
+    @only_interp
+    def test_import_all(self):
+        self.write_file(
+            "delta.spy",
+            """
+            def get_delta() -> i32:
+                return 10
+            """,
+        )
+        self.write_file(
+            "twice.spy",
+            """
+            from delta import get_delta
+
+            def get_twice() -> i32:
+                return get_delta() * 2
+            """,
+        )
+        self.write_file(
+            "main.spy",
+            """
+            from delta import get_delta
+            from twice import get_twice
+
+            def inc(x: i32) -> i32:
+                return x + get_delta() + get_twice()
+            """,
+        )
+        # the dependencies are discovered and imported in the right order
+        [w_main] = self.vm.import_all(["main"], max_workers=2)
+        assert set(self.vm.modules_w) >= {"delta", "twice", "main"}
+        w_inc = w_main.getattr("inc")
+        w_res = self.vm.call(w_inc, [self.vm.wrap(4)])
+        assert self.vm.unwrap(w_res) == 34
+
+    @only_interp
+    def test_import_all_no_pool_by_default(self, monkeypatch):
+        import spy.irgen.irgen
+
+        def no_pool(*args, **kwargs):
+            raise AssertionError("the pool should not be started")
+
+        monkeypatch.setattr(spy.irgen.irgen, "ProcessPoolExecutor", no_pool)
+        self.write_file(
+            "delta.spy",
+            """
+            def get_delta() -> i32:
+                return 10
+            """,
+        )
+        self.write_file(
+            "main.spy",
+            """
+            from delta import get_delta
+
+            def inc(x: i32) -> i32:
+                return x + get_delta()
+            """,
+        )
+        [w_main] = self.vm.import_all(["main"])
+        w_inc = w_main.getattr("inc")
+        w_res = self.vm.call(w_inc, [self.vm.wrap(4)])
+        assert self.vm.unwrap(w_res) == 14
+
+    @only_interp
+    def test_import_all_errors(self):
+        self.write_file(
+            "main.spy",
+            """
+            from xxx import aaa
+            """,
+        )
+        ctx = expect_errors(
+            "cannot import `xxx.aaa`",
+            ("module `xxx` does not exist", "from xxx import aaa"),
+        )
+        with ctx:
+            self.vm.import_all(["main"], max_workers=2)
+
+    @only_interp
+    def test_import_from_package(self):
+        self.tmpdir.join("mylib").ensure(dir=True)
+        self.write_file(
+            "mylib/__init__.spy",
+            """
+            def get_one() -> i32:
+                return 1
+            """,
+        )
+        self.write_file(
+            "mylib/delta.spy",
+            """
+            def get_delta() -> i32:
+                return 10
+            """,
+        )
+        self.write_file(
+            "main.spy",
+            """
+            from mylib import get_one
+            from mylib.delta import get_delta
+
+            def inc(x: i32) -> i32:
+                return x + get_one() + get_delta()
+            """,
+        )
+        [w_main] = self.vm.import_all(["main"])
+        assert self.vm.modules_w["mylib.delta"].filepath == str(
+            self.tmpdir.join("mylib", "delta.spy")
+        )
+        w_inc = w_main.getattr("inc")
+        w_res = self.vm.call(w_inc, [self.vm.wrap(4)])
+        assert self.vm.unwrap(w_res) == 15
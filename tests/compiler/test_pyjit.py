@@ -0,0 +1,103 @@
+import pytest
+
+from spy.backend.pyjit import PyFuncWriter, PyJitUnsupported, W_PyJitFunc
+from spy.fqn import FQN
+from spy.vm.b import B
+from spy.vm.function import W_ASTFunc
+from spy.vm.typeconverter import NumericConv
+
+from ..support import CompilerTest, only_pyjit
+
+
+class TestPyJit(CompilerTest):
+    """
+    Tests which are specific to the pyjit backend: the majority of the
+    functionality is tested by running all the other tests in
+    tests/compiler/*.py.
+    """
+
+    def lookup(self, attr: str):
+        fqn = FQN.make_global(modname="test", attr=attr)
+        return self.vm.lookup_global(fqn)
+
+    @only_pyjit
+    def test_simple(self):
+        mod = self.compile(
+            """
+        def add(x: i32, y: i32) -> i32:
+            return x + y
+
+        def fact(n: i32) -> i32:
+            res = 1
+            i = 1
+            while i <= n:
+                res = mul(res, i)
+                i = i + 1
+            return res
+
+        def mul(x: i32, y: i32) -> i32:
+            return x * y
+        """
+        )
+        assert isinstance(self.lookup("add"), W_PyJitFunc)
+        assert isinstance(self.lookup("fact"), W_PyJitFunc)
+        assert mod.add(1, 2) == 3
+        assert mod.fact(5) == 120
+
+    @only_pyjit
+    def test_i32_overflow(self):
+        mod = self.compile(
+            """
+        def add(x: i32, y: i32) -> i32:
+            return x + y
+
+        def mul(x: i32, y: i32) -> i32:
+            return x * y
+        """
+        )
+        assert mod.add(2147483647, 1) == -2147483648
+        assert mod.mul(65536, 65536) == 0
+
+    @only_pyjit
+    def test_unboxed_str_and_f64(self):
+        mod = self.compile(
+            """
+        def foo(a: str, n: i32) -> str:
+            return a * n + "!"
+
+        def bar(x: i32, y: f64) -> f64:
+            return y * x + 0.5
+        """
+        )
+        assert isinstance(self.lookup("foo"), W_PyJitFunc)
+        assert mod.foo("ab", 2) == "abab!"
+        assert mod.bar(3, 0.25) == 1.25
+
+    @only_pyjit
+    def test_fallback_to_astframe(self):
+        mod = self.compile(
+            """
+        def make_list() -> list[i32]:
+            return [1, 2, 3]
+
+        def foo(i: i32) -> i32:
+            return make_list()[i] + 1
+        """
+        )
+        # list literals are not supported: make_list is still executed by
+        # ASTFrame, but foo is transpiled and calls it through the VM
+        assert isinstance(self.lookup("make_list"), W_ASTFunc)
+        assert isinstance(self.lookup("foo"), W_PyJitFunc)
+        assert mod.make_list() == [1, 2, 3]
+        assert mod.foo(1) == 3
+
+    @only_pyjit
+    def test_unsupported_numeric_conv(self):
+        # only i32->f64 is supported: other conversions must make the
+        # function fall back to ASTFrame instead of crashing
+        fw = PyFuncWriter.__new__(PyFuncWriter)
+        conv = NumericConv(w_type=B.w_i32, w_fromtype=B.w_f64)
+        with pytest.raises(PyJitUnsupported):
+            fw.fmt_conv("x", B.w_f64, conv)
+        conv = NumericConv(w_type=B.w_f64, w_fromtype=B.w_i32)
+        assert fw.fmt_conv("x", B.w_i32, conv) == "float(x)"
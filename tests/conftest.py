@@ -5,6 +5,15 @@ import py
 ROOT = py.path.local(__file__).dirpath()
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--interp-engine",
+        choices=["ast", "closure"],
+        default="ast",
+        help="which engine to use to execute W_ASTFuncs, see InterpEngine",
+    )
+
+
 def pytest_collection_modifyitems(session, config, items):
     """
     Reorder the test to have a "better" order. In particular:
@@ -8,13 +8,14 @@ import pytest
 
 from spy.backend.c.wrapper import WasmModuleWrapper
 from spy.backend.interp import InterpModuleWrapper
+from spy.backend.pyjit import pyjit
 from spy.cbuild import Toolchain, ZigToolchain
 from spy.compiler import Compiler
 from spy.errors import SPyError
 from spy.vm.module import W_Module
-from spy.vm.vm import SPyVM
+from spy.vm.vm import InterpEngine, SPyVM
 
-Backend = Literal["interp", "doppler", "C"]
+Backend = Literal["interp", "doppler", "pyjit", "C"]
 ALL_BACKENDS = Backend.__args__  # type: ignore
 
 
@@ -84,6 +85,10 @@ def only_interp(func):
     return parametrize_compiler_backend(["interp"], func)
 
 
+def only_pyjit(func):
+    return parametrize_compiler_backend(["pyjit"], func)
+
+
 def only_C(func):
     return parametrize_compiler_backend(["C"], func)
 
@@ -93,7 +98,7 @@ def only_emscripten(func):
 
 
 def no_C(func):
-    return parametrize_compiler_backend(["interp", "doppler"], func)
+    return parametrize_compiler_backend(["interp", "doppler", "pyjit"], func)
 
 
 @pytest.mark.usefixtures("init")
@@ -110,11 +115,12 @@ class CompilerTest:
         return request.param
 
     @pytest.fixture
-    def init(self, tmpdir, compiler_backend):
+    def init(self, request, tmpdir, compiler_backend):
         self.tmpdir = tmpdir
         self.builddir = self.tmpdir.join("build").ensure(dir=True)
         self.backend = compiler_backend
         self.vm = SPyVM()
+        self.vm.interp_engine = InterpEngine(request.config.getoption("interp_engine"))
         self.vm.path.append(str(self.tmpdir))
 
     def write_file(self, filename: str, src: str) -> Any:
@@ -140,7 +146,9 @@ class CompilerTest:
     SKIP_SPY_BACKEND_SANITY_CHECK = False
     ALL_COMPILED_SOURCES: set[str] = set()
 
-    def compile(self, src: str, modname: str = "test", *, opt_level=0) -> Any:
+    def compile(
+        self, src: str, modname: str = "test", *, opt_level=0, hoist=False
+    ) -> Any:
         """
         Compile the W_Module into something which can be accessed and called by
         tests.
@@ -148,6 +156,9 @@ class CompilerTest:
         Currently, the only support backend is 'interp', which is a fake
         backend: the IR code is not compiled and function are executed by the
         VM.
+
+        If hoist=True, the redshifting backends also run
+        vm.hoist_invariants().
         """
         self.write_file(f"{modname}.spy", src)
         self.w_mod = self.vm.import_(modname)
@@ -160,18 +171,28 @@ class CompilerTest:
             return interp_mod
         elif self.backend == "doppler":
             self.vm.redshift()
+            self.vm.inline()
+            if hoist:
+                self.vm.hoist_invariants()
             # self.dump_module(modname)
             interp_mod = InterpModuleWrapper(self.vm, self.w_mod)
             return interp_mod
-        elif self.backend == "C":
+        elif self.backend == "pyjit":
             self.vm.redshift()
-            compiler = Compiler(self.vm, modname, self.builddir)
+            self.vm.inline()
+            if hoist:
+                self.vm.hoist_invariants()
+            pyjit(self.vm)
+            interp_mod = InterpModuleWrapper(self.vm, self.w_mod)
+            return interp_mod
+        elif self.backend == "C":
+            # the Compiler redshifts only what is reachable
+            compiler = Compiler(self.vm, modname, self.builddir, hoist=hoist)
             file_wasm = compiler.cbuild(opt_level=self.OPT_LEVEL)
             return WasmModuleWrapper(self.vm, modname, file_wasm)
         elif self.backend == "emscripten":
-            self.vm.redshift()
             # self.dump_module(modname)
-            compiler = Compiler(self.vm, modname, self.builddir)
+            compiler = Compiler(self.vm, modname, self.builddir, hoist=hoist)
             file_js = compiler.cbuild(
                 opt_level=self.OPT_LEVEL, toolchain_type="emscripten"
             )
@@ -86,10 +86,61 @@ class TestMain:
         res, stdout = self.run("--run", self.foo_spy)
         assert stdout == "hello world\n"
 
+    def test_run_pyjit(self):
+        res, stdout = self.run("--run", "--pyjit", self.main_spy)
+        assert stdout == "hello world\n"
+
+    def test_run_closure_engine(self):
+        res, stdout = self.run("--run", "--engine", "closure", self.main_spy)
+        assert stdout == "hello world\n"
+
     def test_redshift(self):
         res, stdout = self.run("--redshift", self.foo_spy)
         assert stdout.startswith("def add(x: i32, y: i32) -> i32:")
 
+    def test_redshift_inline_report(self):
+        self.foo_spy.write(
+            textwrap.dedent(
+                """
+                def add(x: i32, y: i32) -> i32:
+                    return x + y
+
+                def twice(x: i32) -> i32:
+                    return add(x, x)
+                """
+            )
+        )
+        res, stdout = self.run("--redshift", self.foo_spy)
+        assert "    return x + x\n" in stdout
+        assert "# inlined `foo::add` into `foo::twice` (1 call site)" in stdout
+
+    def test_redshift_hoist_report(self):
+        self.foo_spy.write(
+            textwrap.dedent(
+                """
+                def foo(a: i32, n: i32) -> i32:
+                    i = 0
+                    while i < n:
+                        i = i + a * 2
+                    return i
+                """
+            )
+        )
+        res, stdout = self.run("--redshift", self.foo_spy)
+        assert "_inv0" not in stdout
+        assert "# hoisted" not in stdout
+        res, stdout = self.run("--redshift", "--hoist", self.foo_spy)
+        assert "    _inv0 = a * 2\n" in stdout
+        assert "# hoisted 1 loop-invariant expression in `foo::foo`" in stdout
+
+    def test_cache(self):
+        cache_dir = self.tmpdir.join("__spycache__")
+        self.run("--redshift", self.foo_spy)
+        assert not cache_dir.exists()
+        self.run("--redshift", "--cache", self.foo_spy)
+        assert cache_dir.join("foo.pickle").exists()
+        assert cache_dir.join("foo.redshift.pickle").exists()
+
     def test_cwrite(self):
         res, stdout = self.run("--cwrite", self.foo_spy)
         foo_c = self.tmpdir.join("foo.c")
@@ -97,6 +148,27 @@ class TestMain:
         csrc = foo_c.read()
         assert csrc.startswith("#include <spy.h>")
 
+    def test_cwrite_only_reachable(self):
+        self.main_spy.write(
+            textwrap.dedent(
+                """
+                def main() -> void:
+                    print(foo())
+
+                def foo() -> i32:
+                    x: i32 = 42
+                    return x
+
+                def unused() -> i32:
+                    return 0
+                """
+            )
+        )
+        res, stdout = self.run("--cwrite", "-t", "native", self.main_spy)
+        csrc = self.tmpdir.join("main.c").read()
+        assert "spy_main$foo" in csrc
+        assert "spy_main$unused" not in csrc
+
     def test_build_wasm(self):
         res, stdout = self.run(self.foo_spy)
         foo_wasm = self.tmpdir.join("foo.wasm")
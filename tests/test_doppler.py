@@ -3,6 +3,8 @@ import textwrap
 import pytest
 
 from spy.backend.spy import FQN_FORMAT, SPyBackend
+from spy.doppler import redshift
+from spy.fqn import FQN
 from spy.util import print_diff
 from spy.vm.vm import SPyVM
 
@@ -188,3 +190,490 @@ class TestDoppler:
             return [1, 2, 7]
         """
         )
+
+    def test_dead_if(self):
+        self.redshift(
+            """
+        LEVEL: i32 = 0
+
+        def foo(x: i32) -> i32:
+            if LEVEL > 0:
+                print("debug")
+            if LEVEL == 0:
+                x = x + 1
+            else:
+                x = x + 2
+            if x > 0:
+                if LEVEL > 1:
+                    print("nested")
+            return x
+        """
+        )
+        self.assert_dump(
+            """
+        def foo(x: i32) -> i32:
+            x = x + 1
+            if x > 0:
+                pass
+            return x
+        """
+        )
+
+    def test_dead_while(self):
+        self.redshift(
+            """
+        def foo() -> void:
+            while False:
+                print(1)
+        """
+        )
+        self.assert_dump(
+            """
+        def foo() -> void:
+            pass
+        """
+        )
+
+    def test_code_after_return(self):
+        self.redshift(
+            """
+        def foo(x: i32) -> i32:
+            if True:
+                return x
+            print("unreachable")
+            return 0
+
+        def bar(x: i32) -> i32:
+            if x > 0:
+                return 1
+            else:
+                return 2
+            return 3
+        """
+        )
+        self.assert_dump(
+            """
+        def foo(x: i32) -> i32:
+            return x
+
+        def bar(x: i32) -> i32:
+            if x > 0:
+                return 1
+            else:
+                return 2
+        """
+        )
+
+    def test_redshift_reachable(self):
+        src = """
+        def main() -> void:
+            print(foo())
+
+        def foo() -> i32:
+            return bar() + 1
+
+        def bar() -> i32:
+            return 2
+
+        def unused() -> i32:
+            return 3
+
+        @blue
+        def make_adder(n: i32):
+            def add(x: i32) -> i32:
+                return x + n
+            return add
+
+        def baz() -> i32:
+            return make_adder(1)(2)
+        """
+        f = self.tmpdir.join("test.spy")
+        f.write(textwrap.dedent(src))
+        w_mod = self.vm.import_("test")
+        fqn_main = FQN.make_global("test", "main")
+        reachable = self.vm.redshift_reachable([fqn_main])
+        assert {fqn.attr for fqn in reachable} == {"main", "foo", "bar"}
+        assert w_mod.getattr("foo").redshifted
+        assert not w_mod.getattr("unused").redshifted
+        #
+        # closures created by the redshift are reachable as well
+        fqn_baz = FQN.make_global("test", "baz")
+        reachable = self.vm.redshift_reachable([fqn_baz])
+        assert sorted(fqn.attr for fqn in reachable) == ["add", "baz"]
+
+    def test_parallel_redshift(self, monkeypatch):
+        src = """
+        @blue
+        def make_adder(n: i32):
+            def add(x: i32) -> i32:
+                return x + n
+            return add
+
+        def f1(x: i32) -> i32:
+            return x * (2 + 3)
+
+        def f2(x: i32) -> i32:
+            return make_adder(1)(x)
+
+        def f3(x: i32) -> i32:
+            return f1(x) + make_adder(2)(x)
+
+        def f4(s: str) -> str:
+            return s + "abc"
+
+        def f5(x: f64) -> f64:
+            y: f64 = x / 2
+            return y
+        """
+        f = self.tmpdir.join("test.spy")
+        f.write(textwrap.dedent(src))
+
+        def dump(workers: int) -> str:
+            vm = SPyVM()
+            vm.path.append(str(self.tmpdir))
+            vm.redshift_workers = workers
+            vm.import_("test")
+            vm.redshift()
+            b = SPyBackend(vm, fqn_format="full")
+            return b.dump_mod("test")
+
+        # count the functions which are redshifted by the main process
+        import spy.vm.vm
+
+        calls = []
+
+        def counting_redshift(vm, w_func):
+            calls.append(w_func.qn)
+            return redshift(vm, w_func)
+
+        monkeypatch.setattr(spy.vm.vm, "redshift", counting_redshift)
+        serial = dump(workers=1)
+        n = len(calls)
+        calls.clear()
+        parallel = dump(workers=3)
+        assert parallel == serial
+        # some of the functions were redshifted by the workers
+        assert len(calls) < n
+
+    def test_parallel_redshift_bluecache(self):
+        # the redshift of f1 and f2 calls a blue function, which fills the
+        # bluecache: the main process must replay the calls, so that the
+        # final state of the VM is the same as with a serial redshift
+        src = """
+        @blue
+        def get_n(x: i32) -> i32:
+            return x * 10
+
+        def f1(x: i32) -> i32:
+            return x + get_n(1)
+
+        def f2(x: i32) -> i32:
+            return x + get_n(2)
+
+        def f3(x: i32) -> i32:
+            return x + get_n(1)
+
+        def f4(x: i32) -> i32:
+            return x + 2
+        """
+        f = self.tmpdir.join("test.spy")
+        f.write(textwrap.dedent(src))
+
+        def make_vm(workers: int) -> SPyVM:
+            vm = SPyVM()
+            vm.path.append(str(self.tmpdir))
+            vm.redshift_workers = workers
+            vm.import_("test")
+            vm.redshift()
+            return vm
+
+        serial = make_vm(workers=1)
+        parallel = make_vm(workers=2)
+        b1 = SPyBackend(serial, fqn_format="full")
+        b2 = SPyBackend(parallel, fqn_format="full")
+        assert b2.dump_mod("test") == b1.dump_mod("test")
+        assert parallel.bluecache.records == serial.bluecache.records
+        assert parallel.state_digest() == serial.state_digest()
+
+    def test_parallel_redshift_cold(self, monkeypatch):
+        # a cold redshift calls the blue dispatch of the operators and
+        # creates new globals for the closures: the workers must do the job
+        # anyway, and the main process merges their results
+        lines = [
+            "@blue",
+            "def make_adder(n: i32):",
+            "    def add(x: i32) -> i32:",
+            "        return x + n",
+            "    return add",
+            "",
+        ]
+        for i in range(20):
+            if i % 3 == 0:
+                lines.append(f"def f{i}(x: i32) -> i32:")
+                lines.append(f"    return make_adder({i % 2})(x) * {i}")
+            elif i % 3 == 1:
+                lines.append(f"def f{i}(x: f64) -> f64:")
+                lines.append(f"    return x / {i}.0")
+            else:
+                lines.append(f"def f{i}(x: i32) -> i32:")
+                lines.append(f"    return make_adder({i})(x) + f{i - 1}(2.0)")
+        f = self.tmpdir.join("test.spy")
+        f.write("\n".join(lines) + "\n")
+        import spy.vm.vm
+
+        calls = []
+
+        def counting_redshift(vm, w_func):
+            calls.append(w_func.qn)
+            return redshift(vm, w_func)
+
+        monkeypatch.setattr(spy.vm.vm, "redshift", counting_redshift)
+
+        def make_vm(workers: int) -> SPyVM:
+            vm = SPyVM()
+            vm.path.append(str(self.tmpdir))
+            vm.redshift_workers = workers
+            vm.import_("test")
+            vm.redshift()
+            return vm
+
+        serial = make_vm(workers=1)
+        n = len(calls)
+        calls.clear()
+        parallel = make_vm(workers=4)
+        b1 = SPyBackend(serial, fqn_format="full")
+        b2 = SPyBackend(parallel, fqn_format="full")
+        assert b2.dump_mod("test") == b1.dump_mod("test")
+        assert parallel.bluecache.records == serial.bluecache.records
+        assert parallel.state_digest() == serial.state_digest()
+        # the main process redshifts only the closures, which are created
+        # by the first batch
+        assert len(calls) < n
+        assert all(qn.attr == "add" for qn in calls)
+
+    def test_parallel_redshift_reuse_pool(self, monkeypatch):
+        # redshift_reachable redshifts one level at a time: if the workers
+        # don't touch the state of the VM, they are forked only once
+        src = """
+        def f1(x: i32) -> i32:
+            return f2(x) + f3(x)
+
+        def f2(x: i32) -> i32:
+            return f4(x) + f5(x)
+
+        def f3(x: i32) -> i32:
+            return f4(x) + f5(x)
+
+        def f4(x: i32) -> i32:
+            return x + 1
+
+        def f5(x: i32) -> i32:
+            return x + 2
+        """
+        f = self.tmpdir.join("test.spy")
+        f.write(textwrap.dedent(src))
+        import spy.doppler
+        import spy.vm.vm
+
+        executors = []
+        orig_ProcessPoolExecutor = spy.doppler.ProcessPoolExecutor
+
+        def counting_ProcessPoolExecutor(*args, **kwargs):
+            executor = orig_ProcessPoolExecutor(*args, **kwargs)
+            executors.append(executor)
+            return executor
+
+        monkeypatch.setattr(
+            spy.doppler, "ProcessPoolExecutor", counting_ProcessPoolExecutor
+        )
+        calls = []
+
+        def counting_redshift(vm, w_func):
+            calls.append(w_func.qn)
+            return redshift(vm, w_func)
+
+        monkeypatch.setattr(spy.vm.vm, "redshift", counting_redshift)
+        vm = SPyVM()
+        vm.path.append(str(self.tmpdir))
+        vm.redshift_workers = 2
+        vm.import_("test")
+        reachable = vm.redshift_reachable([FQN.make_global("test", "f1")])
+        assert len(reachable) == 5
+        assert len(executors) == 1
+        # f1 is alone in its level, the other two levels are done by the
+        # workers
+        assert [qn.attr for qn in calls] == ["f1"]
+
+    def test_inline(self):
+        self.redshift(
+            """
+        def add(x: i32, y: i32) -> i32:
+            return x + y
+
+        def twice(x: i32) -> i32:
+            return add(x, x)
+
+        def foo(a: i32) -> i32:
+            return twice(a) * add(a + 1, 2)
+        """
+        )
+        report = self.vm.inline()
+        self.assert_dump(
+            """
+        def add(x: i32, y: i32) -> i32:
+            return x + y
+
+        def twice(x: i32) -> i32:
+            return x + x
+
+        def foo(a: i32) -> i32:
+            return (a + a) * (a + 1 + 2)
+        """
+        )
+        report = {(a.attr, b.attr): n for (a, b), n in report.items()}
+        assert report == {
+            ("twice", "add"): 1,
+            ("foo", "twice"): 1,
+            ("foo", "add"): 1,
+        }
+
+    def test_dont_inline(self):
+        self.redshift(
+            """
+        def add(x: i32, y: i32) -> i32:
+            return x + y
+
+        def twice(x: i32) -> i32:
+            return x + x
+
+        def loop(n: i32) -> i32:
+            return loop(n)
+
+        def to_f64(x: i32) -> f64:
+            return x
+
+        def foo(a: i32) -> i32:
+            # the argument would be evaluated twice
+            return twice(a * 2)
+
+        def bar(a: i32) -> i32:
+            # the order of evaluation of the arguments might change
+            return add(foo(a), foo(a))
+
+        def baz(a: i32) -> f64:
+            # we would lose the conversion to f64
+            return to_f64(a) + loop(a)
+        """
+        )
+        report = self.vm.inline()
+        self.assert_dump(
+            """
+        def add(x: i32, y: i32) -> i32:
+            return x + y
+
+        def twice(x: i32) -> i32:
+            return x + x
+
+        def loop(n: i32) -> i32:
+            return `test::loop`(n)
+
+        def to_f64(x: i32) -> f64:
+            return x
+
+        def foo(a: i32) -> i32:
+            return `test::twice`(a * 2)
+
+        def bar(a: i32) -> i32:
+            return `test::add`(`test::twice`(a * 2), `test::twice`(a * 2))
+
+        def baz(a: i32) -> f64:
+            return `test::to_f64`(a) + `test::loop`(a)
+        """
+        )
+        # foo can be inlined into bar, but the result cannot be inlined
+        # further
+        report = {(a.attr, b.attr): n for (a, b), n in report.items()}
+        assert report == {("bar", "foo"): 2}
+
+    def test_hoist_invariants(self):
+        self.redshift(
+            """
+        def foo(a: i32, n: i32) -> i32:
+            res = 0
+            i = 0
+            while i < n * 2:
+                res = res + a * n
+                j = 0
+                while j < n + 1:
+                    res = res + a * (i + 1)
+                    j = j + 1
+                i = i + 1
+            return res
+        """
+        )
+        report = self.vm.hoist_invariants()
+        self.assert_dump(
+            """
+        def foo(a: i32, n: i32) -> i32:
+            res = 0
+            i = 0
+            _inv0: i32
+            _inv0 = n * 2
+            _inv1: i32
+            _inv1 = a * n
+            _inv2: i32
+            _inv2 = n + 1
+            while i < _inv0:
+                res = res + _inv1
+                j = 0
+                _inv3: i32
+                _inv3 = a * (i + 1)
+                while j < _inv2:
+                    res = res + _inv3
+                    j = j + 1
+                i = i + 1
+            return res
+        """
+        )
+        report = {fqn.attr: n for fqn, n in report.items()}
+        assert report == {"foo": 4}
+
+    def test_dont_hoist(self):
+        self.redshift(
+            """
+        N: i32 = 10
+
+        def foo(a: i32, b: i32, c: i32) -> i32:
+            i = 0
+            if c > 0:
+                x = 1
+            # N is a global, it might be modified by a call
+            while i < N * 2:
+                # i32_div can raise
+                i = i + a / b
+                # x might not be initialized
+                i = i + x * 2
+                # c is modified by the loop
+                i = i + c * 2
+                c = 0
+            return i
+        """
+        )
+        report = self.vm.hoist_invariants()
+        assert report == {}
+
+    def test_dont_hoist_str_ops(self):
+        # str_mul allocates, and with a negative count it must not be
+        # called if the loop doesn't run
+        self.redshift(
+            """
+        def foo(s: str, n: i32) -> str:
+            res = ""
+            i = 0
+            while i < n:
+                res = res + s * n
+                i = i + 1
+            return res
+        """
+        )
+        assert self.vm.hoist_invariants() == {}
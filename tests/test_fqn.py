@@ -83,3 +83,38 @@ def test_FQN_parse():
     assert fqn.modname == "aaa"
     assert fqn.attr == "bbb"
     assert fqn.suffix == "0"
+
+
+def test_interned():
+    import copy
+    import pickle
+
+    a = QN("aaa::bbb")
+    assert QN(modname="aaa", attr="bbb") is a
+    assert pickle.loads(pickle.dumps(a)) is a
+    fqn = FQN.make("aaa", "bbb", suffix="0")
+    assert FQN.parse("aaa::bbb#0") is fqn
+    assert copy.deepcopy(fqn) is fqn
+    assert pickle.loads(pickle.dumps(fqn)) is fqn
+    assert FQN.make("aaa", "bbb", suffix="1") is not fqn
+
+
+def test_eq_other_types():
+    a = QN("aaa::bbb")
+    fqn = FQN.make("aaa", "bbb", suffix="")
+    assert a.__eq__("aaa::bbb") is NotImplemented
+    assert fqn.__eq__(a) is NotImplemented
+    assert a != "aaa::bbb"
+    assert fqn != "aaa::bbb"
+    assert a != fqn
+
+
+def test_immutable():
+    a = QN("aaa::bbb")
+    with pytest.raises(AttributeError):
+        a.attr = "ccc"
+    fqn = FQN.make("aaa", "bbb", suffix="0")
+    with pytest.raises(AttributeError):
+        fqn.suffix = "1"
+    with pytest.raises(AttributeError):
+        fqn.foo = 42
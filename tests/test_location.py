@@ -0,0 +1,44 @@
+import pickle
+
+import pytest
+
+from spy.location import Loc
+
+
+def test_Loc():
+    loc = Loc("foo.spy", 1, 2, 3, 4)
+    assert loc.filename == "foo.spy"
+    assert loc.line_start == 1
+    assert loc.line_end == 2
+    assert loc.col_start == 3
+    assert loc.col_end == 4
+    assert repr(loc) == "<Loc: 'foo.spy 1:3 2:4'>"
+
+
+def test_Loc_eq_hash():
+    a = Loc("foo.spy", 1, 2, 3, 4)
+    b = Loc(filename="foo.spy", line_start=1, line_end=2, col_start=3, col_end=4)
+    c = Loc("bar.spy", 1, 2, 3, 4)
+    assert a == b
+    assert hash(a) == hash(b)
+    assert a != c
+
+
+def test_Loc_immutable():
+    loc = Loc("foo.spy", 1, 2, 3, 4)
+    with pytest.raises(AttributeError):
+        loc.line_start = 10  # type: ignore
+
+
+def test_Loc_replace():
+    loc = Loc("foo.spy", 1, 2, 3, 4)
+    assert loc.replace(col_end=42) == Loc("foo.spy", 1, 2, 3, 42)
+    assert loc.make_end_loc() == Loc("foo.spy", 2, 2, 4, 4)
+    assert Loc.combine(loc, Loc("foo.spy", 5, 6, 7, 8)) == Loc("foo.spy", 1, 6, 3, 8)
+
+
+def test_Loc_pickle():
+    loc = Loc("foo.spy", 1, 2, 3, 4)
+    loc2 = pickle.loads(pickle.dumps(loc))
+    assert loc2 == loc
+    assert loc2.filename == "foo.spy"
@@ -63,3 +63,50 @@ def test_magic_py_parse():
     """
     )
     assert dumped.strip() == expected.strip()
+
+
+def test_preprocess_var_in_string():
+    src1 = textwrap.dedent(
+        """
+    x = "var y"  # var z
+    """
+    )
+    src2, var_locs = preprocess(src1)
+    assert src2 == src1
+    assert var_locs == set()
+
+
+def test_magic_py_parse_nested():
+    src = textwrap.dedent(
+        """
+    def foo():
+        if True:
+            var x: i32 = 1
+            y: i32 = 2
+    """
+    )
+    py_mod = magic_py_parse(src)
+    if_node = py_mod.body[0].body[0]
+    ann_x, ann_y = if_node.body
+    assert ann_x.target.id == "x"
+    assert ann_x.target.is_var
+    assert ann_x.target.col_offset == 8
+    assert not getattr(ann_y.target, "is_var", False)
+
+
+def test_var_after_non_ascii():
+    src = textwrap.dedent(
+        """
+    def foo():
+        if "é" == "é": var y: i32 = 1
+        x = "à"; var z: i32 = 2
+    """
+    )
+    py_mod = magic_py_parse(src)
+    if_node, assign_x, ann_z = py_mod.body[0].body
+    ann_y = if_node.body[0]
+    assert ann_y.target.id == "y"
+    assert ann_y.target.is_var
+    assert not getattr(assign_x.targets[0], "is_var", False)
+    assert ann_z.target.id == "z"
+    assert ann_z.target.is_var
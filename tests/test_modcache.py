@@ -0,0 +1,99 @@
+import textwrap
+
+import py.path
+import pytest
+
+from spy.irgen import modcache
+from spy.irgen.irgen import import_all
+from spy.parser import Parser
+from spy.vm.vm import SPyVM
+
+
+class TestModCache:
+
+    @pytest.fixture(autouse=True)
+    def init(self, tmpdir):
+        self.tmpdir = tmpdir
+
+    def write(self, modname: str, src: str) -> py.path.local:
+        f = self.tmpdir.join(f"{modname}.spy")
+        f.write(textwrap.dedent(src))
+        return f
+
+    @property
+    def cache_dir(self) -> py.path.local:
+        return self.tmpdir.join("build", modcache.CACHE_DIR)
+
+    def import_(self, modname: str, cache: bool = True) -> SPyVM:
+        vm = SPyVM()
+        vm.path.append(str(self.tmpdir))
+        if cache:
+            vm.cache_dir = str(self.cache_dir)
+        vm.import_(modname)
+        return vm
+
+    def count_parse(self, monkeypatch) -> list[int]:
+        counter = [0]
+        orig_parse = Parser.parse
+
+        def parse(self):
+            counter[0] += 1
+            return orig_parse(self)
+
+        monkeypatch.setattr(Parser, "parse", parse)
+        return counter
+
+    def test_hit(self, monkeypatch):
+        counter = self.count_parse(monkeypatch)
+        self.write(
+            "mod1",
+            """
+        x: i32 = 42
+        def foo(y: i32) -> i32:
+            return x + y
+        """,
+        )
+        vm = self.import_("mod1")
+        assert counter[0] == 1
+        assert modcache.get_cache_file(vm, "mod1") == self.cache_dir.join(
+            "mod1.pickle"
+        )
+        assert self.cache_dir.join("mod1.pickle").exists()
+        #
+        vm = self.import_("mod1")
+        assert counter[0] == 1
+        w_foo = vm.modules_w["mod1"].getattr("foo")
+        assert vm.unwrap(vm.call(w_foo, [vm.wrap(1)])) == 43
+
+    def test_source_changed(self, monkeypatch):
+        counter = self.count_parse(monkeypatch)
+        self.write("mod1", "def foo() -> i32:\n    return 1\n")
+        self.import_("mod1")
+        self.write("mod1", "def foo() -> i32:\n    return 2\n")
+        vm = self.import_("mod1")
+        assert counter[0] == 2
+        w_foo = vm.modules_w["mod1"].getattr("foo")
+        assert vm.unwrap(vm.call(w_foo, [])) == 2
+
+    def test_disabled_by_default(self, monkeypatch):
+        counter = self.count_parse(monkeypatch)
+        self.write("mod1", "def foo() -> i32:\n    return 1\n")
+        vm = self.import_("mod1", cache=False)
+        assert modcache.get_cache_file(vm, "mod1") is None
+        self.import_("mod1", cache=False)
+        assert counter[0] == 2
+        assert not self.tmpdir.join(modcache.CACHE_DIR).exists()
+        assert not self.cache_dir.exists()
+
+    def test_import_all(self, monkeypatch):
+        counter = self.count_parse(monkeypatch)
+        self.write("mod1", "import mod2\ndef foo() -> i32:\n    return 1\n")
+        self.write("mod2", "def bar() -> i32:\n    return 2\n")
+        for i in range(2):
+            vm = SPyVM()
+            vm.path.append(str(self.tmpdir))
+            vm.cache_dir = str(self.cache_dir)
+            import_all(vm, ["mod1"], max_workers=1)
+            assert "mod2" in vm.modules_w
+        assert counter[0] == 2
+        assert self.cache_dir.join("mod2.pickle").exists()
@@ -0,0 +1,150 @@
+import textwrap
+
+import py.path
+import pytest
+
+from spy.backend.spy import SPyBackend
+from spy.vm.vm import SPyVM
+
+
+class TestRedshiftCache:
+
+    @pytest.fixture(autouse=True)
+    def init(self, tmpdir):
+        self.tmpdir = tmpdir
+
+    def write(self, modname: str, src: str) -> None:
+        f = self.tmpdir.join(f"{modname}.spy")
+        f.write(textwrap.dedent(src))
+
+    @property
+    def cache_dir(self) -> py.path.local:
+        return self.tmpdir.join("build", "__spycache__")
+
+    def make_vm(self, cache: bool = True) -> SPyVM:
+        vm = SPyVM()
+        vm.path.append(str(self.tmpdir))
+        if cache:
+            vm.cache_dir = str(self.cache_dir)
+        return vm
+
+    def redshift(self, modname: str, cache: bool = True) -> SPyVM:
+        vm = self.make_vm(cache)
+        vm.import_(modname)
+        vm.redshift()
+        return vm
+
+    def dump(self, vm: SPyVM, modname: str) -> str:
+        return SPyBackend(vm, fqn_format="full").dump_mod(modname)
+
+    def test_hit(self):
+        self.write(
+            "mod1",
+            """
+        @blue
+        def get_n() -> i32:
+            return 40
+
+        def foo(y: i32) -> i32:
+            return get_n() + y + bar()
+
+        def bar() -> i32:
+            return 2
+        """,
+        )
+        vm1 = self.redshift("mod1")
+        assert vm1.redshift_cache.hits == 0
+        vm2 = self.redshift("mod1")
+        assert vm2.redshift_cache.hits == 2
+        assert vm2.redshift_cache.misses == 0
+        assert self.dump(vm2, "mod1") == self.dump(vm1, "mod1")
+        w_foo = vm2.modules_w["mod1"].getattr("foo")
+        assert vm2.unwrap(vm2.call(w_foo, [vm2.wrap(1)])) == 43
+
+    def test_function_changed(self):
+        src = """
+        def foo() -> i32:
+            return {n}
+
+        def bar() -> i32:
+            return 2
+        """
+        self.write("mod1", src.format(n=1))
+        self.redshift("mod1")
+        self.write("mod1", src.format(n=10))
+        vm = self.redshift("mod1")
+        assert vm.redshift_cache.hits == 1  # bar
+        assert vm.redshift_cache.misses == 1  # foo
+        w_foo = vm.modules_w["mod1"].getattr("foo")
+        assert vm.unwrap(vm.call(w_foo, [])) == 10
+
+    def test_blue_dependency_changed(self):
+        self.write(
+            "dep",
+            """
+            @blue
+            def get_n() -> i32:
+                return 1
+            """,
+        )
+        self.write(
+            "mod1",
+            """
+            from dep import get_n
+
+            def foo() -> i32:
+                return get_n() * 2
+            """,
+        )
+        vm = self.make_vm()
+        vm.import_all(["mod1"])
+        vm.redshift()
+        #
+        self.write(
+            "dep",
+            """
+            @blue
+            def get_n() -> i32:
+                return 21
+            """,
+        )
+        vm = self.make_vm()
+        vm.import_all(["mod1"])
+        vm.redshift()
+        assert vm.redshift_cache.hits == 0
+        w_foo = vm.modules_w["mod1"].getattr("foo")
+        assert vm.unwrap(vm.call(w_foo, [])) == 42
+
+    def test_closures_are_not_cached(self):
+        self.write(
+            "mod1",
+            """
+        @blue
+        def make_adder(n: i32):
+            def add(x: i32) -> i32:
+                return x + n
+            return add
+
+        def foo(x: i32) -> i32:
+            return make_adder(1)(x)
+        """,
+        )
+        vm1 = self.redshift("mod1")
+        vm2 = self.redshift("mod1")
+        # foo references the FQN of a closure, which is not stable
+        # across runs. However, the closure itself is cached.
+        assert vm2.redshift_cache.hits == 1
+        assert self.dump(vm2, "mod1") == self.dump(vm1, "mod1")
+
+    def test_cache_file(self):
+        self.write("mod1", "def foo() -> i32:\n    return 1\n")
+        self.redshift("mod1")
+        assert self.cache_dir.join("mod1.redshift.pickle").exists()
+
+    def test_disabled_by_default(self):
+        self.write("mod1", "def foo() -> i32:\n    return 1\n")
+        self.redshift("mod1", cache=False)
+        vm = self.redshift("mod1", cache=False)
+        assert vm.redshift_cache.hits == 0
+        assert not self.cache_dir.exists()
+        assert not self.tmpdir.join("__spycache__").exists()
@@ -170,6 +170,52 @@ class TestScopeAnalyzer:
             "x": MatchSymbol("x", "red", level=1),
         }
 
+    def test_name_sym(self):
+        scopes = self.analyze(
+            """
+        x: i32 = 0
+        def foo(y: i32) -> i32:
+            z = x
+            return z + y
+        """
+        )
+        funcdef = self.mod.get_funcdef("foo")
+        assign = funcdef.body[0]
+        assert isinstance(assign, ast.Assign)
+        assert assign.target_sym is funcdef.symtable.lookup("z")
+        name_x = assign.value
+        assert isinstance(name_x, ast.Name)
+        assert name_x.sym is funcdef.symtable.lookup("x")
+        assert name_x.sym.level == 1
+        assert name_x.sym.fqn == FQN.make_global("test", "x")
+        assert funcdef.symtable.lookup_Name(name_x) is name_x.sym
+        assert funcdef.symtable.lookup_Name_maybe(name_x) is name_x.sym
+        name_w = ast.Name(name_x.loc, "w")
+        assert funcdef.symtable.lookup_Name_maybe(name_w) is None
+
+    def test_slots(self):
+        scopes = self.analyze(
+            """
+        def foo(a: i32) -> void:
+            x: i32 = 0
+            def bar(y: i32) -> i32:
+                return x + y
+        """
+        )
+        foodef = self.mod.get_funcdef("foo")
+        foo_scope = foodef.symtable
+        assert foo_scope.nslots == 4  # a, @return, x, bar
+        sym_x = foo_scope.lookup("x")
+        assert sym_x.is_cell
+        assert not foo_scope.lookup("a").is_cell
+        assert foo_scope.cell_slots == [sym_x.slot]
+        bardef = foodef.body[2]
+        assert isinstance(bardef, ast.FuncDef)
+        bar_scope = bardef.symtable
+        assert bar_scope.freevars == ["x"]
+        assert bar_scope.lookup("x").slot == 0
+        assert not bar_scope.lookup("x").is_cell
+
     def test_import(self):
         scopes = self.analyze(
             """
@@ -48,6 +48,41 @@ def test_magic_dispatch_NotImplemented():
     assert f.visit("world", 42) == "hello NotImplemented world 42"
 
 
+def test_magic_dispatch_subclass():
+    class Foo:
+        def visit(self, obj: Any) -> Any:
+            return magic_dispatch(self, "visit", obj)
+
+        def visit_int(self, x: int) -> str:
+            return "Foo.visit_int"
+
+        def visit_str(self, s: str) -> str:
+            return "Foo.visit_str"
+
+    class Bar(Foo):
+        def visit_int(self, x: int) -> str:
+            return "Bar.visit_int"
+
+    # the dispatch tables are per-class
+    for i in range(2):
+        assert Foo().visit(1) == "Foo.visit_int"
+        assert Bar().visit(1) == "Bar.visit_int"
+        assert Bar().visit("a") == "Foo.visit_str"
+
+
+def test_magic_dispatch_ignores_instance_attributes():
+    class Foo:
+        def visit(self, obj: Any) -> Any:
+            return magic_dispatch(self, "visit", obj)
+
+        def visit_int(self, x: int) -> str:
+            return "Foo.visit_int"
+
+    f = Foo()
+    f.visit_int = lambda x: "instance"  # type: ignore
+    assert f.visit(1) == "Foo.visit_int"
+
+
 def test_extend():
     class Foo:
         pass
@@ -0,0 +1,72 @@
+from spy.vm.b import B
+from spy.vm.list import W_List
+from spy.vm.modules.operator import OP
+from spy.vm.opimpl import W_Value
+from spy.vm.vm import SPyVM
+
+
+class TestBlueCache:
+
+    def test_spy_key(self):
+        vm = SPyVM()
+        assert vm.wrap(1).spy_key(vm) == vm.wrap(1).spy_key(vm)
+        assert vm.wrap(1).spy_key(vm) != vm.wrap(2).spy_key(vm)
+        # 1 == 1.0, so they must have the same key
+        assert vm.wrap(1).spy_key(vm) == vm.wrap(1.0).spy_key(vm)
+        assert vm.wrap(float("nan")).spy_key(vm) is None
+        assert vm.wrap("a").spy_key(vm) == vm.wrap("a").spy_key(vm)
+        assert vm.wrap("a").spy_key(vm) != vm.wrap("b").spy_key(vm)
+        assert B.w_i32.spy_key(vm) == B.w_i32.spy_key(vm)
+        assert B.w_i32.spy_key(vm) != B.w_f64.spy_key(vm)
+
+    def test_W_Value_key(self):
+        vm = SPyVM()
+        wv_a = W_Value("a", 0, B.w_i32, None)
+        wv_b = W_Value("b", 0, B.w_i32, None)
+        wv_c = W_Value("c", 1, B.w_i32, None)
+        wv_d = W_Value("d", 0, B.w_f64, None)
+        # the prefix doesn't count
+        assert wv_a.spy_key(vm) == wv_b.spy_key(vm)
+        assert wv_a.spy_key(vm) != wv_c.spy_key(vm)
+        assert wv_a.spy_key(vm) != wv_d.spy_key(vm)
+        #
+        wv_1 = W_Value("x", 0, B.w_i32, None, w_blueval=vm.wrap(1))
+        wv_2 = W_Value("y", 0, B.w_i32, None, w_blueval=vm.wrap(1))
+        wv_3 = W_Value("z", 0, B.w_i32, None, w_blueval=vm.wrap(2))
+        assert wv_1.spy_key(vm) == wv_2.spy_key(vm)
+        assert wv_1.spy_key(vm) != wv_3.spy_key(vm)
+        #
+        w_l1 = W_List[W_Value]([wv_a, wv_1])
+        w_l2 = W_List[W_Value]([wv_b, wv_2])
+        assert w_l1.spy_key(vm) == w_l2.spy_key(vm)
+
+    def test_hits_and_misses(self):
+        vm = SPyVM()
+        cache = vm.bluecache
+        hits = cache.hits
+        misses = cache.misses
+        wv_l = W_Value("l", 0, B.w_i32, None)
+        wv_r = W_Value("r", 1, B.w_i32, None)
+        w_opimpl1 = vm.call_OP(OP.w_ADD, [wv_l, wv_r])
+        assert cache.misses == misses + 1
+        #
+        # different W_Values which compare equal hit the cache
+        wv_l2 = W_Value("x", 0, B.w_i32, None)
+        wv_r2 = W_Value("y", 1, B.w_i32, None)
+        w_opimpl2 = vm.call_OP(OP.w_ADD, [wv_l2, wv_r2])
+        assert w_opimpl2 is w_opimpl1
+        assert cache.hits == hits + 1
+        assert cache.misses == misses + 1
+
+    def test_unhashable_args(self):
+        vm = SPyVM()
+        cache = vm.bluecache
+        w_func = OP.w_ADD
+        # modules don't have a key: the cache falls back to universal_eq
+        w_a = vm.modules_w["builtins"]
+        w_b = vm.modules_w["operator"]
+        assert w_a.spy_key(vm) is None
+        w_res = vm.wrap(42)
+        cache.record(w_func, [w_a], w_res)
+        assert cache.lookup(w_func, [w_a]) is w_res
+        assert cache.lookup(w_func, [w_b]) is None
@@ -0,0 +1,61 @@
+import pytest
+from spy.vm.modfinder import ModuleFinder
+
+
+class TestModuleFinder:
+
+    @pytest.fixture
+    def init(self, tmpdir):
+        self.dir1 = tmpdir.join("dir1").ensure(dir=True)
+        self.dir2 = tmpdir.join("dir2").ensure(dir=True)
+        self.finder = ModuleFinder([str(self.dir1), str(self.dir2)])
+
+    def test_search_path(self, init):
+        a1 = self.dir1.join("a.spy").ensure()
+        self.dir2.join("a.spy").ensure()
+        b2 = self.dir2.join("b.spy").ensure()
+        assert self.finder.find("a") == a1
+        assert self.finder.find("b") == b2
+        assert self.finder.find("c") is None
+        assert self.finder.locations == {"a": a1, "b": b2}
+
+    def test_packages(self, init):
+        init = self.dir2.join("pkg", "__init__.spy").ensure()
+        mod = self.dir2.join("pkg", "sub", "mod.spy").ensure()
+        self.dir2.join("pkg", "x.txt").ensure()
+        assert self.finder.find("pkg") == init
+        assert self.finder.find("pkg.sub.mod") == mod
+        assert self.finder.find("pkg.x") is None
+        assert self.finder.find("pkg.sub.xxx") is None
+        # a directory without __init__.spy is not a package
+        assert self.finder.find("pkg.sub") is None
+
+    def test_package_wins(self, init):
+        self.dir1.join("a.spy").ensure()
+        init = self.dir1.join("a", "__init__.spy").ensure()
+        assert self.finder.find("a") == init
+
+    def test_listings_are_cached(self, init):
+        a = self.dir1.join("a.spy").ensure()
+        assert self.finder.find("a") == a
+        assert set(self.finder.listings) == {str(self.dir1)}
+        # if we remove a file, the finder doesn't notice
+        a.remove()
+        assert self.finder.find("a") == a
+        self.finder.invalidate_caches()
+        assert self.finder.find("a") is None
+
+    def test_new_files_are_found(self, init):
+        self.dir1.join("a.spy").ensure()
+        assert self.finder.find("a") is not None
+        # b.spy is not in the cached listing, but the finder tries again
+        b = self.dir2.join("b.spy").ensure()
+        assert self.finder.find("b") == b
+
+    def test_path_is_shared(self, init):
+        path: list[str] = []
+        finder = ModuleFinder(path)
+        a = self.dir1.join("a.spy").ensure()
+        assert finder.find("a") is None
+        path.append(str(self.dir1))
+        assert finder.find("a") == a
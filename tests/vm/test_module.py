@@ -1,3 +1,5 @@
+import pytest
+
 from spy.fqn import FQN
 from spy.vm.b import B
 from spy.vm.module import W_Module
@@ -21,3 +23,30 @@ class TestModule:
             (fqn_a, w_a),
             (fqn_b, w_b),
         ]
+
+    def test_keys_only_see_own_globals(self):
+        vm = SPyVM()
+        w_mod1 = W_Module(vm, "mod1", "mod1.spy")
+        w_mod2 = W_Module(vm, "mod2", "mod2.spy")
+        vm.register_module(w_mod1)
+        vm.register_module(w_mod2)
+        fqn_a = FQN.make("mod1", "a", "")
+        fqn_b = FQN.make("mod2", "b", "")
+        fqn_c = FQN.make("mod1", "c", "")
+        vm.add_global(fqn_a, B.w_i32, vm.wrap(1))
+        vm.add_global(fqn_b, B.w_i32, vm.wrap(2))
+        vm.add_global(fqn_c, B.w_i32, vm.wrap(3))
+        assert list(w_mod1.keys()) == [fqn_a, fqn_c]
+        assert list(w_mod2.keys()) == [fqn_b]
+        #
+        # store_global updates the value but keeps the order
+        w_new = vm.wrap(42)
+        vm.store_global(fqn_a, w_new)
+        assert list(w_mod1.items_w()) == [(fqn_a, w_new), (fqn_c, vm.wrap(3))]
+
+    def test_add_to_unregistered_module(self):
+        vm = SPyVM()
+        fqn = FQN.make("nomod", "a", "")
+        with pytest.raises(AssertionError, match="`nomod` is not registered"):
+            vm.add_global(fqn, B.w_i32, vm.wrap(1))
+        assert vm.lookup_global(fqn) is None
@@ -2,10 +2,12 @@ import fixedint
 import pytest
 
 from spy.errors import SPyTypeError
-from spy.fqn import QN
+from spy.fqn import FQN, QN
 from spy.vm.b import B
 from spy.vm.module import W_Module
+from spy.vm.modules.operator import OP
 from spy.vm.object import W_I32, W_Bool, W_Object, W_Type, W_Void, spytype
+from spy.vm.sig import spy_builtin
 from spy.vm.str import W_Str
 from spy.vm.vm import SPyVM
 
@@ -160,6 +162,28 @@ class TestVM:
         z = vm.unwrap(w_z)
         assert z == -1
 
+    def test_W_I32_small_ints(self):
+        vm = SPyVM()
+        # small ints are prebuilt
+        assert vm.wrap(0) is vm.wrap(0)
+        assert vm.wrap(-5) is vm.wrap(fixedint.Int32(-5))
+        assert W_I32.make(256) is vm.wrap(256)
+        assert vm.wrap(257) is not vm.wrap(257)
+        assert vm.unwrap(vm.wrap(257)) == 257
+        # wrap around still works for values out of range
+        assert vm.unwrap(W_I32.make(2**32 + 1)) == 1
+
+    def test_i32_arith(self):
+        vm = SPyVM()
+        assert OP.w_i32_add.arith
+        w_a = vm.wrap(2**31 - 1)
+        w_res = vm.call(OP.w_i32_add, [w_a, vm.wrap(1)])
+        assert vm.unwrap(w_res) == -(2**31)
+        assert type(vm.unwrap(w_res)) is fixedint.Int32
+        w_res = vm.call(OP.w_i32_div, [vm.wrap(-7), vm.wrap(2)])
+        assert vm.unwrap(w_res) == -4
+        assert vm.call(OP.w_i32_lt, [vm.wrap(1), vm.wrap(2)]) is B.w_True
+
     def test_W_Bool(self):
         vm = SPyVM()
         w_True = vm.wrap(True)
@@ -200,6 +224,67 @@ class TestVM:
         with pytest.raises(SPyTypeError, match=msg):
             vm.call(w_abs, [w_x])
 
+    def test_call_trusted(self, monkeypatch):
+        import spy.vm.vm
+
+        @spy_builtin(QN("test::identity"))
+        def identity(vm: "SPyVM", w_x: W_I32) -> W_I32:
+            return w_x
+
+        vm = SPyVM()
+        w_identity = vm.wrap(identity)
+        w_x = vm.wrap("hello")
+        # call_trusted doesn't check the types of the arguments...
+        assert vm.call_trusted(w_identity, [w_x]) is w_x
+        # ...unless we are in debug mode
+        monkeypatch.setattr(spy.vm.vm, "CHECK_TRUSTED_CALLS", True)
+        vm = SPyVM()
+        assert vm.check_trusted_calls
+        w_identity = vm.wrap(identity)
+        w_x = vm.wrap("hello")
+        msg = "Invalid cast. Expected `i32`, got `str`"
+        with pytest.raises(SPyTypeError, match=msg):
+            vm.call_trusted(w_identity, [w_x])
+
+    def test_check_trusted_calls_arith(self, monkeypatch):
+        import spy.vm.vm
+        from spy.vm.opimpl import W_OpImpl, W_Value
+        from spy.vm.typechecker import typecheck_opimpl
+
+        monkeypatch.setattr(spy.vm.vm, "CHECK_TRUSTED_CALLS", True)
+        vm = SPyVM()
+        args_wv = [W_Value("v", i, B.w_i32, None) for i in range(2)]
+        w_opimpl = W_OpImpl.simple(OP.w_i32_add)
+        typecheck_opimpl(vm, w_opimpl, args_wv, dispatch="multi", errmsg="")
+        w_res = w_opimpl.call(vm, [vm.wrap(1), vm.wrap(2)])
+        assert vm.unwrap(w_res) == 3
+        # the arith fast path is disabled in debug mode
+        msg = "Invalid cast. Expected `i32`, got `str`"
+        with pytest.raises(SPyTypeError, match=msg):
+            w_opimpl.call(vm, [vm.wrap("hello"), vm.wrap(2)])
+
+    def test_reverse_lookup_global(self):
+        vm = SPyVM()
+        w_mod = W_Module(vm, "test", "...")
+        vm.register_module(w_mod)
+        fqn_a = FQN.parse("test::a")
+        fqn_b = FQN.parse("test::b")
+        w_x = vm.wrap(1000)
+        w_y = vm.wrap(2000)
+        assert vm.reverse_lookup_global(w_x) is None
+        vm.add_global(fqn_a, B.w_i32, w_x)
+        vm.add_global(fqn_b, B.w_i32, w_x)
+        assert vm.reverse_lookup_global(w_x) == fqn_a
+        assert vm.reverse_lookup_global(B.w_i32) == FQN.parse("builtins::i32")
+        #
+        # the index is kept in sync by store_global
+        vm.store_global(fqn_a, w_y)
+        assert vm.reverse_lookup_global(w_x) == fqn_b
+        assert vm.reverse_lookup_global(w_y) == fqn_a
+        vm.store_global(fqn_b, w_y)
+        assert vm.reverse_lookup_global(w_x) is None
+        assert id(w_x) not in vm.globals_reverse
+
     def test_get_FQN(self):
         vm = SPyVM()
         w_mod = W_Module(vm, "test", "...")
@@ -214,6 +299,12 @@ class TestVM:
         assert b0.fullname == "test::b#0"
         b1 = vm.get_FQN(QN("test::b"), is_global=False)
         assert b1.fullname == "test::b#1"
+        assert vm.next_fqn_suffix[QN("test::b")] == 2
+        #
+        # suffixes which are already taken are skipped
+        vm.unique_fqns.add(FQN.parse("test::b#2"))
+        b3 = vm.get_FQN(QN("test::b"), is_global=False)
+        assert b3.fullname == "test::b#3"
 
     def test_eq(self):
         vm = SPyVM()